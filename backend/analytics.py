@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+EVENTS_COLLECTION = "bot_events"
+COUNTERS_COLLECTION = "bot_event_counters"
+
+# The onboarding funnel, in order
+FUNNEL = ("start", "start_bot", "language", "register", "registration_submitted")
+# Counter documents for every language / every day use this instead of a value
+ALL = "*"
+# Raw events are only needed to audit or recompute the counters
+EVENT_TTL = 90 * 24 * 3600
+
+
+def first_funnel_step(user_data: dict, event: str) -> Optional[str]:
+    """The funnel step ``event`` reaches if this user had not reached it yet.
+
+    Remembered in context.user_data (persisted with the user), so unique
+    users per step are counted without reading anything back from Mongo.
+    """
+    if event not in FUNNEL:
+        return None
+    reached = user_data.setdefault("funnel", [])
+    if event in reached:
+        return None
+    reached.append(event)
+    return event
+
+
+class EventStream:
+    """Append-only stream of bot interactions with incrementally maintained counters.
+
+    Handlers call ``record``, which only appends to an in-memory batch. A
+    background task writes each batch to ``events`` (a time-series
+    collection: one insert_many, never an update) and folds it into
+    ``counters``: one document per (day, language) with event counts and
+    first-time funnel users, plus the same for all languages (``*``) and for
+    all time (``day: None``). The dashboard reads a handful of those
+    documents however many events there are.
+
+    Counter deltas are only cleared once written, so a failed counter update
+    is retried with the next batch rather than lost or applied twice.
+    """
+
+    def __init__(self, events, counters, max_batch: int = 1000, flush_interval: float = 2.0, max_buffer: int = 100_000):
+        self.events = events
+        self.counters = counters
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: List[dict] = []
+        self._deltas: Dict[Tuple[Optional[datetime], str], Dict[str, int]] = {}
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.dropped = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.flush_latency = Histogram()
+
+    def record(self, event: str, user_id: int, language: str, first_step: Optional[str] = None) -> None:
+        """Queue one interaction; never waits on Mongo"""
+        if len(self._buffer) >= self.max_buffer:
+            # Mongo is down or far behind: losing analytics beats growing without bound
+            self.dropped += 1
+            return
+        doc = {"ts": datetime.utcnow(), "meta": {"event": event, "language": language}, "user_id": user_id}
+        if first_step is not None:
+            doc["first_step"] = first_step
+        self._buffer.append(doc)
+        self.recorded += 1
+        if len(self._buffer) >= self.max_batch:
+            self._wake.set()
+
+    def _fold(self, docs: List[dict]) -> None:
+        for doc in docs:
+            day = doc["ts"].replace(hour=0, minute=0, second=0, microsecond=0)
+            fields = {f"events.{doc['meta']['event']}": 1}
+            if "first_step" in doc:
+                fields[f"users.{doc['first_step']}"] = 1
+            for key in ((day, doc["meta"]["language"]), (day, ALL), (None, doc["meta"]["language"]), (None, ALL)):
+                delta = self._deltas.setdefault(key, {})
+                for field, value in fields.items():
+                    delta[field] = delta.get(field, 0) + value
+
+    async def _insert(self, batch: List[dict]) -> Optional[List[dict]]:
+        """insert_many the batch; returns the documents that were stored, None to retry later"""
+        try:
+            await self.events.insert_many(batch, ordered=False)
+            return batch
+        except BulkWriteError as e:
+            # Individually invalid documents would fail again: count them and keep the rest
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            self.rejected += len(failed)
+            logger.error(f"{len(failed)} of {len(batch)} interaction events rejected: {e}")
+            return [doc for i, doc in enumerate(batch) if i not in failed]
+        except Exception as e:
+            logger.error(f"Writing {len(batch)} interaction events failed: {e}")
+            self._buffer[:0] = batch
+            return None
+
+    async def flush(self) -> int:
+        """Write pending events and counter updates; returns the number of events stored"""
+        async with self._flush_lock:
+            if not self._buffer and not self._deltas:
+                return 0
+            batch, self._buffer = self._buffer, []
+            start = time.perf_counter()
+            try:
+                stored = await self._insert(batch) if batch else []
+                if stored is None:
+                    self.failed_flushes += 1
+                    return 0
+                self._fold(stored)
+                self.inserted += len(stored)
+
+                now = datetime.utcnow()
+                ops = [
+                    UpdateOne(
+                        {"day": day, "language": language},
+                        {"$inc": delta, "$max": {"updated_at": now}},
+                        upsert=True
+                    )
+                    for (day, language), delta in self._deltas.items()
+                ]
+                try:
+                    await self.counters.bulk_write(ops, ordered=False)
+                except Exception as e:
+                    self.failed_flushes += 1
+                    logger.error(f"Updating {len(ops)} interaction counters failed, retrying with the next batch: {e}")
+                    return len(stored)
+                self._deltas = {}
+                self.flushes += 1
+                return len(stored)
+            finally:
+                self.flush_latency.observe(time.perf_counter() - start)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write what is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._buffer or self._deltas:
+            logger.error(f"Lost {len(self._buffer)} interaction events and {len(self._deltas)} counter updates on shutdown")
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._buffer),
+            "pending_counters": len(self._deltas),
+            "max_batch": self.max_batch,
+            "flush_interval": self.flush_interval,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "inserted": self.inserted,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "flush_latency": self.flush_latency.snapshot(),
+        }
+
+
+async def ensure_event_collection(db, ttl: int = EVENT_TTL) -> None:
+    """Create bot_events as a time-series collection (MongoDB 5.0+), else a plain one with a TTL index"""
+    if await db.list_collection_names(filter={"name": EVENTS_COLLECTION}):
+        return
+    try:
+        await db.create_collection(
+            EVENTS_COLLECTION,
+            timeseries={"timeField": "ts", "metaField": "meta", "granularity": "seconds"},
+            expireAfterSeconds=ttl
+        )
+        logger.info(f"Created time-series collection {EVENTS_COLLECTION}")
+    except Exception as e:
+        logger.warning(f"Time-series collections unavailable ({e}); using a plain {EVENTS_COLLECTION} collection")
+        await db[EVENTS_COLLECTION].create_index("ts", name="ts_ttl", expireAfterSeconds=ttl)
+
+
+def _counts(doc: Optional[dict]) -> dict:
+    doc = doc or {}
+    return {"events": doc.get("events", {}), "users": doc.get("users", {})}
+
+
+def funnel(users: Dict[str, int]) -> List[dict]:
+    """Users per funnel step with conversion from the previous step and from the first"""
+    steps = []
+    first = users.get(FUNNEL[0], 0)
+    previous = None
+    for step in FUNNEL:
+        count = users.get(step, 0)
+        steps.append({
+            "step": step,
+            "users": count,
+            "from_previous": round(count / previous, 4) if previous else None,
+            "from_start": round(count / first, 4) if first else None,
+        })
+        previous = count
+    return steps
+
+
+async def funnel_dashboard(counters, days: int = 30, today: Optional[datetime] = None) -> dict:
+    """Funnel, per-language and per-day numbers from the counter documents only"""
+    today = (today or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    since = today - timedelta(days=days - 1)
+    totals = await counters.find({"day": None}, {"_id": 0, "language": 1, "events": 1, "users": 1}).to_list(None)
+    daily = await counters.find(
+        {"language": ALL, "day": {"$gte": since}}, {"_id": 0, "day": 1, "events": 1, "users": 1}
+    ).sort("day", -1).to_list(days)
+
+    overall = _counts(next((doc for doc in totals if doc["language"] == ALL), None))
+    return {
+        "funnel": funnel(overall["users"]),
+        "events": overall["events"],
+        "languages": {
+            doc["language"]: {**_counts(doc), "funnel": funnel(doc.get("users", {}))}
+            for doc in sorted(totals, key=lambda doc: doc["language"]) if doc["language"] != ALL
+        },
+        "days": [{"day": doc["day"].date().isoformat(), **_counts(doc)} for doc in daily],
+    }
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Portal authentication: hashed credentials in Mongo and JWT access tokens.
+
+Passwords are hashed with passlib (bcrypt) on a thread pool so a login never
+blocks the event loop that also drives the bot. Logins return a stateless
+JWT; verifying one uses keys loaded once at startup and a small cache of
+already verified tokens.
+
+Run directly to create a portal user or reset a password:
+
+    python auth.py set-password <role> <username>
+"""
+
+import asyncio
+import getpass
+import logging
+import os
+import secrets
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Iterable, Optional, Tuple
+
+import jwt
+from passlib.context import CryptContext
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+ROLES = ("admin", "teacher", "student")
+USERS_COLLECTION = "portal_users"
+
+class AuthError(Exception):
+    pass
+
+
+class PasswordHasher:
+    """passlib CryptContext whose hash/verify calls run on a thread pool.
+
+    bcrypt releases the GIL, so ``max_workers`` logins are hashed in
+    parallel while the event loop keeps serving updates. Nothing is hashed
+    at construction: the dummy hash is made by ``warm`` (or the first login
+    of an unknown user) on the pool, not while the server is importing.
+    """
+
+    def __init__(self, schemes: Iterable[str] = ("bcrypt",), rounds: Optional[int] = None, max_workers: int = 4):
+        settings = {"bcrypt__rounds": rounds} if rounds else {}
+        self.context = CryptContext(schemes=list(schemes), deprecated="auto", **settings)
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        # Verified against when the user does not exist, so unknown names take as long as wrong passwords
+        self._dummy_hash: Optional[str] = None
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def warm(self) -> None:
+        if self._dummy_hash is None:
+            self._dummy_hash = await self.hash(secrets.token_urlsafe(16))
+
+    async def verify(self, password: str, password_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """(matches, new hash if the stored one should be upgraded)"""
+        if password_hash is None:
+            await self.warm()
+            await self._run(self.context.verify, password, self._dummy_hash)
+            return False, None
+        return await self._run(self.context.verify_and_update, password, password_hash)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+class TokenService:
+    """Issue and verify JWT access tokens.
+
+    HS* algorithms take a shared secret; RS*/ES*/EdDSA take PEM keys, which
+    are parsed once here instead of on every request. Verified tokens are
+    remembered (bounded LRU) until they expire, so repeated calls with the
+    same token skip the signature check.
+    """
+
+    def __init__(
+        self,
+        signing_key,
+        verifying_key=None,
+        algorithm: str = "HS256",
+        ttl: float = 3600.0,
+        issuer: str = "telegram-bot-portal",
+        cache_size: int = 10000,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.algorithm = algorithm
+        self.ttl = ttl
+        self.issuer = issuer
+        self.cache_size = cache_size
+        self._clock = clock
+        self._signing_key = self._load_key(signing_key, private=True)
+        self._verifying_key = self._load_key(verifying_key or signing_key, private=False)
+        self._verified: "OrderedDict[str, dict]" = OrderedDict()
+        self.issued = 0
+        self.cache_hits = 0
+        self.verifications = 0
+        self.rejected = 0
+
+    def _load_key(self, key, private: bool):
+        if self.algorithm.startswith("HS") or not isinstance(key, (str, bytes)):
+            return key
+        from cryptography.hazmat.primitives import serialization
+
+        data = key.encode() if isinstance(key, str) else key
+        if private:
+            return serialization.load_pem_private_key(data, password=None)
+        try:
+            return serialization.load_pem_public_key(data)
+        except ValueError:
+            # A private key was given for both sides: verify with its public half
+            return serialization.load_pem_private_key(data, password=None).public_key()
+
+    def issue(self, subject: str, role: str) -> str:
+        now = int(self._clock())
+        self.issued += 1
+        return jwt.encode(
+            {"sub": subject, "role": role, "iss": self.issuer, "iat": now, "exp": now + int(self.ttl)},
+            self._signing_key,
+            algorithm=self.algorithm
+        )
+
+    def verify(self, token: str) -> dict:
+        """Claims of a valid token; raises AuthError otherwise"""
+        claims = self._verified.get(token)
+        if claims is not None:
+            if claims["exp"] > self._clock():
+                self.cache_hits += 1
+                self._verified.move_to_end(token)
+                return claims
+            del self._verified[token]
+
+        self.verifications += 1
+        try:
+            claims = jwt.decode(
+                token,
+                self._verifying_key,
+                algorithms=[self.algorithm],
+                issuer=self.issuer,
+                options={"require": ["exp", "sub", "role"]}
+            )
+        except jwt.PyJWTError as e:
+            self.rejected += 1
+            raise AuthError(f"Invalid token: {e}")
+        self._verified[token] = claims
+        while len(self._verified) > self.cache_size:
+            self._verified.popitem(last=False)
+        return claims
+
+    def stats(self) -> dict:
+        return {
+            "algorithm": self.algorithm,
+            "ttl": self.ttl,
+            "issued": self.issued,
+            "verifications": self.verifications,
+            "cache_hits": self.cache_hits,
+            "rejected": self.rejected,
+            "cached_tokens": len(self._verified),
+        }
+
+
+class AuthService:
+    """Portal users (username, role, password_hash) in the portal_users collection"""
+
+    def __init__(self, collection, hasher: PasswordHasher, tokens: TokenService):
+        self.collection = collection
+        self.hasher = hasher
+        self.tokens = tokens
+        self.logins = 0
+        self.failed_logins = 0
+
+    async def set_password(self, username: str, role: str, password: str) -> None:
+        if role not in ROLES:
+            raise AuthError(f"Unknown role {role!r}")
+        password_hash = await self.hasher.hash(password)
+        await self.collection.update_one(
+            {"username": username, "role": role},
+            {
+                "$set": {"password_hash": password_hash, "updated_at": datetime.utcnow()},
+                "$setOnInsert": {"created_at": datetime.utcnow()},
+            },
+            upsert=True
+        )
+
+    async def login(self, username: str, password: str, role: str) -> Optional[str]:
+        """A signed access token, or None if the credentials are wrong"""
+        user = await self.collection.find_one({"username": username, "role": role}, {"_id": 0, "password_hash": 1})
+        matches, new_hash = await self.hasher.verify(password, user["password_hash"] if user else None)
+        if not matches:
+            self.failed_logins += 1
+            return None
+        if new_hash:
+            # Stored hash uses outdated parameters; upgrade it while we have the password
+            await self.collection.update_one({"username": username, "role": role}, {"$set": {"password_hash": new_hash}})
+        self.logins += 1
+        return self.tokens.issue(username, role)
+
+    async def bootstrap(self, users: Iterable[Tuple[str, str, str]]) -> int:
+        """Seed (role, username, password) accounts if there are no portal users yet"""
+        if await self.collection.estimated_document_count():
+            return 0
+        seeded = 0
+        for role, username, password in users:
+            try:
+                await self.set_password(username, role, password)
+                seeded += 1
+            except DuplicateKeyError:
+                pass
+        if not seeded:
+            logger.warning("There are no portal accounts; create one with: python auth.py set-password <role> <username>")
+        return seeded
+
+    def stats(self) -> dict:
+        return {"logins": self.logins, "failed_logins": self.failed_logins, "tokens": self.tokens.stats()}
+
+
+def parse_bootstrap_users(value: str) -> Tuple[Tuple[str, str, str], ...]:
+    """'role:username:password,...' -> ((role, username, password), ...)"""
+    users = []
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        role, username, password = entry.split(":", 2)
+        users.append((role, username, password))
+    return tuple(users)
+
+
+def main(argv) -> int:
+    if len(argv) != 3 or argv[0] != "set-password" or argv[1] not in ROLES:
+        print(f"Usage: python auth.py set-password <{'|'.join(ROLES)}> <username>")
+        return 2
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    role, username = argv[1], argv[2]
+    password = getpass.getpass(f"New password for {role} {username}: ")
+    if not password or password != getpass.getpass("Repeat: "):
+        print("❌ Passwords are empty or do not match")
+        return 1
+
+    async def run():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        service = AuthService(client[os.environ['DB_NAME']][USERS_COLLECTION], PasswordHasher(), None)
+        await service.set_password(username, role, password)
+        client.close()
+
+    asyncio.run(run())
+    print(f"✅ Password set for {role} {username}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
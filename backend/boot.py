@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+Step = Callable[[], Awaitable[None]]
+
+
+class BootTasks:
+    """Startup steps that run in the background instead of in the startup event.
+
+    Each step (prepare the database, start the bot, ...) is retried with
+    jittered exponential backoff until it succeeds, so the process serves
+    /api/ as soon as it is up and a Mongo or Telegram outage at boot only
+    delays the parts that need them. Readiness checks ask ``done(name)``.
+    """
+
+    def __init__(self, min_delay: float = 1.0, max_delay: float = 60.0):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.started_at = time.monotonic()
+        self._steps: Dict[str, Step] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.attempts: Dict[str, int] = {}
+        self.errors: Dict[str, str] = {}
+        self.finished: Dict[str, float] = {}
+
+    def add(self, name: str, step: Step) -> None:
+        self._steps[name] = step
+        self.attempts[name] = 0
+
+    def done(self, name: str) -> bool:
+        return name in self.finished
+
+    async def _run(self, name: str, step: Step):
+        delay = self.min_delay
+        while True:
+            self.attempts[name] += 1
+            try:
+                await step()
+            except Exception as e:
+                self.errors[name] = str(e) or type(e).__name__
+                # Full jitter: workers that failed together don't retry together
+                wait = random.uniform(delay / 2, delay)
+                logger.error(f"Boot step {name} failed (attempt {self.attempts[name]}), retrying in {wait:.1f}s: {e}")
+                await asyncio.sleep(wait)
+                delay = min(delay * 2, self.max_delay)
+                continue
+            self.errors.pop(name, None)
+            self.finished[name] = time.monotonic() - self.started_at
+            logger.info(f"Boot step {name} done after {self.finished[name]:.2f}s ({self.attempts[name]} attempts)")
+            return
+
+    def start(self):
+        self.started_at = time.monotonic()
+        for name, step in self._steps.items():
+            if name not in self._tasks:
+                self._tasks[name] = asyncio.create_task(self._run(name, step))
+
+    async def stop(self):
+        """Cancel the steps still retrying"""
+        for task in self._tasks.values():
+            task.cancel()
+        for task in self._tasks.values():
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = {}
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "done": self.done(name),
+                "attempts": self.attempts[name],
+                "seconds": round(self.finished[name], 3) if name in self.finished else None,
+                "error": self.errors.get(name),
+            }
+            for name in self._steps
+        }
@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from resilience import NOT_SENT, CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows ~30 messages/s per bot overall and ~1 message/s per chat
+GLOBAL_RATE = 30.0
+PER_CHAT_INTERVAL = 1.0
+MAX_ATTEMPTS = 5
+LEASE_SECONDS = 120
+
+
+class LeaseLost(Exception):
+    """Another worker has taken over the broadcast; this one must stop sending"""
+
+
+class TokenBucket:
+    """Async token bucket; ``pause`` stops everyone, e.g. after a RetryAfter"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        self._tokens = 0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = self._clock()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatLimiter:
+    """Minimum spacing between messages to the same chat (bounded LRU of chats)"""
+
+    def __init__(self, interval: float = PER_CHAT_INTERVAL, max_chats: int = 10000):
+        self.interval = interval
+        self.max_chats = max_chats
+        self._last: "OrderedDict[str, float]" = OrderedDict()
+
+    async def wait(self, chat_id: str) -> None:
+        last = self._last.get(chat_id)
+        if last is not None:
+            delay = last + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        self._last[chat_id] = time.monotonic()
+        self._last.move_to_end(chat_id)
+        while len(self._last) > self.max_chats:
+            self._last.popitem(last=False)
+
+
+class Broadcaster:
+    """Send one localized message to every user in db.users.
+
+    Recipients are streamed from a cursor sorted by user_id and sent in
+    batches of ``concurrency``. After each batch the last user_id and the
+    counters are checkpointed in the ``broadcasts`` collection, so a restart
+    resumes after the checkpoint: at most one in-flight batch is resent. A
+    lease on the broadcast document keeps two workers from running the same
+    broadcast, so every bot worker can ``watch`` for new ones and a process
+    without a bot (``bot=None``) can still ``create`` them. The lease is
+    renewed in the background, also through long flood-control or breaker
+    pauses, and every write is conditional on still holding it: a worker
+    that lost it stops instead of sending alongside the new owner.
+    """
+
+    def __init__(self, bot, db, rate: float = GLOBAL_RATE, concurrency: int = 30):
+        self.bot = bot
+        self.db = db
+        self.bucket = TokenBucket(rate)
+        self.chats = ChatLimiter()
+        self.concurrency = concurrency
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def create(self, messages: Dict[str, str], default_language: str) -> str:
+        broadcast_id = str(uuid.uuid4())
+        await self.db.broadcasts.insert_one({
+            "_id": broadcast_id,
+            "status": "pending",
+            "messages": messages,
+            "default_language": default_language,
+            "created_at": datetime.utcnow(),
+            "last_user_id": None,
+            "total": await self.db.users.estimated_document_count(),
+            "sent": 0,
+            "blocked": 0,
+            "failed": 0,
+            "rate": 0.0,
+            "eta_seconds": None,
+            "lease_until": None,
+        })
+        return broadcast_id
+
+    def start(self, broadcast_id: str) -> None:
+        if broadcast_id not in self._tasks:
+            task = asyncio.create_task(self.run(broadcast_id))
+            self._tasks[broadcast_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+
+    async def resume_unfinished(self) -> None:
+        """Restart broadcasts left pending or running by a previous process"""
+        async for doc in self.db.broadcasts.find({"status": {"$in": ["pending", "running"]}}, {"_id": 1}):
+            self.start(doc["_id"])
+
+    def watch(self, interval: float) -> None:
+        """Pick up broadcasts created by other processes every ``interval`` seconds"""
+        async def loop():
+            while True:
+                try:
+                    await self.resume_unfinished()
+                except Exception as e:
+                    logger.error(f"Failed to look for unfinished broadcasts: {e}")
+                await asyncio.sleep(interval)
+
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(loop())
+
+    async def stop(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def _claim(self, broadcast_id: str) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.db.broadcasts.find_one_and_update(
+            {
+                "_id": broadcast_id,
+                "status": {"$in": ["pending", "running"]},
+                "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}, {"worker": self.worker_id}],
+            },
+            {"$set": {
+                "status": "running",
+                "worker": self.worker_id,
+                "lease_until": now + timedelta(seconds=LEASE_SECONDS),
+            }},
+            return_document=True
+        )
+
+    async def _update_owned(self, broadcast_id: str, fields: dict) -> None:
+        """$set ``fields`` on the broadcast if this worker still holds it; raises LeaseLost otherwise"""
+        result = await self.db.broadcasts.update_one({"_id": broadcast_id, "worker": self.worker_id}, {"$set": fields})
+        if result.matched_count == 0:
+            raise LeaseLost(broadcast_id)
+
+    async def _keep_lease(self, broadcast_id: str, sender: asyncio.Task, lost: asyncio.Event) -> None:
+        """Renew the lease while the broadcast runs; cancel ``sender`` once it is lost"""
+        while True:
+            await asyncio.sleep(LEASE_SECONDS / 3)
+            try:
+                await self._update_owned(broadcast_id, {"lease_until": datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)})
+            except LeaseLost:
+                lost.set()
+                sender.cancel()
+                return
+            except Exception as e:
+                logger.warning(f"Could not renew the lease of broadcast {broadcast_id}: {e}")
+
+    async def _send(self, chat_id: str, text: str) -> str:
+        """Send with retries; returns 'sent', 'blocked' or 'failed'.
+
+        Only failures where the message provably never left the process are
+        retried: after a read timeout Telegram may have delivered it already.
+        """
+        attempt = 0
+        while attempt < MAX_ATTEMPTS:
+            await self.bucket.acquire()
+            await self.chats.wait(chat_id)
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text)
+                return "sent"
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+                logger.warning(f"Broadcast hit flood control, pausing {retry_after}s")
+                self.bucket.pause(retry_after)
+            except CircuitOpen as e:
+                # Telegram is failing for everyone: wait for the breaker, don't fail the recipient
+                self.bucket.pause(max(e.retry_in, 1.0))
+                continue
+            except Forbidden:
+                return "blocked"
+            except BadRequest as e:
+                logger.warning(f"Broadcast to {chat_id} rejected: {e}")
+                return "failed"
+            except NetworkError as e:
+                if not isinstance(e.__cause__, NOT_SENT):
+                    logger.warning(f"Broadcast to {chat_id} may or may not have been delivered, not retrying: {e}")
+                    return "failed"
+                await asyncio.sleep(min(2 ** attempt, 30))
+                logger.warning(f"Broadcast to {chat_id} attempt {attempt + 1} failed: {e}")
+            attempt += 1
+        return "failed"
+
+    async def run(self, broadcast_id: str) -> None:
+        doc = await self._claim(broadcast_id)
+        if doc is None:
+            logger.debug(f"Broadcast {broadcast_id} is finished or owned by another worker")
+            return
+
+        messages, default_language = doc["messages"], doc["default_language"]
+        counts = {key: doc[key] for key in ("sent", "blocked", "failed")}
+        processed_before = sum(counts.values())
+        last_user_id = doc["last_user_id"]
+        started = time.monotonic()
+
+        query = {"user_id": {"$gt": last_user_id}} if last_user_id else {}
+        cursor = self.db.users.find(query, {"_id": 0, "user_id": 1, "language": 1}).sort("user_id", 1)
+
+        async def checkpoint(batch):
+            nonlocal last_user_id
+            results = await asyncio.gather(*(
+                self._send(user["user_id"], messages.get(user.get("language"), messages[default_language]))
+                for user in batch
+            ))
+            for result in results:
+                counts[result] += 1
+            last_user_id = batch[-1]["user_id"]
+            processed = sum(counts.values())
+            rate = (processed - processed_before) / max(time.monotonic() - started, 1e-9)
+            remaining = max(doc["total"] - processed, 0)
+            await self._update_owned(broadcast_id, {
+                **counts,
+                "last_user_id": last_user_id,
+                "rate": round(rate, 2),
+                "eta_seconds": round(remaining / rate) if rate else None,
+                "lease_until": datetime.utcnow() + timedelta(seconds=LEASE_SECONDS),
+            })
+
+        lost = asyncio.Event()
+        keeper = asyncio.create_task(self._keep_lease(broadcast_id, asyncio.current_task(), lost))
+        try:
+            batch = []
+            async for user in cursor:
+                batch.append(user)
+                if len(batch) >= self.concurrency:
+                    await checkpoint(batch)
+                    batch = []
+            if batch:
+                await checkpoint(batch)
+            await self._update_owned(broadcast_id, {
+                "status": "completed",
+                "completed_at": datetime.utcnow(),
+                "eta_seconds": 0,
+                "lease_until": None,
+            })
+        except LeaseLost:
+            logger.warning(f"Broadcast {broadcast_id} was taken over by another worker, stopping")
+            return
+        except asyncio.CancelledError:
+            if lost.is_set():
+                logger.warning(f"Lease of broadcast {broadcast_id} lost during a pause, stopping")
+                return
+            # Keep status "running" so the next process resumes from the checkpoint
+            await self.db.broadcasts.update_one(
+                {"_id": broadcast_id, "worker": self.worker_id}, {"$set": {"lease_until": None}}
+            )
+            raise
+        finally:
+            keeper.cancel()
+            await asyncio.gather(keeper, return_exceptions=True)
+        logger.info(f"Broadcast {broadcast_id} completed: {counts}")
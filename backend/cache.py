@@ -0,0 +1,252 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[str], None]
+
+
+class Cache(ABC):
+    """String key/value cache with TTLs and pub/sub, shared or per process"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """Set only if the key is absent; False if it already had a value"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    async def publish(self, channel: str, message: str) -> None:
+        ...
+
+    @abstractmethod
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryCache(Cache):
+    """In-process LRU cache; pub/sub only reaches this process"""
+
+    def __init__(self, max_entries: int = 100000, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[Optional[float], str]]" = OrderedDict()
+        self._handlers: Dict[str, List[MessageHandler]] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and self._clock() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._entries[key] = (self._clock() + ttl if ttl else None, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def publish(self, channel: str, message: str) -> None:
+        for handler in self._handlers.get(channel, []):
+            handler(message)
+
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        self._handlers.setdefault(channel, []).append(handler)
+
+
+class RedisCache(Cache):
+    """Cache on a Redis-protocol server (Redis, Valkey, fakeredis' TcpFakeServer)"""
+
+    def __init__(self, client):
+        self.client = client
+        self._listeners: List[asyncio.Task] = []
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisCache":
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError(f"CACHE_URL={url} needs the 'redis' package (pip install redis)")
+        return cls(redis.from_url(url, decode_responses=True))
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await self.client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return bool(await self.client.set(key, value, px=int(ttl * 1000) if ttl else None, nx=True))
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(key)
+
+    async def publish(self, channel: str, message: str) -> None:
+        await self.client.publish(channel, message)
+
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(channel)
+
+        async def listen():
+            while True:
+                try:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None:
+                        data = message["data"]
+                        handler(data.decode() if isinstance(data, bytes) else data)
+                except asyncio.CancelledError:
+                    await pubsub.aclose()
+                    raise
+                except Exception as e:
+                    logger.error(f"Cache subscription to {channel} failed: {e}")
+                    await asyncio.sleep(1.0)
+
+        self._listeners.append(asyncio.create_task(listen()))
+
+    async def close(self) -> None:
+        for task in self._listeners:
+            task.cancel()
+        await asyncio.gather(*self._listeners, return_exceptions=True)
+        self._listeners = []
+        await self.client.aclose()
+
+
+def create_cache(url: str) -> Cache:
+    """memory:// (default), redis://host:port/db or rediss://..."""
+    if not url or url.startswith("memory://"):
+        return MemoryCache()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache.from_url(url)
+    raise ValueError(f"Unsupported CACHE_URL: {url}")
+
+
+class UserProfileCache:
+    """Read-through / write-through cache of user profiles over db.users.
+
+    Reads hit the shared cache and fall back to Mongo, merging the writes
+    still buffered; a fill never overwrites a value written in the meantime.
+    Writes go to Mongo through ``writer`` (a UserWriteBuffer) and are merged
+    into the cached profile without reading Mongo: on a miss only the
+    written fields are cached, as a partial entry that blocks stale fills
+    and is laid over Mongo by the next read on any worker. Every write
+    publishes the user_id on ``INVALIDATION_CHANNEL``, so the other workers
+    drop their in-process copies (see ``on_invalidate``).
+    """
+
+    INVALIDATION_CHANNEL = "user-profile-invalidate"
+    FIELDS = ("user_id", "language", "username", "full_name", "user_data", "user_data_version")
+    # Marks a cached entry holding only the fields written since a miss
+    PARTIAL = "_partial"
+
+    def __init__(self, cache: Cache, collection, writer, ttl: float = 3600.0):
+        self.cache = cache
+        self.collection = collection
+        self.writer = writer
+        self.ttl = ttl
+        self.origin = uuid.uuid4().hex
+        self._invalidation_handlers: List[Callable[[str], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.invalidations_sent = 0
+        self.invalidations_received = 0
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f"user:{user_id}"
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        cached = await self.cache.get(self._key(user_id))
+        written = None
+        if cached is not None:
+            entry = json.loads(cached)
+            if self.PARTIAL not in entry:
+                self.hits += 1
+                return entry
+            written = entry[self.PARTIAL]
+        self.misses += 1
+        profile = await self.collection.find_one(
+            {"user_id": user_id}, {"_id": 0, **{field: 1 for field in self.FIELDS}}
+        )
+        # The partial entry holds every worker's writes since the miss, so it wins over ours
+        pending = {**(self.writer.pending(user_id) or {}), **(written or {})}
+        if pending:
+            profile = {**(profile or {"user_id": user_id}), **pending}
+        if profile is not None:
+            value = json.dumps(profile, default=str)
+            if written is None:
+                await self.cache.add(self._key(user_id), value, self.ttl)
+            else:
+                await self.cache.set(self._key(user_id), value, self.ttl)
+        return profile
+
+    async def update(self, user_id: str, fields: dict) -> None:
+        self.writer.upsert(user_id, fields)
+        cached = await self.cache.get(self._key(user_id))
+        if cached is None:
+            entry = {self.PARTIAL: fields}
+        else:
+            entry = json.loads(cached)
+            if self.PARTIAL in entry:
+                entry[self.PARTIAL] = {**entry[self.PARTIAL], **fields}
+            else:
+                entry.update(fields)
+        await self.cache.set(self._key(user_id), json.dumps(entry, default=str), self.ttl)
+        self.invalidations_sent += 1
+        await self.cache.publish(self.INVALIDATION_CHANNEL, json.dumps({"user_id": user_id, "origin": self.origin}))
+
+    def on_invalidate(self, handler: Callable[[str], None]) -> None:
+        self._invalidation_handlers.append(handler)
+
+    def _dispatch_invalidation(self, message: str) -> None:
+        event = json.loads(message)
+        if event["origin"] == self.origin:
+            return
+        self.invalidations_received += 1
+        for handler in self._invalidation_handlers:
+            handler(event["user_id"])
+
+    async def start(self) -> None:
+        await self.cache.subscribe(self.INVALIDATION_CHANNEL, self._dispatch_invalidation)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.cache).__name__,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations_sent": self.invalidations_sent,
+            "invalidations_received": self.invalidations_received,
+        }
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram.ext import BaseUpdateProcessor
+
+from metrics import Histogram
+
+
+def update_key(update: object) -> Optional[int]:
+    """Ordering key for an update: the user, falling back to the chat"""
+    user = getattr(update, "effective_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(update, "effective_chat", None)
+    if chat is not None:
+        return chat.id
+    return None
+
+
+class _KeyLock:
+    __slots__ = ("lock", "waiters")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.waiters = 0
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """Process updates concurrently while keeping each user's updates in order.
+
+    ``max_pending_updates`` is the semaphore PTB holds around every update,
+    including updates that are only waiting for their user's previous update
+    to finish. ``max_concurrent_updates`` is the number of handlers actually
+    running at once; the slot is taken only after the per-user lock, so one
+    chatty user cannot starve everyone else of slots.
+
+    ``waiting`` records how long updates waited for their user and a slot,
+    ``handling`` how long the handlers then ran.
+    """
+
+    def __init__(self, max_concurrent_updates: int = 64, max_pending_updates: int = 1024):
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self.max_running_updates = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._locks: Dict[Any, _KeyLock] = {}
+        self.running = 0
+        self.processed = 0
+        self.waiting = Histogram()
+        self.handling = Histogram()
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        queued = time.perf_counter()
+        key = update_key(update)
+        if key is None:
+            await self._run(coroutine, queued)
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = _KeyLock()
+        entry.waiters += 1
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, which keeps per-user ordering
+            async with entry.lock:
+                await self._run(coroutine, queued)
+        finally:
+            entry.waiters -= 1
+            if entry.waiters == 0:
+                del self._locks[key]
+
+    async def _run(self, coroutine: Awaitable[Any], queued: float) -> None:
+        async with self._slots:
+            start = time.perf_counter()
+            self.waiting.observe(start - queued)
+            self.running += 1
+            try:
+                await coroutine
+            finally:
+                self.running -= 1
+                self.processed += 1
+                self.handling.observe(time.perf_counter() - start)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "max_running": self.max_running_updates,
+            "pending": self.current_concurrent_updates,
+            "max_pending": self.max_concurrent_updates,
+            "active_keys": len(self._locks),
+            "processed": self.processed,
+        }
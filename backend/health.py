@@ -0,0 +1,126 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+Check = Callable[[], Union[bool, Awaitable[bool]]]
+
+
+class Health:
+    """Liveness and readiness of one process (an API or a bot worker).
+
+    Checks run in the background every ``interval`` seconds and the
+    endpoints only read the last results, so probes stay cheap however often
+    they come. With ``status_dir`` set (by the supervisor) every round is
+    also published as a heartbeat file, ``<role>-<pid>.json``: a file that
+    stops changing means the process is hung, ``ready: false`` that it is up
+    but cannot serve yet.
+    """
+
+    def __init__(self, role: str, status_dir: Optional[str] = None, interval: float = 2.0, check_timeout: float = 2.0):
+        self.role = role
+        self.status_dir = Path(status_dir) if status_dir else None
+        self.interval = interval
+        self.check_timeout = check_timeout
+        self.started_at = time.time()
+        self.updated_at: Optional[float] = None
+        self.results: Dict[str, bool] = {}
+        self._checks: Dict[str, Check] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def add_check(self, name: str, check: Check) -> None:
+        self._checks[name] = check
+        self.results[name] = False
+
+    @property
+    def ready(self) -> bool:
+        return self.updated_at is not None and all(self.results.values())
+
+    async def _run(self, name: str, check: Check) -> bool:
+        try:
+            result = check()
+            if asyncio.iscoroutine(result):
+                result = await asyncio.wait_for(result, timeout=self.check_timeout)
+            return bool(result)
+        except Exception as e:
+            logger.warning(f"Health check {name} failed: {e}")
+            return False
+
+    async def run_checks(self) -> None:
+        names = list(self._checks)
+        results = await asyncio.gather(*(self._run(name, self._checks[name]) for name in names))
+        was_ready = self.ready
+        self.results = dict(zip(names, results))
+        self.updated_at = time.time()
+        if self.ready != was_ready:
+            logger.info(f"{self.role} worker is {'ready' if self.ready else 'not ready'}: {self.results}")
+
+    def status(self) -> dict:
+        return {
+            "role": self.role,
+            "pid": os.getpid(),
+            "ready": self.ready,
+            "checks": self.results,
+            "started_at": self.started_at,
+            "updated_at": self.updated_at,
+        }
+
+    @property
+    def heartbeat_path(self) -> Optional[Path]:
+        return self.status_dir / f"{self.role}-{os.getpid()}.json" if self.status_dir else None
+
+    def _publish(self) -> None:
+        fd, tmp_name = tempfile.mkstemp(dir=self.status_dir, prefix=".heartbeat.")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.status(), f)
+        os.replace(tmp_name, self.heartbeat_path)
+
+    async def _loop(self):
+        while True:
+            await self.run_checks()
+            if self.status_dir:
+                try:
+                    self._publish()
+                except OSError as e:
+                    logger.error(f"Failed to publish heartbeat: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.heartbeat_path:
+            self.heartbeat_path.unlink(missing_ok=True)
+
+
+def read_heartbeat(path: Path) -> Optional[dict]:
+    try:
+        return json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def read_heartbeats(status_dir: str, max_age: float) -> List[dict]:
+    """Every worker's last heartbeat, with ``fresh`` false once older than ``max_age``"""
+    now = time.time()
+    workers = []
+    for path in sorted(Path(status_dir).glob("*.json")):
+        status = read_heartbeat(path)
+        if status is not None:
+            status["fresh"] = status["updated_at"] is not None and now - status["updated_at"] <= max_age
+            workers.append(status)
+    return workers
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Index bootstrap and query plan checks for the bot's Mongo collections.
+
+Run directly to create the indexes and verify that no hot query falls back
+to a collection scan (exits non-zero if one does):
+
+    python indexes.py
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+# Unfinished registration drafts and conversation states are dropped after a week without a step
+DRAFT_TTL = 7 * 24 * 3600
+
+# collection -> indexes it needs
+INDEXES = {
+    "users": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+        IndexModel([("language", ASCENDING), ("user_id", ASCENDING)], name="language_user_id"),
+        IndexModel([("timestamp", ASCENDING), ("user_id", ASCENDING)], name="timestamp_user_id"),
+    ],
+    "portal_users": [
+        IndexModel([("username", ASCENDING), ("role", ASCENDING)], name="username_role_unique", unique=True),
+    ],
+    "media_cache": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+    ],
+    "status_rollups": [
+        IndexModel(
+            [("granularity", ASCENDING), ("client_name", ASCENDING), ("bucket", DESCENDING)],
+            name="granularity_client_bucket_unique",
+            unique=True
+        ),
+        IndexModel([("granularity", ASCENDING), ("bucket", DESCENDING)], name="granularity_bucket"),
+    ],
+    "registrations": [
+        IndexModel([("registration_id", ASCENDING)], name="registration_id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("submitted_at", ASCENDING), ("registration_id", ASCENDING)], name="status_submitted_at"),
+        # One draft per user; submitted registrations are not limited
+        IndexModel(
+            [("user_id", ASCENDING)],
+            name="user_id_draft_unique",
+            unique=True,
+            partialFilterExpression={"status": "draft"}
+        ),
+        IndexModel(
+            [("updated_at", ASCENDING)],
+            name="draft_ttl",
+            expireAfterSeconds=DRAFT_TTL,
+            partialFilterExpression={"status": "draft"}
+        ),
+    ],
+    "conversations": [
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_ttl", expireAfterSeconds=DRAFT_TTL),
+    ],
+    "bot_event_counters": [
+        IndexModel([("day", ASCENDING), ("language", ASCENDING)], name="day_language_unique", unique=True),
+        IndexModel([("language", ASCENDING), ("day", DESCENDING)], name="language_day"),
+    ],
+}
+
+# Indexes earlier versions created and nothing uses any more: collection -> names
+OBSOLETE_INDEXES = {
+    # Replaced by timestamp_ttl, which serves the same newest-first sort
+    "status_checks": ["timestamp_desc"],
+}
+
+# Retention defaults: raw status checks for 7 days, minute rollups for 30 days, hour rollups forever
+STATUS_CHECK_TTL = 7 * 24 * 3600
+MINUTE_ROLLUP_TTL = 30 * 24 * 3600
+
+
+def ttl_indexes(status_check_ttl: int, minute_rollup_ttl: int) -> Dict[str, List[IndexModel]]:
+    return {
+        "status_checks": [
+            IndexModel([("timestamp", ASCENDING)], name="timestamp_ttl", expireAfterSeconds=status_check_ttl),
+        ],
+        "status_rollups": [
+            IndexModel(
+                [("bucket", ASCENDING)],
+                name="minute_bucket_ttl",
+                expireAfterSeconds=minute_rollup_ttl,
+                partialFilterExpression={"granularity": "minute"}
+            ),
+        ],
+    }
+
+# (collection, filter, sort) for every query the bot or API runs per request
+HOT_QUERIES = [
+    ("users", {"user_id": "0"}, None),
+    ("users", {}, [("user_id", ASCENDING)]),
+    ("users", {"language": "am"}, [("user_id", ASCENDING)]),
+    ("users", {"timestamp": {"$gte": datetime(2000, 1, 1), "$type": "date"}}, [("timestamp", ASCENDING), ("user_id", ASCENDING)]),
+    ("status_checks", {}, [("timestamp", DESCENDING)]),
+    ("status_rollups", {"granularity": "minute", "bucket": {"$gte": datetime(2000, 1, 1)}}, [("bucket", DESCENDING)]),
+    ("status_rollups", {"granularity": "hour", "client_name": "x"}, [("bucket", DESCENDING)]),
+    ("media_cache", {"key": "welcome_photo"}, None),
+    ("portal_users", {"username": "admin", "role": "admin"}, None),
+    ("registrations", {"user_id": "0", "status": "draft"}, None),
+    ("registrations", {"status": "pending"}, [("submitted_at", ASCENDING), ("registration_id", ASCENDING)]),
+    ("registrations", {"registration_id": "x", "status": {"$in": ["pending", "approved", "rejected"]}}, None),
+    ("bot_event_counters", {"day": None}, None),
+    ("bot_event_counters", {"language": "*", "day": {"$gte": datetime(2000, 1, 1)}}, [("day", DESCENDING)]),
+]
+
+
+class QueryPlanError(RuntimeError):
+    pass
+
+
+def _key(key) -> List[Tuple[str, object]]:
+    # Servers may report directions as floats (1.0)
+    return [(field, int(direction) if isinstance(direction, float) else direction) for field, direction in key]
+
+
+def index_changes(existing: Dict[str, dict], indexes: List[IndexModel]) -> Tuple[List[str], Dict[str, int]]:
+    """(indexes to drop and recreate, new TTLs to apply in place) for ``existing`` (index_information()).
+
+    create_indexes fails with IndexOptionsConflict when an index of the same
+    name differs, e.g. after a TTL setting was changed. A TTL-only change is
+    applied with collMod; any other change means dropping the old index.
+    """
+    drop, ttls = [], {}
+    for index in indexes:
+        spec = index.document
+        current = existing.get(spec["name"])
+        if current is None:
+            continue
+        if (
+            _key(current["key"]) != _key(spec["key"].items())
+            or bool(current.get("unique")) != bool(spec.get("unique"))
+            or current.get("partialFilterExpression") != spec.get("partialFilterExpression")
+            or ("expireAfterSeconds" in current) != ("expireAfterSeconds" in spec)
+        ):
+            drop.append(spec["name"])
+        elif current.get("expireAfterSeconds") != spec.get("expireAfterSeconds"):
+            ttls[spec["name"]] = spec["expireAfterSeconds"]
+    return drop, ttls
+
+
+async def ensure_indexes(db, status_check_ttl: int = STATUS_CHECK_TTL, minute_rollup_ttl: int = MINUTE_ROLLUP_TTL) -> None:
+    """Create missing indexes, bring changed ones up to date and drop obsolete ones"""
+    ttl = ttl_indexes(status_check_ttl, minute_rollup_ttl)
+    for collection in {**INDEXES, **ttl, **OBSOLETE_INDEXES}:
+        indexes = INDEXES.get(collection, []) + ttl.get(collection, [])
+        existing = await db[collection].index_information()
+        drop, ttls = index_changes(existing, indexes)
+        for name in OBSOLETE_INDEXES.get(collection, []):
+            if name in existing:
+                drop.append(name)
+        for name in drop:
+            await db[collection].drop_index(name)
+            logger.info(f"Dropped index {name} on {collection}")
+        for name, seconds in ttls.items():
+            await db.command({"collMod": collection, "index": {"name": name, "expireAfterSeconds": seconds}})
+            logger.info(f"TTL of {name} on {collection} set to {seconds}s")
+        if indexes:
+            names = await db[collection].create_indexes(indexes)
+            logger.info(f"Indexes ensured on {collection}: {', '.join(names)}")
+
+
+def _plan_stages(plan: dict) -> Iterator[str]:
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        if "stage" in node:
+            yield node["stage"]
+        for key in ("inputStage", "queryPlan", "winningPlan"):
+            if key in node:
+                stack.append(node[key])
+        stack.extend(node.get("inputStages", []))
+
+
+async def collscan_queries(db) -> List[Tuple[str, dict, list]]:
+    """Hot queries whose winning plan contains a COLLSCAN stage"""
+    offenders = []
+    for collection, query, sort in HOT_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.limit(1).explain()
+        if "COLLSCAN" in _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {})):
+            offenders.append((collection, query, sort))
+    return offenders
+
+
+async def check_query_plans(db) -> None:
+    """Raise QueryPlanError if any hot query would scan its whole collection"""
+    offenders = await collscan_queries(db)
+    for collection, query, sort in offenders:
+        logger.error(f"COLLSCAN on {collection}: filter={query} sort={sort}")
+    if offenders:
+        raise QueryPlanError(f"{len(offenders)} hot queries fall back to COLLSCAN")
+
+
+async def main() -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        await ensure_indexes(db)
+        await check_query_plans(db)
+    except QueryPlanError as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        client.close()
+    print("✅ All hot queries use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    raise SystemExit(asyncio.run(main()))
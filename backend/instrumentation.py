@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from pymongo import monitoring
+from telegram.request import HTTPXRequest
+
+from metrics import Histogram, HistogramFamily
+from resilience import ResilientRequest
+
+logger = logging.getLogger(__name__)
+
+# Buckets for event loop lag: a healthy loop stays well under a millisecond
+LAG_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that times every Bot API call by method name.
+
+    Passed to ApplicationBuilder.request(); leaving it out (metrics
+    disabled) leaves the Telegram client untouched.
+    """
+
+    def __init__(self, latency: HistogramFamily, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.errors: Dict[Tuple[str, int], int] = {}
+
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> Tuple[int, bytes]:
+        # .../bot<token>/sendPhoto -> sendPhoto; the token never reaches a label
+        api_method = "file_download" if "/file/bot" in url else url.rsplit("/", 1)[-1]
+        start = time.perf_counter()
+        status = 0
+        try:
+            status, payload = await super().do_request(url, method, *args, **kwargs)
+            return status, payload
+        finally:
+            self.latency.labels(api_method).observe(time.perf_counter() - start)
+            if not 200 <= status < 300:
+                key = (api_method, status)
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+
+class InstrumentedResilientRequest(ResilientRequest, InstrumentedRequest):
+    """ResilientRequest whose every attempt is timed: retries show up in the
+    latency histogram and error counts, not just the final outcome."""
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener recording latency per collection and command.
+
+    Registered through ``event_listeners`` when the client is created, so
+    nothing is installed when metrics are disabled. pymongo calls it from
+    Motor's worker threads, hence the lock.
+    """
+
+    def __init__(self, latency: HistogramFamily):
+        self.latency = latency
+        self.failures: Dict[Tuple[str, str], int] = {}
+        self._collections: Dict[Tuple, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(event) -> Tuple:
+        return (event.connection_id, event.request_id)
+
+    def started(self, event) -> None:
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else "-"
+        with self._lock:
+            self._collections[self._key(event)] = collection
+
+    def _finish(self, event, failed: bool) -> None:
+        with self._lock:
+            collection = self._collections.pop(self._key(event), "-")
+            self.latency.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+            if failed:
+                key = (collection, event.command_name)
+                self.failures[key] = self.failures.get(key, 0) + 1
+
+    def succeeded(self, event) -> None:
+        self._finish(event, False)
+
+    def failed(self, event) -> None:
+        self._finish(event, True)
+
+
+class LoopLagMonitor:
+    """Measure how late the event loop wakes up a task sleeping ``interval`` s.
+
+    Anything blocking the loop (sync I/O, CPU work, bcrypt on the loop)
+    shows up here as lag for the bot and the API alike.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.lag = Histogram(LAG_BUCKETS)
+        self.last = 0.0
+        self.max = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.last = max(time.perf_counter() - start - self.interval, 0.0)
+            self.max = max(self.max, self.last)
+            self.lag.observe(self.last)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,87 @@
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup, WebAppInfo
+
+KeyboardBuilder = Callable[[Optional[str]], Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]]
+
+
+def build_language_picker(languages: dict) -> InlineKeyboardMarkup:
+    """One button per language, same for every user"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(lang_data["name"], callback_data=f"lang_{lang_code}")]
+        for lang_code, lang_data in languages.items()
+    ])
+
+
+def build_main_menu(texts: dict, web_app_url: str) -> InlineKeyboardMarkup:
+    """Main menu buttons for one language"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(texts['channel'], callback_data="channel")],
+        [InlineKeyboardButton(texts['admin'], callback_data="admin")],
+        [InlineKeyboardButton(texts['register'], callback_data="register")],
+        [InlineKeyboardButton(texts['education_info'], callback_data="education_info")],
+        [InlineKeyboardButton(texts['restart'], callback_data="restart")],
+        [InlineKeyboardButton(texts['mini_app'], web_app=WebAppInfo(url=web_app_url))]
+    ])
+
+
+def build_choices(texts: dict, choices: Dict[str, str], callback_prefix: str) -> InlineKeyboardMarkup:
+    """One button per choice (choice -> text key of its label) and a back button"""
+    return InlineKeyboardMarkup([
+        *([InlineKeyboardButton(texts[key], callback_data=f"{callback_prefix}{choice}")] for choice, key in choices.items()),
+        [InlineKeyboardButton(texts['back_button'], callback_data="main_menu")]
+    ])
+
+
+def build_confirm(texts: dict, confirm_data: str, cancel_data: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton(texts['confirm_button'], callback_data=confirm_data),
+        InlineKeyboardButton(texts['cancel_button'], callback_data=cancel_data)
+    ]])
+
+
+def build_contact_request(text: str) -> ReplyKeyboardMarkup:
+    """Reply keyboard whose single button shares the user's phone number"""
+    return ReplyKeyboardMarkup([[KeyboardButton(text, request_contact=True)]], resize_keyboard=True, one_time_keyboard=True)
+
+
+def build_single_button(text: str, callback_data: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton(text, callback_data=callback_data)]])
+
+
+class KeyboardRegistry:
+    """Memoized InlineKeyboardMarkup per (screen, lang_code).
+
+    PTB telegram objects are frozen once built, so one markup instance can be
+    shared by every callback. Call ``invalidate`` after the texts change.
+    """
+
+    def __init__(self):
+        self._builders: Dict[str, KeyboardBuilder] = {}
+        self._cache: Dict[Tuple[str, Optional[str]], InlineKeyboardMarkup] = {}
+        self._per_language: Dict[str, bool] = {}
+
+    def register(self, screen: str, builder: KeyboardBuilder, per_language: bool = True) -> None:
+        self._builders[screen] = builder
+        self._per_language[screen] = per_language
+        self._cache = {k: v for k, v in self._cache.items() if k[0] != screen}
+
+    def get(self, screen: str, lang_code: Optional[str] = None) -> InlineKeyboardMarkup:
+        key = (screen, lang_code if self._per_language[screen] else None)
+        markup = self._cache.get(key)
+        if markup is None:
+            markup = self._cache[key] = self._builders[screen](key[1])
+        return markup
+
+    def warm(self, lang_codes: Iterable[str]) -> None:
+        """Build every registered screen up front"""
+        lang_codes = list(lang_codes)
+        for screen, per_language in self._per_language.items():
+            for lang_code in (lang_codes if per_language else [None]):
+                self.get(screen, lang_code)
+
+    def invalidate(self) -> None:
+        self._cache = {}
+
+    def __len__(self) -> int:
+        return len(self._cache)
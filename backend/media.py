@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import httpx
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+
+class PhotoSource:
+    """A photo we send repeatedly: a local file with a remote URL as origin.
+
+    ``load()`` reads the local copy, or the bundled ``fallback`` while there
+    is none, on a worker thread; ``fingerprint()`` and ``payload()`` only use
+    what it read, so sending never touches the disk on the event loop. The
+    fingerprint is the sha256 of those bytes, or the URL itself when no file
+    is loaded. Any change to the source changes the fingerprint, which is
+    what invalidates the cached Telegram file_id.
+    """
+
+    def __init__(self, path: Path, url: str = "", fallback: Optional[Path] = None):
+        self.path = Path(path)
+        self.url = url
+        self.fallback = Path(fallback) if fallback else None
+        self._data: Optional[bytes] = None
+        self._digest: Optional[str] = None
+
+    def _read(self) -> Optional[bytes]:
+        for path in (self.path, self.fallback):
+            if path is not None and path.exists():
+                return path.read_bytes()
+        return None
+
+    async def load(self) -> None:
+        data = await asyncio.to_thread(self._read)
+        self._data = data
+        self._digest = hashlib.sha256(data).hexdigest() if data is not None else None
+
+    def fingerprint(self) -> str:
+        if self._digest is None:
+            if not self.url:
+                raise FileNotFoundError(f"No photo loaded from {self.path}")
+            return f"url:{self.url}"
+        return f"sha256:{self._digest}"
+
+    def payload(self):
+        """What to hand to reply_photo when there is no cached file_id"""
+        return self._data if self._data is not None else self.url
+
+    async def ensure_local_copy(self, timeout: float = 30.0) -> bool:
+        """Download the URL into the local path once, outside request time, and load it"""
+        if self.path.exists() or not self.url:
+            return self.path.exists()
+        try:
+            async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as http:
+                response = await http.get(self.url)
+                response.raise_for_status()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + ".part")
+            await asyncio.to_thread(tmp_path.write_bytes, response.content)
+            tmp_path.replace(self.path)
+            logger.info(f"Cached {self.url} at {self.path}")
+        except Exception as e:
+            logger.warning(f"Could not fetch local copy of {self.url}: {e}")
+            return False
+        await self.load()
+        return True
+
+
+class MediaCache:
+    """Telegram file_id cache persisted in Mongo with an in-process memo"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._memo: Dict[str, Tuple[str, str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str, fingerprint: str) -> Optional[str]:
+        cached = self._memo.get(key)
+        if cached is None:
+            doc = await self.collection.find_one({"key": key}, {"_id": 0, "fingerprint": 1, "file_id": 1})
+            if doc:
+                cached = self._memo[key] = (doc["fingerprint"], doc["file_id"])
+        if cached and cached[0] == fingerprint:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, fingerprint: str, file_id: str) -> None:
+        self._memo[key] = (fingerprint, file_id)
+        await self.collection.update_one(
+            {"key": key},
+            {"$set": {"fingerprint": fingerprint, "file_id": file_id, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    async def invalidate(self, key: str) -> None:
+        self._memo.pop(key, None)
+        await self.collection.delete_one({"key": key})
+
+
+async def reply_cached_photo(message, cache: MediaCache, key: str, source: PhotoSource, **kwargs):
+    """reply_photo that reuses the uploaded file_id, uploading only on a miss"""
+    fingerprint = source.fingerprint()
+    file_id = await cache.get(key, fingerprint)
+    if file_id:
+        try:
+            return await message.reply_photo(photo=file_id, **kwargs)
+        except BadRequest as e:
+            # file_ids are bound to the bot; a token change makes them invalid
+            logger.warning(f"Cached file_id for {key} rejected ({e}), re-uploading")
+            await cache.invalidate(key)
+
+    sent = await message.reply_photo(photo=source.payload(), **kwargs)
+    if sent.photo:
+        await cache.put(key, fingerprint, sent.photo[-1].file_id)
+    return sent
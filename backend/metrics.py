@@ -0,0 +1,148 @@
+import bisect
+from typing import Callable, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+# Latency buckets in seconds, tuned for bot handlers and Telegram round-trips
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus semantics)"""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation.
+
+        Past the last bucket this is the last bound, a lower bound of the
+        real value, so the result stays finite and JSON-serializable.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict:
+        cumulative = []
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            cumulative.append((bound, seen))
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "buckets": {**{str(bound): seen for bound, seen in cumulative}, "+Inf": self.count},
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class HistogramFamily:
+    """Histograms sharing a name, one per combination of label values"""
+
+    def __init__(self, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.children: Dict[Tuple, Histogram] = {}
+
+    def labels(self, *values) -> Histogram:
+        histogram = self.children.get(values)
+        if histogram is None:
+            histogram = self.children.setdefault(values, Histogram(self.buckets))
+        return histogram
+
+
+class Registry:
+    """Metric families rendered in the Prometheus text exposition format.
+
+    Histograms are either owned here (``histogram``) or collected from
+    objects that already keep one (``collect_histograms``, e.g. the callback
+    router). Counters and gauges are read through callbacks at scrape time,
+    so hot paths keep incrementing plain ints and pay nothing extra.
+    """
+
+    def __init__(self):
+        self._families: List[Tuple[str, str, str, Callable[[], Iterable[str]]]] = []
+
+    def _add(self, name: str, kind: str, help: str, lines: Callable[[], Iterable[str]]) -> None:
+        self._families.append((name, kind, help, lines))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> HistogramFamily:
+        family = HistogramFamily(labelnames, buckets)
+        self.collect_histograms(name, help, family.labelnames, lambda: family.children)
+        return family
+
+    def collect_histograms(self, name: str, help: str, labelnames: Sequence[str], fn: Callable[[], Mapping[Tuple, Histogram]]) -> None:
+        def lines():
+            for values, histogram in list(fn().items()):
+                seen = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    seen += count
+                    le = 'le="%s"' % bound
+                    yield f"{name}_bucket{_labels(labelnames, values, le)} {seen}"
+                le = 'le="+Inf"'
+                yield f"{name}_bucket{_labels(labelnames, values, le)} {histogram.count}"
+                yield f"{name}_sum{_labels(labelnames, values)} {_format_value(histogram.sum)}"
+                yield f"{name}_count{_labels(labelnames, values)} {histogram.count}"
+        self._add(name, "histogram", help, lines)
+
+    def _values(self, name: str, kind: str, help: str, labelnames: Sequence[str], fn: Callable) -> None:
+        def lines():
+            value = fn()
+            items = value.items() if isinstance(value, Mapping) else [((), value)]
+            for values, sample in items:
+                values = values if isinstance(values, tuple) else (values,)
+                yield f"{name}{_labels(labelnames, values)} {_format_value(sample)}"
+        self._add(name, kind, help, lines)
+
+    def gauge(self, name: str, help: str, fn: Callable, labelnames: Sequence[str] = ()) -> None:
+        """``fn`` returns a number, or {label value(s): number} with ``labelnames``"""
+        self._values(name, "gauge", help, labelnames, fn)
+
+    def counter(self, name: str, help: str, fn: Callable, labelnames: Sequence[str] = ()) -> None:
+        self._values(name, "counter", help, labelnames, fn)
+
+    def render(self) -> str:
+        out = []
+        for name, kind, help, lines in self._families:
+            out.append(f"# HELP {name} {help}")
+            out.append(f"# TYPE {name} {kind}")
+            try:
+                out.extend(lines())
+            except Exception as e:
+                out.append(f"# {name} failed: {_escape(e)}")
+        out.append("")
+        return "\n".join(out)
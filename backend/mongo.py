@@ -0,0 +1,94 @@
+import logging
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LazyMongoClient:
+    """AsyncIOMotorClient made on first use instead of at import.
+
+    Importing motor and building a client (which resolves the SRV record of
+    a ``mongodb+srv://`` URL) then happens when the first query runs, after
+    the server is already answering. ``client[name]`` returns a
+    ``LazyDatabase`` right away, so the module-level singletons can still be
+    handed their collections at import.
+    """
+
+    def __init__(self, url: str, **options):
+        self.url = url
+        self.options = options
+        self._client = None
+
+    @property
+    def created(self) -> bool:
+        return self._client is not None
+
+    @property
+    def client(self):
+        if self._client is None:
+            # Looked up at call time, so the load test's mongomock-motor patch applies
+            from motor.motor_asyncio import AsyncIOMotorClient
+
+            self._client = AsyncIOMotorClient(self.url, **self.options)
+            logger.info("Created the Mongo client")
+        return self._client
+
+    def __getitem__(self, name: str) -> "LazyDatabase":
+        return LazyDatabase(lambda: self.client[name])
+
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+    def close(self) -> None:
+        # Nothing to close if no query ever ran
+        if self._client is not None:
+            self._client.close()
+
+
+class LazyDatabase:
+    """A database of a LazyMongoClient.
+
+    ``db[collection]`` is a LazyCollection and does not create the client;
+    any attribute (``db.users``, ``db.command``, ...) does, and is the real
+    Motor one.
+    """
+
+    def __init__(self, factory: Callable[[], object]):
+        self._factory = factory
+        self._database = None
+        self._collections: Dict[str, LazyCollection] = {}
+
+    @property
+    def database(self):
+        if self._database is None:
+            self._database = self._factory()
+        return self._database
+
+    def __getitem__(self, name: str) -> "LazyCollection":
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = LazyCollection(lambda: self.database[name])
+        return collection
+
+    def __getattr__(self, name: str):
+        return getattr(self.database, name)
+
+
+class LazyCollection:
+    """A collection of a LazyDatabase; every attribute is the real Motor collection's"""
+
+    def __init__(self, factory: Callable[[], object]):
+        self._factory = factory
+        self._collection: Optional[object] = None
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = self._factory()
+        return self._collection
+
+    def __getattr__(self, name: str):
+        return getattr(self.collection, name)
+
+    def __getitem__(self, name: str):
+        return self.collection[name]
@@ -0,0 +1,52 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Sequence
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort: str, doc: dict, keys: Sequence[str]) -> str:
+    """Opaque cursor holding the sort name and the last row's key values"""
+    values = [doc[key].isoformat() if isinstance(doc[key], datetime) else doc[key] for key in keys]
+    raw = json.dumps({"s": sort, "v": values}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: str, keys: Sequence[str], date_keys: Sequence[str] = ()) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        values = payload["v"]
+        if payload["s"] != sort or len(values) != len(keys):
+            raise InvalidCursor("Cursor does not match this sort order")
+        return [
+            datetime.fromisoformat(value) if key in date_keys else value
+            for key, value in zip(keys, values)
+        ]
+    except InvalidCursor:
+        raise
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+
+
+def keyset_filter(keys: Sequence[str], values: Sequence) -> dict:
+    """Rows strictly after ``values`` in ascending (keys...) order.
+
+    For keys (a, b) this is ``a > va OR (a == va AND b > vb)``.
+    """
+    clauses = []
+    for i, key in enumerate(keys):
+        clause = {prev: values[j] for j, prev in enumerate(keys[:i])}
+        clause[key] = {"$gt": values[i]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def merge_filters(*filters: Optional[dict]) -> dict:
+    filters = [f for f in filters if f]
+    if not filters:
+        return {}
+    return filters[0] if len(filters) == 1 else {"$and": filters}
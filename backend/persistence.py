@@ -0,0 +1,298 @@
+import copy
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+from telegram import Update
+from telegram.ext import BasePersistence, ContextTypes, ConversationHandler, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+
+class _CachedUserData:
+    __slots__ = ("fetched_at", "version", "data")
+
+    def __init__(self, fetched_at: float, version: int, data: dict):
+        self.fetched_at = fetched_at
+        self.version = version
+        self.data = data
+
+
+def conversation_id(name: str, key: tuple) -> str:
+    return ":".join([name, *(str(part) for part in key)])
+
+
+class MongoPersistence(BasePersistence):
+    """PTB persistence for ``context.user_data`` backed by the users collection.
+
+    user_data lives in ``users.user_data`` next to the profile fields, with a
+    ``user_data_version`` stamp. Reads go through an LRU cache: within
+    ``cache_ttl`` seconds a user's data is served from memory, after that the
+    document is re-read and applied only if another worker wrote a newer
+    version. Writes are handed to ``writer`` (a UserWriteBuffer), so PTB's
+    periodic persistence flush never waits on Mongo.
+
+    With ``profiles`` (a cache.UserProfileCache) reads and writes go through
+    the shared profile cache instead, and a change published by another
+    worker drops the local entry right away instead of after ``cache_ttl``.
+
+    Existing users that only have the top-level ``language`` field get it
+    back as ``user_data['language']``.
+
+    With ``conversations``, ConversationHandler states are stored there too,
+    one versioned document per (name, key), and loaded per user by
+    ``refresh_conversation`` (see DurableConversationHandler).
+    """
+
+    def __init__(
+        self,
+        collection,
+        writer,
+        cache_size: int = 10000,
+        cache_ttl: float = 30.0,
+        update_interval: float = 1.0,
+        profiles=None,
+        conversations=None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__(
+            store_data=PersistenceInput(user_data=True, chat_data=False, bot_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.collection = collection
+        self.writer = writer
+        self.profiles = profiles
+        self.conversations = conversations
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._clock = clock
+        self._cache: "OrderedDict[int, _CachedUserData]" = OrderedDict()
+        # (name, key) -> (version, state) this worker last wrote or loaded
+        self._conversation_states: "OrderedDict[Tuple[str, tuple], Tuple[int, object]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.remote_updates = 0
+        self.invalidations = 0
+        self.conversation_writes = 0
+        self.conversation_updates = 0
+        if profiles is not None:
+            profiles.on_invalidate(self.invalidate)
+
+    def _remember(self, user_id: int, version: int, data: dict) -> None:
+        self._cache[user_id] = _CachedUserData(self._clock(), version, data)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        """Forget a user changed elsewhere; the next refresh reloads it"""
+        if self._cache.pop(int(user_id), None) is not None:
+            self.invalidations += 1
+
+    async def _write(self, user_id: int, fields: dict) -> None:
+        if self.profiles is not None:
+            await self.profiles.update(str(user_id), fields)
+        else:
+            self.writer.upsert(str(user_id), fields)
+
+    async def _load(self, user_id: int):
+        if self.profiles is not None:
+            doc = await self.profiles.get(str(user_id))
+        else:
+            doc = await self.collection.find_one(
+                {"user_id": str(user_id)},
+                {"_id": 0, "user_data": 1, "user_data_version": 1, "language": 1}
+            )
+        if doc is None:
+            return None
+        data = dict(doc.get("user_data") or {})
+        if "language" not in data and doc.get("language"):
+            data["language"] = doc["language"]
+        return doc.get("user_data_version", 0), data
+
+    # user_data is loaded lazily per user in refresh_user_data, not all at startup
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        entry = self._cache.get(user_id)
+        if entry is not None and self._clock() - entry.fetched_at < self.cache_ttl:
+            self.hits += 1
+            self._cache.move_to_end(user_id)
+            return
+
+        self.misses += 1
+        loaded = await self._load(user_id)
+        if loaded is None:
+            return
+        version, data = loaded
+        if entry is not None and version <= entry.version:
+            # Nothing newer in the DB: keep what this worker already has
+            entry.fetched_at = self._clock()
+            self._cache.move_to_end(user_id)
+            return
+        if entry is not None:
+            self.remote_updates += 1
+        user_data.clear()
+        user_data.update(data)
+        self._remember(user_id, version, copy.deepcopy(data))
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        entry = self._cache.get(user_id)
+        if entry is not None and entry.data == data:
+            return
+        version = time.time_ns()
+        snapshot = copy.deepcopy(data)
+        self._remember(user_id, version, snapshot)
+        await self._write(user_id, {"user_data": snapshot, "user_data_version": version})
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._cache.pop(user_id, None)
+        await self._write(user_id, {"user_data": {}, "user_data_version": time.time_ns()})
+
+    def _remember_conversation(self, name: str, key: tuple, version: int, state: Optional[object]) -> None:
+        self._conversation_states[(name, key)] = (version, state)
+        self._conversation_states.move_to_end((name, key))
+        while len(self._conversation_states) > self.cache_size:
+            self._conversation_states.popitem(last=False)
+
+    # Conversations are loaded lazily per user in refresh_conversation, not all at startup
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        """Store a conversation state; None (conversation ended) is kept as a tombstone.
+
+        The write only applies over an older version, so when two workers
+        race on the same user the later state wins whichever lands first.
+        """
+        if self.conversations is None:
+            return
+        known = self._conversation_states.get((name, key))
+        if known is not None and known[1] == new_state:
+            return
+        version = time.time_ns()
+        self._remember_conversation(name, key, version, new_state)
+        self.conversation_writes += 1
+        try:
+            await self.conversations.update_one(
+                {"_id": conversation_id(name, key), "version": {"$lt": version}},
+                {"$set": {"name": name, "key": list(key), "state": new_state, "version": version, "updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Another worker stored a newer state in the meantime; that one stands
+            pass
+
+    async def refresh_conversation(self, name: str, key: tuple) -> Tuple[bool, Optional[object]]:
+        """(True, state) when Mongo holds a newer state than this worker last saw"""
+        if self.conversations is None:
+            return False, None
+        doc = await self.conversations.find_one({"_id": conversation_id(name, key)}, {"_id": 0, "state": 1, "version": 1})
+        if doc is None:
+            return False, None
+        known = self._conversation_states.get((name, key))
+        if known is not None and doc["version"] <= known[0]:
+            return False, None
+        if known is not None or doc["state"] is not None:
+            self.conversation_updates += 1
+        self._remember_conversation(name, key, doc["version"], doc["state"])
+        return True, doc["state"]
+
+    async def flush(self) -> None:
+        await self.writer.flush()
+
+    def stats(self) -> dict:
+        return {
+            "cached_users": len(self._cache),
+            "cache_size": self.cache_size,
+            "cache_ttl": self.cache_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "remote_updates": self.remote_updates,
+            "invalidations": self.invalidations,
+            "conversations": len(self._conversation_states),
+            "conversation_writes": self.conversation_writes,
+            "conversation_updates": self.conversation_updates,
+        }
+
+    # Only user_data and conversations are persisted; the rest of the interface is a no-op
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> Optional[tuple]:
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+
+class DurableConversationHandler(ConversationHandler):
+    """ConversationHandler whose states survive restarts and follow the user between workers.
+
+    PTB keeps conversation states in process memory and reads persistence
+    only once, at startup. With several webhook workers the next step of a
+    flow can land on a worker that never saw the previous one, so:
+
+      * every state change is written to persistence as soon as the step's
+        handler returns, instead of at the next periodic flush;
+      * ``refresh``, registered as a TypeHandler in a group before this
+        handler, reloads the user's state from persistence when Mongo has a
+        newer one. ``refresh_when`` limits that read to the updates that can
+        continue a conversation.
+
+    Both rely on ConversationHandler internals (``_conversations``,
+    ``_get_key``, the ``check_result`` layout), so requirements.txt pins
+    the PTB minor version tests/test_conversation.py was run against.
+    """
+
+    def __init__(self, *args, refresh_when: Optional[Callable[[Update], bool]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.refresh_when = refresh_when
+
+    async def refresh(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        persistence = context.application.persistence
+        if not self.persistent or persistence is None or not isinstance(update, Update):
+            return
+        if update.effective_user is None or update.effective_chat is None:
+            return
+        if self.refresh_when is not None and not self.refresh_when(update):
+            return
+        key = self._get_key(update)
+        changed, state = await persistence.refresh_conversation(self.name, key)
+        if not changed:
+            return
+        # Not tracked: this came from persistence and must not be written back
+        if state is None:
+            self._conversations.data.pop(key, None)
+        else:
+            self._conversations.update_no_track({key: state})
+
+    async def handle_update(self, update, application, check_result, context):
+        try:
+            return await super().handle_update(update, application, check_result, context)
+        finally:
+            if self.persistent and application.persistence is not None:
+                key = check_result[1]
+                await application.persistence.update_conversation(self.name, key, self._conversations.get(key))
@@ -0,0 +1,236 @@
+import ipaddress
+import json
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Optional, Sequence, Tuple
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+logger = logging.getLogger(__name__)
+
+
+class KeyedLimiter(ABC):
+    """Per-key limiter with a bounded LRU store: O(1) time and memory per key.
+
+    ``hit(key)`` returns (allowed, retry_after_seconds). Once ``max_keys``
+    keys are tracked the least recently seen one is forgotten, which can
+    only make the limiter more lenient for it, never stricter.
+    """
+
+    def __init__(self, max_keys: int = 100000, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._state: "OrderedDict[object, list]" = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+
+    @abstractmethod
+    def _initial(self, now: float) -> list:
+        ...
+
+    @abstractmethod
+    def _consume(self, state: list, now: float) -> float:
+        """0 if the hit is allowed (state updated), else seconds until it would be"""
+
+    def hit(self, key) -> Tuple[bool, float]:
+        now = self._clock()
+        state = self._state.get(key)
+        if state is None:
+            state = self._state[key] = self._initial(now)
+            while len(self._state) > self.max_keys:
+                self._state.popitem(last=False)
+        else:
+            self._state.move_to_end(key)
+        retry_after = self._consume(state, now)
+        if retry_after:
+            self.rejected += 1
+            return False, retry_after
+        self.allowed += 1
+        return True, 0.0
+
+    def stats(self) -> dict:
+        return {"keys": len(self._state), "max_keys": self.max_keys, "allowed": self.allowed, "rejected": self.rejected}
+
+
+class TokenBucketLimiter(KeyedLimiter):
+    """``rate`` hits/s per key with bursts of up to ``burst``"""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100000, clock: Callable[[], float] = time.monotonic):
+        super().__init__(max_keys, clock)
+        self.rate = rate
+        self.burst = burst
+
+    def _initial(self, now: float) -> list:
+        return [self.burst, now]
+
+    def _consume(self, state: list, now: float) -> float:
+        tokens = min(self.burst, state[0] + (now - state[1]) * self.rate)
+        state[1] = now
+        if tokens >= 1:
+            state[0] = tokens - 1
+            return 0.0
+        state[0] = tokens
+        return (1 - tokens) / self.rate
+
+    def stats(self) -> dict:
+        return {**super().stats(), "rate": self.rate, "burst": self.burst}
+
+
+class SlidingWindowLimiter(KeyedLimiter):
+    """At most ``limit`` hits per ``window`` seconds per key.
+
+    Uses the sliding window counter approximation: the previous fixed
+    window's count, weighted by how much of it still overlaps the sliding
+    window, plus the current window's count.
+    """
+
+    def __init__(self, limit: int, window: float, max_keys: int = 100000, clock: Callable[[], float] = time.monotonic):
+        super().__init__(max_keys, clock)
+        self.limit = limit
+        self.window = window
+
+    def _initial(self, now: float) -> list:
+        # [current window start, previous window count, current window count]
+        return [now - now % self.window, 0, 0]
+
+    def _consume(self, state: list, now: float) -> float:
+        start = now - now % self.window
+        if start != state[0]:
+            state[1] = state[2] if start - state[0] == self.window else 0
+            state[0], state[2] = start, 0
+        overlap = 1 - (now - start) / self.window
+        if state[1] * overlap + state[2] + 1 > self.limit:
+            if state[2] + 1 > self.limit or not state[1]:
+                return start + self.window - now
+            # Wait until enough of the previous window has slid out
+            needed = (state[1] * overlap + state[2] + 1 - self.limit) / state[1]
+            return max(needed * self.window, 1e-3)
+        state[2] += 1
+        return 0.0
+
+    def stats(self) -> dict:
+        return {**super().stats(), "limit": self.limit, "window": self.window}
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying per-client-IP limiters to path prefixes.
+
+    ``rules`` is a list of (path prefix, limiter); the first matching prefix
+    wins and a limiter of None exempts the path. Requests are keyed on the
+    peer address, except that a peer in ``trusted_proxies`` (networks such
+    as "10.0.0.0/8") is replaced by the right-most X-Forwarded-For address
+    that is not itself a trusted proxy. Otherwise every client behind the
+    reverse proxy would share its address and one limit.
+    """
+
+    def __init__(
+        self,
+        app,
+        rules: Sequence[Tuple[str, Optional[KeyedLimiter]]],
+        enabled: bool = True,
+        trusted_proxies: Sequence[str] = (),
+    ):
+        self.app = app
+        self.rules = list(rules)
+        self.enabled = enabled
+        self.trusted_proxies = [ipaddress.ip_network(network.strip()) for network in trusted_proxies if network.strip()]
+
+    def _trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+    def client_ip(self, scope) -> str:
+        client = scope.get("client")
+        address = client[0] if client else "unknown"
+        if not self._trusted(address):
+            return address
+        forwarded = [
+            value.decode("latin-1") for name, value in scope.get("headers", ()) if name == b"x-forwarded-for"
+        ]
+        # Right to left: each hop appends the address it received the request from
+        for hop in reversed([hop.strip() for value in forwarded for hop in value.split(",")]):
+            if not hop:
+                continue
+            address = hop
+            if not self._trusted(hop):
+                break
+        return address
+
+    def _limiter(self, path: str) -> Optional[KeyedLimiter]:
+        for prefix, limiter in self.rules:
+            if path.startswith(prefix):
+                return limiter
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            return await self.app(scope, receive, send)
+        limiter = self._limiter(scope["path"])
+        if limiter is None:
+            return await self.app(scope, receive, send)
+
+        allowed, retry_after = limiter.hit(self.client_ip(scope))
+        if allowed:
+            return await self.app(scope, receive, send)
+
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class UpdateRateLimiter:
+    """Per-user throttle for the bot, registered as a TypeHandler in a group
+    that runs before the regular handlers.
+
+    Excess updates stop handler processing (ApplicationHandlerStop), so they
+    never reach button_callback or /start. Dropped callback queries are
+    still answered, with ``notice(update, context)`` as a toast, so the client's
+    spinner stops; other dropped updates are ignored silently.
+    """
+
+    def __init__(self, limiter: KeyedLimiter, notice: Callable[[Update, ContextTypes.DEFAULT_TYPE], str], enabled: bool = True):
+        self.limiter = limiter
+        self.notice = notice
+        self.enabled = enabled
+        self.dropped_callbacks = 0
+        self.dropped_other = 0
+
+    async def __call__(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if not self.enabled or update.effective_user is None:
+            return
+        allowed, _ = self.limiter.hit(update.effective_user.id)
+        if allowed:
+            return
+        if update.callback_query is not None:
+            self.dropped_callbacks += 1
+            try:
+                await update.callback_query.answer(self.notice(update, context))
+            except Exception as e:
+                logger.warning(f"Could not answer throttled callback: {e}")
+        else:
+            self.dropped_other += 1
+        raise ApplicationHandlerStop
+
+    def stats(self) -> dict:
+        return {
+            **self.limiter.stats(),
+            "enabled": self.enabled,
+            "dropped_callbacks": self.dropped_callbacks,
+            "dropped_other": self.dropped_other,
+        }
+
@@ -0,0 +1,149 @@
+import logging
+import re
+import uuid
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from telegram import Update
+
+from pagination import encode_cursor, keyset_filter, merge_filters
+
+logger = logging.getLogger(__name__)
+
+REGISTRATIONS_COLLECTION = "registrations"
+CONVERSATIONS_COLLECTION = "conversations"
+
+# Choice -> text key of its label
+PROGRAMS = {"qaida": "program_qaida", "tajweed": "program_tajweed", "hifz": "program_hifz", "nazr": "program_nazr"}
+SCHEDULES = {
+    "morning": "schedule_morning",
+    "afternoon": "schedule_afternoon",
+    "evening": "schedule_evening",
+    "weekend": "schedule_weekend",
+}
+
+# Conversation states; strings so they read well in the conversations collection
+PROGRAM, SCHEDULE, CONTACT, CONFIRM = "program", "schedule", "contact", "confirm"
+# Every callback_data of the flow after the entry point starts with this
+CALLBACK_PREFIX = "reg_"
+
+# Registration lifecycle: drafts are filled in step by step, submitting puts them in the admin queue
+DRAFT, PENDING, APPROVED, REJECTED = "draft", "pending", "approved", "rejected"
+REVIEW_STATUSES = (PENDING, APPROVED, REJECTED)
+# Drafts nobody finished expire through a TTL index (indexes.DRAFT_TTL)
+
+# Keyset order of the admin queue: first submitted first, registration_id breaks ties
+QUEUE_KEYS = ("submitted_at", "registration_id")
+
+# Digits with an optional leading +, spaces, dashes or parentheses in between
+_PHONE = re.compile(r"^\+?[\d\s\-()]{7,20}$")
+
+
+def normalize_phone(text: str) -> Optional[str]:
+    """+<digits> for anything that looks like a phone number, None otherwise"""
+    text = text.strip()
+    if not _PHONE.match(text):
+        return None
+    digits = re.sub(r"\D", "", text)
+    if not 7 <= len(digits) <= 15:
+        return None
+    return f"+{digits}"
+
+
+def continues_flow(update: Update) -> bool:
+    """Updates that can be a step of the registration flow (its state is refreshed for these)"""
+    if update.callback_query is not None:
+        return (update.callback_query.data or "").startswith(CALLBACK_PREFIX)
+    message = update.message
+    if message is None:
+        return False
+    return message.contact is not None or (message.text is not None and not message.text.startswith("/"))
+
+
+class RegistrationQueue:
+    """Registrations in Mongo, from the first step of the flow to the admin's decision.
+
+    Each step saves into the user's single ``draft`` document, so the flow
+    needs no in-process state beyond the conversation state: any worker can
+    take the next step. Submitting turns the draft into a ``pending``
+    registration in the admin queue, which is read by status in submission
+    order.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.drafts_saved = 0
+        self.submitted = 0
+        self.reviewed = 0
+
+    async def save_draft(self, user_id: str, **fields) -> dict:
+        """Set ``fields`` on the user's draft, creating it if needed; returns the draft"""
+        now = datetime.utcnow()
+        query = {"user_id": user_id, "status": DRAFT}
+        update = {
+            "$set": {**fields, "updated_at": now},
+            "$setOnInsert": {"registration_id": uuid.uuid4().hex, "created_at": now},
+        }
+        try:
+            draft = await self.collection.find_one_and_update(
+                query, update, projection={"_id": 0}, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Two steps raced and the other upsert created the draft; update that one
+            draft = await self.collection.find_one_and_update(
+                query, update, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+            )
+        self.drafts_saved += 1
+        return draft
+
+    async def discard_draft(self, user_id: str) -> None:
+        await self.collection.delete_one({"user_id": user_id, "status": DRAFT})
+
+    async def submit(self, user_id: str, **fields) -> Optional[dict]:
+        """Move the user's complete draft to the admin queue; None if there is none"""
+        now = datetime.utcnow()
+        registration = await self.collection.find_one_and_update(
+            {"user_id": user_id, "status": DRAFT, "program": {"$exists": True}, "schedule": {"$exists": True}, "phone": {"$exists": True}},
+            {"$set": {**fields, "status": PENDING, "submitted_at": now, "updated_at": now}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if registration is not None:
+            self.submitted += 1
+        return registration
+
+    async def page(self, status: str, limit: int, after: Optional[list] = None) -> Tuple[List[dict], Optional[str]]:
+        """One page of submitted registrations with ``status``, oldest first, and the cursor of the next page"""
+        query = {"status": status}
+        if after:
+            query = merge_filters(query, keyset_filter(QUEUE_KEYS, after))
+        # Fetch one extra row to know whether there is a next page
+        rows = await (
+            self.collection.find(query, {"_id": 0})
+            .sort([(key, ASCENDING) for key in QUEUE_KEYS])
+            .limit(limit + 1)
+            .to_list(limit + 1)
+        )
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(status, rows[-1], QUEUE_KEYS)
+        return rows, next_cursor
+
+    async def set_status(self, registration_id: str, status: str, reviewed_by: str) -> Optional[dict]:
+        """Record an admin's decision on a submitted registration; None if there is no such registration"""
+        now = datetime.utcnow()
+        registration = await self.collection.find_one_and_update(
+            {"registration_id": registration_id, "status": {"$in": list(REVIEW_STATUSES)}},
+            {"$set": {"status": status, "reviewed_by": reviewed_by, "reviewed_at": now, "updated_at": now}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if registration is not None:
+            self.reviewed += 1
+        return registration
+
+    def stats(self) -> dict:
+        return {"drafts_saved": self.drafts_saved, "submitted": self.submitted, "reviewed": self.reviewed}
@@ -0,0 +1,105 @@
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+
+class RenderState(NamedTuple):
+    caption: int
+    markup: int
+    edit_date: Optional[datetime]
+
+
+class RenderCache:
+    """What each bot message currently shows, so edits that change nothing are skipped.
+
+    Keyed by (chat_id, message_id) with hashes of the caption and markup the
+    bot last put there. Pressing the button of the screen already shown
+    costs no Bot API call; a new keyboard under the same caption only edits
+    the reply markup.
+
+    A state is trusted only while the callback's message still carries the
+    edit_date our own edit returned. If something else edited the message
+    in between (another worker in webhook mode), the state is dropped and
+    the edit goes through as usual.
+    """
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._states: "OrderedDict[Tuple[int, int], RenderState]" = OrderedDict()
+        self.counts: Dict[str, int] = {"skipped": 0, "markup": 0, "caption": 0, "not_modified": 0}
+        self.stale = 0
+        self.evictions = 0
+
+    def _current(self, key: Tuple[int, int], message) -> Optional[RenderState]:
+        state = self._states.get(key)
+        if state is None:
+            return None
+        if getattr(message, "edit_date", None) != state.edit_date:
+            self.stale += 1
+            del self._states[key]
+            return None
+        self._states.move_to_end(key)
+        return state
+
+    def _remember(self, key: Tuple[int, int], caption: int, markup: int, edit_date: Optional[datetime]) -> None:
+        self._states[key] = RenderState(caption, markup, edit_date)
+        self._states.move_to_end(key)
+        while len(self._states) > self.max_entries:
+            self._states.popitem(last=False)
+            self.evictions += 1
+
+    async def edit_caption(self, query, caption: str, reply_markup=None) -> str:
+        """query.edit_message_caption, minus whatever is already on screen.
+
+        Returns what was sent: "caption", "markup", "skipped", or
+        "not_modified" when Telegram reported the edit as a no-op.
+        """
+        message = query.message
+        if message is None:
+            # Inline messages have no chat/message id to key on
+            await query.edit_message_caption(caption=caption, reply_markup=reply_markup)
+            self.counts["caption"] += 1
+            return "caption"
+
+        key = (message.chat_id, message.message_id)
+        caption_hash = hash(caption)
+        markup_hash = hash(reply_markup) if reply_markup is not None else 0
+        state = self._current(key, message)
+        if state is not None and state.caption == caption_hash:
+            outcome = "skipped" if state.markup == markup_hash else "markup"
+        else:
+            outcome = "caption"
+
+        try:
+            if outcome == "caption":
+                result = await query.edit_message_caption(caption=caption, reply_markup=reply_markup)
+            elif outcome == "markup":
+                result = await query.edit_message_reply_markup(reply_markup=reply_markup)
+            else:
+                result = None
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+            # Already showing it (state lost to a restart or eviction): learn it now
+            outcome = "not_modified"
+            result = message
+
+        self.counts[outcome] += 1
+        if result is not None:
+            self._remember(key, caption_hash, markup_hash, getattr(result, "edit_date", None))
+        return outcome
+
+    def stats(self) -> dict:
+        return {
+            "messages": len(self._states),
+            "max_entries": self.max_entries,
+            **self.counts,
+            "api_calls_saved": self.counts["skipped"],
+            "stale": self.stale,
+            "evictions": self.evictions,
+        }
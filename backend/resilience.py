@@ -0,0 +1,239 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import httpx
+from telegram import Update
+from telegram.error import NetworkError
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Bot API methods that can be sent twice without a visible effect
+IDEMPOTENT_PREFIXES = ("get", "set", "delete", "edit", "answerCallbackQuery", "logOut", "close")
+# httpx failures that happen before the request reaches Telegram, so a retry cannot duplicate it
+NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# httpx failures that say Telegram is unreachable or slow; a pool timeout only says this process is busy
+BREAKER_FAILURES = (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadTimeout)
+
+
+class CircuitOpen(NetworkError):
+    """Raised instead of calling Telegram while the breaker is open.
+
+    A NetworkError, so callers that already handle network failures keep
+    working; ``retry_in`` is how long until the breaker lets a probe through.
+    """
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"Telegram circuit breaker is open, retry in {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for the Bot API.
+
+    ``failure_threshold`` failures in a row (network errors, timeouts, 5xx)
+    open it: calls fail immediately for ``reset_timeout`` seconds, then one
+    probe is let through (half-open). Its success closes the breaker, its
+    failure opens it again. 4xx answers and flood control are Telegram
+    working as intended and count as successes.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened = 0
+        self.fast_failed = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    @property
+    def retry_in(self) -> float:
+        return max(self._opened_at + self.reset_timeout - self.clock(), 0.0) if self._state == OPEN else 0.0
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probing:
+            self._state = HALF_OPEN
+            self._probing = True
+            return True
+        self.fast_failed += 1
+        return False
+
+    def abandon(self) -> None:
+        """A call ended without an outcome (cancelled); free the probe slot"""
+        if self._state == HALF_OPEN:
+            self._probing = False
+
+    def record_success(self) -> None:
+        if self._state != CLOSED:
+            logger.info("Telegram circuit breaker closed")
+        self._state = CLOSED
+        self._probing = False
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._state == HALF_OPEN or (self._state == CLOSED and self.failures >= self.failure_threshold):
+            self._state = OPEN
+            self._opened_at = self.clock()
+            self._probing = False
+            self.opened += 1
+            logger.error(f"Telegram circuit breaker opened after {self.failures} failures, next probe in {self.reset_timeout}s")
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout": self.reset_timeout,
+            "retry_in": round(self.retry_in, 3),
+            "opened": self.opened,
+            "fast_failed": self.fast_failed,
+        }
+
+
+class ResilientRequest(HTTPXRequest):
+    """HTTPXRequest with jittered retries and a circuit breaker, for ApplicationBuilder.request().
+
+    Retried: flood control (429) up to ``max_retry_after`` seconds, and
+    network errors and 5xx answers for idempotent methods (edits, answers,
+    getters). A send is only retried when it provably never left the
+    process (connect or pool timeout), so users never get a message twice.
+    The breaker counts connect errors, read timeouts and 5xx answers only,
+    not local trouble such as an exhausted connection pool.
+    Everything else is returned to PTB unchanged and raised as usual.
+    """
+
+    def __init__(
+        self,
+        breaker: Optional[CircuitBreaker] = None,
+        max_retries: int = 2,
+        backoff: float = 0.25,
+        max_backoff: float = 2.0,
+        max_retry_after: float = 5.0,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.retries: Dict[str, int] = {}
+
+    def _delay(self, attempt: int) -> float:
+        # Full jitter: concurrent handlers that failed together don't retry together
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(payload: bytes) -> Optional[float]:
+        try:
+            return float(json.loads(payload)["parameters"]["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> Tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        idempotent = api_method.startswith(IDEMPOTENT_PREFIXES)
+        attempt = 0
+        while True:
+            if self.breaker is not None and not self.breaker.allow():
+                raise CircuitOpen(self.breaker.retry_in)
+            try:
+                status, payload = await super().do_request(url, method, *args, **kwargs)
+            except asyncio.CancelledError:
+                if self.breaker is not None:
+                    self.breaker.abandon()
+                raise
+            except NetworkError as e:
+                if self.breaker is not None:
+                    if isinstance(e.__cause__, BREAKER_FAILURES):
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.abandon()
+                if attempt >= self.max_retries or not (idempotent or isinstance(e.__cause__, NOT_SENT)):
+                    raise
+                delay = self._delay(attempt)
+            else:
+                if status >= 500:
+                    if self.breaker is not None:
+                        self.breaker.record_failure()
+                    if attempt >= self.max_retries or not idempotent:
+                        return status, payload
+                    delay = self._delay(attempt)
+                else:
+                    if self.breaker is not None:
+                        self.breaker.record_success()
+                    retry_after = self._retry_after(payload) if status == 429 else None
+                    # Telegram did not execute a 429'd call, so any method can be retried
+                    if retry_after is None or retry_after > self.max_retry_after or attempt >= self.max_retries:
+                        return status, payload
+                    delay = retry_after + self._delay(0)
+            attempt += 1
+            self.retries[api_method] = self.retries.get(api_method, 0) + 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "max_retries": self.max_retries,
+            "retries": dict(self.retries),
+            "breaker": self.breaker.stats() if self.breaker is not None else None,
+        }
+
+
+class BreakerGuard:
+    """Sheds updates while the breaker is open, registered as a TypeHandler
+    in a group that runs before the regular handlers.
+
+    Every Bot API call would fail fast anyway; stopping here also spares
+    Mongo and the dispatcher slots. The webhook endpoint answers with
+    ``webhook_reply`` instead: a Bot API call returned as the webhook
+    response, which Telegram runs itself, so the user still gets the notice
+    without an outbound request.
+    """
+
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+        self.shed = 0
+        self.replied = 0
+
+    @property
+    def open(self) -> bool:
+        return self.breaker.state == OPEN
+
+    async def __call__(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if self.open:
+            self.shed += 1
+            raise ApplicationHandlerStop
+
+    def webhook_reply(self, update: Update, text: str) -> Optional[dict]:
+        self.shed += 1
+        if update.callback_query is not None:
+            reply = {"method": "answerCallbackQuery", "callback_query_id": update.callback_query.id, "text": text}
+        elif update.message is not None:
+            reply = {"method": "sendMessage", "chat_id": update.message.chat_id, "text": text}
+        else:
+            return None
+        self.replied += 1
+        return reply
+
+    def stats(self) -> dict:
+        return {"shed": self.shed, "replied": self.replied}
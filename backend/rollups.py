@@ -0,0 +1,84 @@
+import logging
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = "status_rollups"
+GRANULARITIES = ("minute", "hour")
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def rollup_ops(client_name: str, timestamp: datetime) -> list:
+    """Upserts that count one status check into its minute and hour buckets"""
+    return [
+        UpdateOne(
+            {"granularity": granularity, "client_name": client_name, "bucket": bucket_start(timestamp, granularity)},
+            {
+                "$inc": {"count": 1},
+                "$min": {"first_seen": timestamp},
+                "$max": {"last_seen": timestamp},
+            },
+            upsert=True
+        )
+        for granularity in GRANULARITIES
+    ]
+
+
+async def record_status_check(db, client_name: str, timestamp: datetime) -> None:
+    await db[ROLLUP_COLLECTION].bulk_write(rollup_ops(client_name, timestamp), ordered=False)
+
+
+async def rebuild_rollups(db) -> None:
+    """Recompute every bucket from the raw rows still in status_checks.
+
+    Used once when the rollup collection is empty (e.g. right after this
+    feature is deployed). Buckets whose raw rows have already expired are
+    left untouched.
+    """
+    for granularity in GRANULARITIES:
+        pipeline = [
+            {"$group": {
+                "_id": {
+                    "client_name": "$client_name",
+                    "bucket": {"$dateTrunc": {"date": "$timestamp", "unit": granularity}},
+                },
+                "count": {"$sum": 1},
+                "first_seen": {"$min": "$timestamp"},
+                "last_seen": {"$max": "$timestamp"},
+            }},
+            {"$project": {
+                "_id": 0,
+                "granularity": {"$literal": granularity},
+                "client_name": "$_id.client_name",
+                "bucket": "$_id.bucket",
+                "count": 1,
+                "first_seen": 1,
+                "last_seen": 1,
+            }},
+            {"$merge": {
+                "into": ROLLUP_COLLECTION,
+                "on": ["granularity", "client_name", "bucket"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }},
+        ]
+        await db.status_checks.aggregate(pipeline).to_list(None)
+    logger.info("Rebuilt status check rollups from raw rows")
+
+
+async def backfill_rollups_if_empty(db) -> None:
+    try:
+        if await db[ROLLUP_COLLECTION].find_one({}, {"_id": 1}) is None and \
+                await db.status_checks.find_one({}, {"_id": 1}) is not None:
+            await rebuild_rollups(db)
+    except Exception as e:
+        logger.error(f"Failed to backfill status check rollups: {e}")
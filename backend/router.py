@@ -0,0 +1,109 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# handler(query, context, user_lang, param) -> None; param is the prefix suffix or None
+CallbackHandler = Callable[[Any, Any, str, Optional[str]], Awaitable[None]]
+
+
+class Screen(NamedTuple):
+    """A static menu screen: caption text key and keyboard name"""
+    caption_key: str
+    keyboard: str
+
+
+class Route:
+    __slots__ = ("name", "handler", "latency")
+
+    def __init__(self, name: str, handler: CallbackHandler):
+        self.name = name
+        self.handler = handler
+        self.latency = Histogram()
+
+
+class _TrieNode:
+    __slots__ = ("children", "route")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.route: Optional[Route] = None
+
+
+class CallbackRouter:
+    """Dispatch callback_data to handlers.
+
+    Exact callback_data values are a dict lookup. Parameterized values such
+    as ``lang_<code>`` go through a prefix trie, longest prefix wins, and the
+    handler receives the remainder as ``param``. Every route keeps a latency
+    histogram.
+    """
+
+    def __init__(self):
+        self._exact: Dict[str, Route] = {}
+        self._prefixes = _TrieNode()
+
+    def exact(self, data: str):
+        def decorator(handler: CallbackHandler) -> CallbackHandler:
+            self.add_exact(data, handler)
+            return handler
+        return decorator
+
+    def prefix(self, prefix: str):
+        def decorator(handler: CallbackHandler) -> CallbackHandler:
+            self.add_prefix(prefix, handler)
+            return handler
+        return decorator
+
+    def add_exact(self, data: str, handler: CallbackHandler) -> None:
+        self._exact[data] = Route(data, handler)
+
+    def add_prefix(self, prefix: str, handler: CallbackHandler) -> None:
+        node = self._prefixes
+        for char in prefix:
+            node = node.children.setdefault(char, _TrieNode())
+        node.route = Route(f"{prefix}*", handler)
+
+    def resolve(self, data: str) -> Tuple[Optional[Route], Optional[str]]:
+        route = self._exact.get(data)
+        if route is not None:
+            return route, None
+
+        node, match, match_len = self._prefixes, None, 0
+        for i, char in enumerate(data):
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.route is not None:
+                match, match_len = node.route, i + 1
+        if match is None:
+            return None, None
+        return match, data[match_len:]
+
+    async def dispatch(self, data: str, query, context, user_lang: str) -> bool:
+        """Run the handler for ``data``; False if no route matches"""
+        route, param = self.resolve(data)
+        if route is None:
+            logger.warning(f"No callback route for {data!r}")
+            return False
+        start = time.perf_counter()
+        try:
+            await route.handler(query, context, user_lang, param)
+        finally:
+            route.latency.observe(time.perf_counter() - start)
+        return True
+
+    def routes(self):
+        yield from self._exact.values()
+        stack = [self._prefixes]
+        while stack:
+            node = stack.pop()
+            if node.route is not None:
+                yield node.route
+            stack.extend(node.children.values())
+
+    def stats(self) -> dict:
+        return {route.name: route.latency.snapshot() for route in self.routes()}
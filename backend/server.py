@@ -1,32 +1,184 @@
-from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Request, Header, Query
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 import uuid
+import secrets
 from datetime import datetime
 import asyncio
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
+from telegram import ReplyKeyboardRemove, Update
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, ConversationHandler, MessageHandler, TypeHandler, filters
+from telegram.request import HTTPXRequest
+from telegram.warnings import PTBUserWarning
 import json
+import warnings
+from webhook import UpdateIngestionQueue, secret_matches
+from dispatcher import KeyedUpdateProcessor
+from media import MediaCache, PhotoSource, reply_cached_photo
+from keyboards import (
+    KeyboardRegistry, build_choices, build_confirm, build_contact_request, build_language_picker, build_main_menu, build_single_button
+)
+from router import CallbackRouter, Screen
+from rendering import RenderCache
+from writebehind import UserWriteBuffer
+from persistence import DurableConversationHandler, MongoPersistence
+from cache import UserProfileCache, create_cache
+from pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter, merge_filters
+from indexes import MINUTE_ROLLUP_TTL, STATUS_CHECK_TTL, check_query_plans, ensure_indexes
+from rollups import ROLLUP_COLLECTION, backfill_rollups_if_empty, record_status_check
+from analytics import COUNTERS_COLLECTION, EVENTS_COLLECTION, EventStream, ensure_event_collection, first_funnel_step, funnel_dashboard
+from registration import (
+    CALLBACK_PREFIX, CONFIRM, CONTACT, CONVERSATIONS_COLLECTION, PENDING, PROGRAM, PROGRAMS, QUEUE_KEYS,
+    REGISTRATIONS_COLLECTION, SCHEDULE, SCHEDULES, RegistrationQueue, continues_flow, normalize_phone
+)
+from broadcast import Broadcaster
+from texts import CatalogError, TextCatalog
+from templates import TemplateSet
+from ratelimit import RateLimitMiddleware, SlidingWindowLimiter, TokenBucketLimiter, UpdateRateLimiter
+from metrics import Registry
+from instrumentation import InstrumentedResilientRequest, LoopLagMonitor, MongoCommandMetrics
+from resilience import CLOSED, HALF_OPEN, OPEN, BreakerGuard, CircuitBreaker, ResilientRequest
+from health import Health, read_heartbeats
+from static import StaticAssets
+from boot import BootTasks
+from mongo import LazyMongoClient
+from auth import USERS_COLLECTION, AuthError, AuthService, PasswordHasher, TokenService, parse_bootstrap_users
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# Prometheus metrics at /api/metrics; when off, no Mongo or Telegram hooks are installed
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+metrics = Registry()
+mongo_metrics = MongoCommandMetrics(
+    metrics.histogram("mongo_command_seconds", "Mongo command latency per collection and command", ("collection", "command"))
+)
+
+# MongoDB connection; the client is created by the first query, not at import
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = LazyMongoClient(mongo_url, event_listeners=[mongo_metrics] if METRICS_ENABLED else [])
 db = client[os.environ['DB_NAME']]
 
+# What to do when a hot query would COLLSCAN at startup: "off", "warn" or "strict" (refuse to start)
+MONGO_QUERY_PLAN_CHECK = os.environ.get('MONGO_QUERY_PLAN_CHECK', 'warn').lower()
+
+# Retention (seconds) for raw status checks and their per-minute rollups; hourly rollups are kept
+STATUS_CHECK_TTL_SECONDS = int(os.environ.get('STATUS_CHECK_TTL_SECONDS', STATUS_CHECK_TTL))
+STATUS_MINUTE_ROLLUP_TTL_SECONDS = int(os.environ.get('STATUS_MINUTE_ROLLUP_TTL_SECONDS', MINUTE_ROLLUP_TTL))
+
+# Database preparation and the bot start in the background at startup and are retried
+# with backoff between these delays (seconds) until they succeed; /api/ is served meanwhile
+BOOT_RETRY_MIN_DELAY = float(os.environ.get('BOOT_RETRY_MIN_DELAY', '1'))
+BOOT_RETRY_MAX_DELAY = float(os.environ.get('BOOT_RETRY_MAX_DELAY', '60'))
+
 # Telegram Bot Token
 BOT_TOKEN = os.environ['TELEGRAM_BOT_TOKEN']
 
+# Bot API server: a self-hosted telegram-bot-api or the load test stand-in instead of api.telegram.org
+TELEGRAM_API_BASE_URL = os.environ.get('TELEGRAM_API_BASE_URL', 'https://api.telegram.org').rstrip('/')
+
+# Where the bot runs: "embedded" in this API process, or "external" in worker.py processes (see supervisor.py)
+BOT_RUNTIME = os.environ.get('BOT_RUNTIME', 'embedded').lower()
+# Set by supervisor.py: workers publish heartbeats there and /api/health/ready reports them
+WORKER_STATUS_DIR = os.environ.get('WORKER_STATUS_DIR', '')
+WORKER_HEALTH_TIMEOUT = float(os.environ.get('WORKER_HEALTH_TIMEOUT', '15'))
+
+# Update ingestion: "polling" (single process) or "webhook" (several workers behind a load balancer)
+BOT_UPDATE_MODE = os.environ.get('TELEGRAM_UPDATE_MODE', 'polling').lower()
+WEBHOOK_URL = os.environ.get('TELEGRAM_WEBHOOK_URL', '')
+WEBHOOK_SECRET = os.environ.get('TELEGRAM_WEBHOOK_SECRET', '')
+WEBHOOK_QUEUE_SIZE = int(os.environ.get('TELEGRAM_WEBHOOK_QUEUE_SIZE', '1000'))
+
+# Updates from different users run concurrently, each user's updates stay in order
+BOT_MAX_CONCURRENT_UPDATES = int(os.environ.get('BOT_MAX_CONCURRENT_UPDATES', '64'))
+BOT_MAX_PENDING_UPDATES = int(os.environ.get('BOT_MAX_PENDING_UPDATES', '1024'))
+
+# Outbound Bot API calls: a keep-alive pool for sends (getUpdates has its own connection),
+# jittered retries, and a circuit breaker that fails fast while Telegram is down
+TELEGRAM_POOL_SIZE = int(os.environ.get('TELEGRAM_POOL_SIZE', '128'))
+TELEGRAM_POOL_TIMEOUT = float(os.environ.get('TELEGRAM_POOL_TIMEOUT', '1'))
+TELEGRAM_READ_TIMEOUT = float(os.environ.get('TELEGRAM_READ_TIMEOUT', '5'))
+TELEGRAM_MAX_RETRIES = int(os.environ.get('TELEGRAM_MAX_RETRIES', '2'))
+TELEGRAM_MAX_RETRY_AFTER = float(os.environ.get('TELEGRAM_MAX_RETRY_AFTER', '5'))
+TELEGRAM_BREAKER_THRESHOLD = int(os.environ.get('TELEGRAM_BREAKER_THRESHOLD', '5'))
+TELEGRAM_BREAKER_RESET = float(os.environ.get('TELEGRAM_BREAKER_RESET', '30'))
+
+# Welcome photo: served from a local copy, uploaded once and reused by file_id
+WELCOME_PHOTO_URL = os.environ.get(
+    'WELCOME_PHOTO_URL',
+    "https://images.unsplash.com/photo-1512970648279-ff3398568f77?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Nzd8MHwxfHNlYXJjaHwyfHxtb3NxdWV8ZW58MHx8fHwxNzUzNTMxNTc2fDA&ixlib=rb-4.1.0&q=85"
+)
+WELCOME_PHOTO_PATH = Path(os.environ.get('WELCOME_PHOTO_PATH', ROOT_DIR / 'assets' / 'welcome.jpg'))
+# Bundled image sent until the download above succeeds (fresh deploy, CDN unreachable)
+WELCOME_PHOTO_FALLBACK = Path(os.environ.get('WELCOME_PHOTO_FALLBACK', ROOT_DIR / 'images' / 'welcome.png'))
+
+# User upserts are buffered and flushed in batches instead of awaited inline
+USER_WRITE_BATCH_SIZE = int(os.environ.get('USER_WRITE_BATCH_SIZE', '500'))
+USER_WRITE_FLUSH_INTERVAL = float(os.environ.get('USER_WRITE_FLUSH_INTERVAL', '1.0'))
+
+# context.user_data is persisted in db.users behind an LRU read-through cache
+USER_DATA_CACHE_SIZE = int(os.environ.get('USER_DATA_CACHE_SIZE', '10000'))
+USER_DATA_CACHE_TTL = float(os.environ.get('USER_DATA_CACHE_TTL', '30'))
+
+# Last caption/markup per bot message, so re-opening the screen already shown costs no edit
+RENDER_CACHE_SIZE = int(os.environ.get('RENDER_CACHE_SIZE', '100000'))
+
+# Bot interactions are appended to a time-series collection in batches; funnel counters are kept up to date
+ANALYTICS_FLUSH_INTERVAL = float(os.environ.get('ANALYTICS_FLUSH_INTERVAL', '2'))
+ANALYTICS_MAX_BATCH = int(os.environ.get('ANALYTICS_MAX_BATCH', '1000'))
+ANALYTICS_EVENT_TTL_SECONDS = int(os.environ.get('ANALYTICS_EVENT_TTL_SECONDS', str(90 * 24 * 3600)))
+
+# Profiles shared between workers: memory:// (single process) or redis://host:port/db
+CACHE_URL = os.environ.get('CACHE_URL', 'memory://')
+USER_PROFILE_CACHE_TTL = float(os.environ.get('USER_PROFILE_CACHE_TTL', '3600'))
+
+# Outbound broadcasts stay under Telegram's ~30 msg/s bot-wide limit
+BROADCAST_RATE = float(os.environ.get('BROADCAST_RATE', '25'))
+BROADCAST_CONCURRENCY = int(os.environ.get('BROADCAST_CONCURRENCY', '25'))
+# How often bot workers look for broadcasts created through another process
+BROADCAST_POLL_INTERVAL = float(os.environ.get('BROADCAST_POLL_INTERVAL', '5'))
+
+# Portal logins: bcrypt hashes in Mongo, hashed off the event loop, JWT access tokens
+JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
+JWT_SECRET = os.environ.get('JWT_SECRET', '')
+JWT_PRIVATE_KEY_PATH = os.environ.get('JWT_PRIVATE_KEY_PATH', '')
+JWT_PUBLIC_KEY_PATH = os.environ.get('JWT_PUBLIC_KEY_PATH', '')
+JWT_TTL_SECONDS = float(os.environ.get('JWT_TTL_SECONDS', '3600'))
+AUTH_HASH_WORKERS = int(os.environ.get('AUTH_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+AUTH_BCRYPT_ROUNDS = int(os.environ.get('AUTH_BCRYPT_ROUNDS', '12'))
+# role:username:password,... seeded into an empty portal_users collection (default: none)
+PORTAL_BOOTSTRAP_USERS = os.environ.get('PORTAL_BOOTSTRAP_USERS', '')
+
+# Throttling: per Telegram user for the bot, per client IP for /api (stricter for logins)
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000'))
+BOT_RATE_LIMIT_RATE = float(os.environ.get('BOT_RATE_LIMIT_RATE', '2'))
+BOT_RATE_LIMIT_BURST = float(os.environ.get('BOT_RATE_LIMIT_BURST', '6'))
+API_RATE_LIMIT_RATE = float(os.environ.get('API_RATE_LIMIT_RATE', '20'))
+API_RATE_LIMIT_BURST = float(os.environ.get('API_RATE_LIMIT_BURST', '40'))
+LOGIN_RATE_LIMIT = int(os.environ.get('LOGIN_RATE_LIMIT', '10'))
+LOGIN_RATE_LIMIT_WINDOW = float(os.environ.get('LOGIN_RATE_LIMIT_WINDOW', '60'))
+# Peers whose X-Forwarded-For is believed (default: loopback and private networks, where the reverse proxy runs)
+RATE_LIMIT_TRUSTED_PROXIES = os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', '127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,fc00::/7')
+
+# React build served at /, precompressed by `python static.py compress` (part of `yarn build`)
+FRONTEND_BUILD_DIR = os.environ.get('FRONTEND_BUILD_DIR', '/app/frontend/build')
+# Source maps expose the unminified frontend; only serve them where that is wanted (staging)
+STATIC_SERVE_SOURCE_MAPS = os.environ.get('STATIC_SERVE_SOURCE_MAPS', 'false').lower() == 'true'
+
+# Mini app opened from the main menu
+WEB_APP_URL = "https://c96d850f-73f9-40d1-ace6-5b78aa62cd15.preview.emergentagent.com"
+
+# Bot texts live in a JSON catalog that is re-read when the file changes
+TEXT_CATALOG_PATH = Path(os.environ.get('TEXT_CATALOG_PATH', ROOT_DIR / 'locales' / 'catalog.json'))
+TEXT_CATALOG_POLL_INTERVAL = float(os.environ.get('TEXT_CATALOG_POLL_INTERVAL', '5'))
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -42,6 +194,21 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+class BroadcastCreate(BaseModel):
+    messages: Dict[str, str]
+    default_language: str = "am"
+
+class StatusRollup(BaseModel):
+    client_name: str
+    granularity: str
+    bucket: datetime
+    count: int
+    first_seen: datetime
+    last_seen: datetime
+
+class RegistrationReview(BaseModel):
+    status: str = Field(pattern="^(pending|approved|rejected)$")
+
 class UserData(BaseModel):
     user_id: str
     language: Optional[str] = None
@@ -49,134 +216,154 @@ class UserData(BaseModel):
     full_name: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
-# Language translations
-LANGUAGES = {
-    "en": {
-        "name": "🇺🇸 English",
-        "welcome": "Welcome! This bot helps you access Quran learning programs.",
-        "choose_language": "Please choose your language:",
-        "main_menu": "Main Menu - Choose an option:",
-        "channel": "⭐ Select Channel",
-        "admin": "📞 Administration", 
-        "register": "📝 Register",
-        "education_info": "ℹ️ Education Information",
-        "restart": "🔁 Restart",
-        "mini_app": "🔷 Learning Portal",
-        "education_details": "📚 **Education Program Details:**\n\n📅 Days: 7 days a week\n⏰ Duration: 30 minutes per day\n💰 Cost: 1500 Ethiopian Birr\n\nFor more information, contact administration."
-    },
-    "am": {
-        "name": "🇪🇹 አማርኛ",
-        "welcome": "እንኮዋን ደህና መጡ! ይህ ቦት የቁርአን ትምህርት ፕሮግራሞችን ለማግኘት ይረዳዎታል።",
-        "choose_language": "እባክዎ ቋንቋዎን ይምረጡ:",
-        "main_menu": "ዋና ዝርዝር - አንድ አማራጭ ይምረጡ:",
-        "channel": "⭐ ቻናል ምረጥ",
-        "admin": "📞 አስተዳደር",
-        "register": "📝 ይመዝገቡ", 
-        "education_info": "ℹ️ የትምህርት መረጃ",
-        "restart": "🔁 እንደገና ጀምር",
-        "mini_app": "🔷 የትምህርት መግቢያ",
-        "education_details": "📚 **የትምህርት ፕሮግራም ዝርዝሮች:**\n\n📅 ቀናት: በሳምንት 7 ቀን\n⏰ የሚፈጅ ጊዜ: በቀን 30 ደቂቃ\n💰 ዋጋ: 1500 ብር\n\nለተጨማሪ መረጃ፣ አስተዳደርን ያነጋግሩ።"
-    },
-    "ar": {
-        "name": "🇸🇦 العربية",
-        "welcome": "أهلاً وسهلاً! يساعدك هذا البوت في الوصول إلى برامج تعلم القرآن.",
-        "choose_language": "يرجى اختيار لغتك:",
-        "main_menu": "القائمة الرئيسية - اختر خياراً:",
-        "channel": "⭐ اختر القناة",
-        "admin": "📞 الإدارة",
-        "register": "📝 سجل",
-        "education_info": "ℹ️ معلومات التعليم",
-        "restart": "🔁 إعادة البدء",
-        "mini_app": "🔷 بوابة التعلم",
-        "education_details": "📚 **تفاصيل البرنامج التعليمي:**\n\n📅 الأيام: 7 أيام في الأسبوع\n⏰ المدة: 30 دقيقة يومياً\n💰 التكلفة: 1500 بر إثيوبي\n\nللمزيد من المعلومات، اتصل بالإدارة."
-    },
-    "fr": {
-        "name": "🇪🇹 Afaan Oromoo",
-          "welcome": "Baga nagaan dhuftan! Botichi kun sagantaalee barnoota Qur'aanaa argachuuf isin gargaara.",
-          "choose_language": "Afaan keessan filadhaa:",
-          "main_menu": "Menyuu Guddaa - Filannoo kee fili:",
-          "channel": "⭐ Chaanaalii filadhu",
-          "admin": "📞 Bulchiinsa",
-          "register": "📝 Galmaa'i",
-          "education_info": "ℹ️ Odeeffannoo Barnootaa",
-          "restart": "🔁 Itti fufi ykn jalqabi",
-          "mini_app": "🔷 Karraa Barnootaa",
-          "education_details": "📚 **Faayidaa Sagantaa Barnootaa:**\n\n📅 Guyyaa: Torban guutuu (7 guyyaa)\n⏰ Yeroo: Sa'aatii 0.5 (daqiiqaa 30) guyyaa guyyaatti\n💰 Kaffaltii: Birrii 1500\n\nOdeeffannoo dabalataaf bulchiinsa quunnamaa."
-    },
-    "so": {
-        "name": "🇸🇴 Soomaali",
-        "welcome": "Soo dhawaada! Botkan wuxuu kaa caawinyaa inaad hesho barnaamijyada waxbarashada Quraanka.",
-        "choose_language": "Fadlan dooro luqaddaada:",
-        "main_menu": "Liiska Weyn - Dooro mid:",
-        "channel": "⭐ Dooro Channelka",
-        "admin": "📞 Maamulka",
-        "register": "📝 Isdiiwaangeli",
-        "education_info": "ℹ️ Macluumaadka Waxbarashada",
-        "restart": "🔁 Dib u bilow",
-        "mini_app": "🔷 Albaabka Waxbarashada", 
-        "education_details": "📚 **Faahfaahinta Barnaamijka Waxbarashada:**\n\n📅 Maalmaha: 7 maalmood todobaadkii\n⏰ Muddada: 30 daqiiqadood maalintii\n💰 Qiimaha: 1500 Birr Ethiopian\n\nWixii macluumaad dheeraad ah, kala soo xidhiidh maamulka."
-    },
-    "tg": {
-          "name": "🇪🇷 ትግርኛ",
-          "welcome": "እንቋዕ ብደሓን መጻእካ! እዚ ቦት ንመምህር ጀብሮ ትምህርቲ ቁርኣን ይሓግዝካ።",
-          "choose_language": "ቋንቋኻ ኣምረፅ:",
-          "main_menu": "ዋና ምናሌ - ናይ ኣንታም ናፈቕ ኣምረፅ:",
-          "channel": "⭐ ቻናል ምምራጽ",
-          "admin": "📞 ኣመሓዳሪ",
-          "register": "📝 መዝግዓት",
-          "education_info": "ℹ️ ዝርዝር ትምህርቲ",
-          "restart": "🔁 ኣእሰር እንደገና",
-          "mini_app": "🔷 መደብ ትምህርቲ",
-          "education_details": "📚 **ዝርዝር ናይ ትምህርቲ ፕሮግራም:**\n\n📅 መዓልታት: 7 መዓልት ኩሉ ሰሙን\n⏰ ዓመታዊ ግዜ: 30 ደቒቕታት በመዓልቲ\n💰 ወጻኢ: 1500 ብር ኢትዮጵያዊ\n\nብዝተለዋዋጠ መረጃ፡ ኣመሓዳሪ ደው ይብሉ።"
-}
-
+# Language translations and shared texts (welcome message, links, ...)
+texts = TextCatalog(TEXT_CATALOG_PATH, poll_interval=TEXT_CATALOG_POLL_INTERVAL)
+# Every (key, language) compiled once, missing keys resolved through the fallback chain
+templates = TemplateSet(texts.current)
 
 # Telegram Bot Setup
 telegram_app = None
+broadcaster = None
+update_ingestion = UpdateIngestionQueue(maxsize=WEBHOOK_QUEUE_SIZE)
+update_processor = KeyedUpdateProcessor(
+    max_concurrent_updates=BOT_MAX_CONCURRENT_UPDATES,
+    max_pending_updates=BOT_MAX_PENDING_UPDATES
+)
+media_cache = MediaCache(db["media_cache"])
+welcome_photo = PhotoSource(WELCOME_PHOTO_PATH, WELCOME_PHOTO_URL, WELCOME_PHOTO_FALLBACK)
+user_writes = UserWriteBuffer(db["users"], max_batch=USER_WRITE_BATCH_SIZE, flush_interval=USER_WRITE_FLUSH_INTERVAL)
+shared_cache = create_cache(CACHE_URL)
+user_profiles = UserProfileCache(shared_cache, db["users"], user_writes, ttl=USER_PROFILE_CACHE_TTL)
+bot_persistence = MongoPersistence(
+    db["users"],
+    user_writes,
+    cache_size=USER_DATA_CACHE_SIZE,
+    cache_ttl=USER_DATA_CACHE_TTL,
+    update_interval=USER_WRITE_FLUSH_INTERVAL,
+    profiles=user_profiles,
+    conversations=db[CONVERSATIONS_COLLECTION]
+)
+registration_queue = RegistrationQueue(db[REGISTRATIONS_COLLECTION])
+
+# Portal authentication
+if JWT_PRIVATE_KEY_PATH:
+    jwt_signing_key = Path(JWT_PRIVATE_KEY_PATH).read_bytes()
+    jwt_verifying_key = Path(JWT_PUBLIC_KEY_PATH).read_bytes() if JWT_PUBLIC_KEY_PATH else None
+else:
+    # Without JWT_SECRET tokens are only valid in this process until it restarts (supervisor.py sets one for all its workers)
+    jwt_signing_key, jwt_verifying_key = JWT_SECRET or secrets.token_urlsafe(32), None
+auth_service = AuthService(
+    db[USERS_COLLECTION],
+    PasswordHasher(rounds=AUTH_BCRYPT_ROUNDS, max_workers=AUTH_HASH_WORKERS),
+    TokenService(jwt_signing_key, jwt_verifying_key, algorithm=JWT_ALGORITHM, ttl=JWT_TTL_SECONDS)
+)
+bearer_scheme = HTTPBearer(auto_error=False)
+
+# Rate limiting; Telegram's webhook calls are exempt, they are already authenticated by the secret
+api_rate_limits = [
+    ("/api/telegram/webhook", None),
+    ("/api/login/", SlidingWindowLimiter(LOGIN_RATE_LIMIT, LOGIN_RATE_LIMIT_WINDOW, max_keys=RATE_LIMIT_MAX_KEYS)),
+    ("/api/", TokenBucketLimiter(API_RATE_LIMIT_RATE, API_RATE_LIMIT_BURST, max_keys=RATE_LIMIT_MAX_KEYS)),
+]
+update_rate_limiter = UpdateRateLimiter(
+    TokenBucketLimiter(BOT_RATE_LIMIT_RATE, BOT_RATE_LIMIT_BURST, max_keys=RATE_LIMIT_MAX_KEYS),
+    lambda update, context: templates.render("rate_limited", context.user_data.get('language', 'am')),
+    enabled=RATE_LIMIT_ENABLED
+)
+
+# Shared by the request layer, the update guard and the webhook endpoint
+telegram_breaker = CircuitBreaker(TELEGRAM_BREAKER_THRESHOLD, TELEGRAM_BREAKER_RESET)
+breaker_guard = BreakerGuard(telegram_breaker)
+
+def require_role(*roles: str):
+    """Dependency returning the caller's token claims; 401 without a valid token, 403 for other roles"""
+    async def dependency(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)) -> dict:
+        if credentials is None:
+            raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+        try:
+            claims = auth_service.tokens.verify(credentials.credentials)
+        except AuthError as e:
+            raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+        if roles and claims["role"] not in roles:
+            raise HTTPException(status_code=403, detail="Not allowed for this role")
+        return claims
+    return dependency
+
+# Keyboards are built once per (screen, language) and shared between callbacks
+keyboards = KeyboardRegistry()
+keyboards.register("welcome", lambda lang_code: build_single_button(templates.render("start_button", lang_code), "start_bot"))
+keyboards.register("language_picker", lambda _: build_language_picker(texts.languages), per_language=False)
+keyboards.register("main_menu", lambda lang_code: build_main_menu(templates.strings(lang_code), WEB_APP_URL))
+keyboards.register("back", lambda lang_code: build_single_button(templates.render("back_button", lang_code), "main_menu"))
+keyboards.register("error", lambda lang_code: build_single_button(templates.render("error_button", lang_code), "start_bot"))
+keyboards.register(
+    "registration_programs", lambda lang_code: build_choices(templates.strings(lang_code), PROGRAMS, f"{CALLBACK_PREFIX}program_")
+)
+keyboards.register(
+    "registration_schedules", lambda lang_code: build_choices(templates.strings(lang_code), SCHEDULES, f"{CALLBACK_PREFIX}schedule_")
+)
+keyboards.register("registration_contact", lambda lang_code: build_contact_request(templates.render("share_contact_button", lang_code)))
+keyboards.register(
+    "registration_confirm", lambda lang_code: build_confirm(templates.strings(lang_code), f"{CALLBACK_PREFIX}confirm", f"{CALLBACK_PREFIX}cancel")
+)
+keyboards.warm(texts.languages)
+
+def on_texts_reloaded(catalog):
+    """Drop everything built from the previous catalog version"""
+    global templates
+    templates = TemplateSet(catalog)
+    keyboards.invalidate()
+    keyboards.warm(catalog.languages)
+
+texts.subscribe(on_texts_reloaded)
+
+# Funnel analytics: handlers only append to an in-memory batch
+interaction_events = EventStream(
+    db[EVENTS_COLLECTION], db[COUNTERS_COLLECTION], max_batch=ANALYTICS_MAX_BATCH, flush_interval=ANALYTICS_FLUSH_INTERVAL
+)
+
+def track(context: ContextTypes.DEFAULT_TYPE, user_id: int, event: str, language: str) -> None:
+    """Record an interaction, flagging the first time this user reaches a funnel step"""
+    interaction_events.record(event, user_id, language, first_funnel_step(context.user_data, event))
+
+# Screens are edited in place; edits that would not change the message are skipped
+render_cache = RenderCache(RENDER_CACHE_SIZE)
+
+# Static screens by callback_data: caption text key and keyboard.
+# Handlers with logic are registered on callback_router below.
+SCREENS = {
+    "start_bot": Screen("language_prompt", "language_picker"),
+    "restart": Screen("language_prompt", "language_picker"),
+    "main_menu": Screen("main_menu", "main_menu"),
+    "channel": Screen("channel_caption", "back"),
+    "admin": Screen("admin_caption", "back"),
+    "education_info": Screen("education_details", "back"),
+}
+callback_router = CallbackRouter()
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /start command"""
     user = update.effective_user
+    user_lang = context.user_data.get('language', 'am')
     
-    # Save user data to database
+    # Save user data to database (flushed in the background)
     user_data = UserData(
         user_id=str(user.id),
         username=user.username,
         full_name=user.full_name
     )
-    await db.users.replace_one(
-        {"user_id": str(user.id)}, 
-        user_data.dict(), 
-        upsert=True
-    )
+    # The language is only written when the user picks one; /start must not reset it
+    await user_profiles.update(user_data.user_id, user_data.model_dump(exclude={"language"}))
+    track(context, user.id, "start", user_lang)
     
     # Send welcome message with mosque image
-    mosque_image_url = "https://images.unsplash.com/photo-1512970648279-ff3398568f77?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Nzd8MHwxfHNlYXJjaHwyfHxtb3NxdWV8ZW58MHx8fHwxNzUzNTMxNTc2fDA&ixlib=rb-4.1.0&q=85"
-    
-    welcome_text = """
-🕌 ኣስላም ዐላይኹም ወ ረሕመቱላሒ ወ በረካቱ
-
-እንኮዋን ወደ የቁርአን ትምህርት ቦት ደህና መጡ!
-🕌 እንኳን በደህና መጡ ወደ “ኑረል ሁዳ ቦት የአረብኛ ቃንቃ መማሪያ እና የሂፍዝ ማዕከል”!
-⚠️አፑን ለመክፈት በግራ በኩል ያለውን nurel huda🌎 ሚለውን በተን ይጫኑ(mini app)
-🕋 የመልካም ሥራ መነሻ መንገድ ነው።በዚህ ቦት ውስጥ ከአረበኛ ትምህርት ጀምሮ፣እስከ   ሂፍዝ: መመዝገቢያ፣ መረጃ፣ አስተዳዳሪ ግንኙነትና ቻናሎቻችን ያግኛሉ::
-
-በዚህ ቦት ላይ የሚያገኟቸው አገልግሎቶች:
-✅ ቃኢዳ (መሠረታዊ አረብኛ እና ቁርኣን ንባብ)
-✅ ተጅዊድ (ተከክለኛው የቁርአን አነባበብ መማር)
-✅ ሂፍዝ (ቁርኣንን በልብ ማስቀመጥ)
-✅ ነዝር (ጥራት ያለው የቁርኣን ንባብ)
-
-ለመጀመር ከታች ያለውን ቁልፍ ይጫኑ 👇
-"""
-    
-    keyboard = [[InlineKeyboardButton("🚀 ጀምር", callback_data="start_bot")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_photo(
-        photo=mosque_image_url,
-        caption=welcome_text,
-        reply_markup=reply_markup
+    await reply_cached_photo(
+        update.message,
+        media_cache,
+        "welcome_photo",
+        welcome_photo,
+        caption=templates.render("welcome_message", user_lang),
+        reply_markup=keyboards.get("welcome", user_lang)
     )
 
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -184,115 +371,259 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     query = update.callback_query
     await query.answer()
     
+    user_lang = context.user_data.get('language', 'am')
     try:
-        user_lang = context.user_data.get('language', 'am')
         logger.info(f"Button callback: {query.data}, user_lang: {user_lang}")
+        route, param = callback_router.resolve(query.data)
+        if route is None or (route.name == "lang_*" and param not in texts.languages):
+            # Forged or stale data: never becomes a counter key
+            track(context, query.from_user.id, "unknown", user_lang)
+        elif route.name == "lang_*":
+            track(context, query.from_user.id, "language", param)
+        else:
+            track(context, query.from_user.id, route.name, user_lang)
         
-        if query.data == "start_bot":
-            # Show language selection
-            keyboard = []
-            for lang_code, lang_data in LANGUAGES.items():
-                keyboard.append([InlineKeyboardButton(lang_data["name"], callback_data=f"lang_{lang_code}")])
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_caption(
-                caption="እባክዎ ቋንቋዎን ይምረጡ / Please choose your language:",
-                reply_markup=reply_markup
-            )
-        
-        elif query.data.startswith("lang_"):
-            # Set language and show main menu
-            lang_code = query.data.split("_")[1]
-            context.user_data['language'] = lang_code
-            logger.info(f"Language selected: {lang_code}")
-            
-            # Update user language in database
-            await db.users.update_one(
-                {"user_id": str(query.from_user.id)},
-                {"$set": {"language": lang_code}},
-                upsert=True
-            )
-            
-            await show_main_menu(query, lang_code)
-        
-        elif query.data == "main_menu":
-            await show_main_menu(query, user_lang)
-        
-        elif query.data == "channel":
-            channel_url = "https://t.me/channelname"
-            await query.edit_message_caption(
-                caption=f"📺 {LANGUAGES[user_lang]['channel']}\n\n{channel_url}",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 ወደ ዋና ዝርዝር", callback_data="main_menu")
-                ]])
-            )
-        
-        elif query.data == "admin":
-            admin_url = "https://t.me/adminusername"
-            await query.edit_message_caption(
-                caption=f"👨‍💼 {LANGUAGES[user_lang]['admin']}\n\n{admin_url}",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 ወደ ዋና ዝርዝር", callback_data="main_menu")
-                ]])
-            )
-        
-        elif query.data == "register":
-            admin_url = "https://t.me/adminusername" 
-            await query.edit_message_caption(
-                caption=f"📝 {LANGUAGES[user_lang]['register']}\n\nለምዝገባ አስተዳደርን ያነጋግሩ:\n{admin_url}",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 ወደ ዋና ዝርዝር", callback_data="main_menu")
-                ]])
-            )
-        
-        elif query.data == "education_info":
-            await query.edit_message_caption(
-                caption=LANGUAGES[user_lang]['education_details'],
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 ወደ ዋና ዝርዝር", callback_data="main_menu")
-                ]])
-            )
-        
-        elif query.data == "restart":
-            # Restart flow - show language selection
-            keyboard = []
-            for lang_code, lang_data in LANGUAGES.items():
-                keyboard.append([InlineKeyboardButton(lang_data["name"], callback_data=f"lang_{lang_code}")])
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_caption(
-                caption="እባክዎ ቋንቋዎን ይምረጡ / Please choose your language:",
-                reply_markup=reply_markup
-            )
+        await callback_router.dispatch(query.data, query, context, user_lang)
             
     except Exception as e:
         logger.error(f"Error in button_callback: {e}")
-        await query.edit_message_caption(
-            caption="⚠️ Sorry, something went wrong. Please try /start again.",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔄 Restart", callback_data="start_bot")
-            ]])
+        await render_cache.edit_caption(
+            query,
+            caption=templates.render("error_message", user_lang),
+            reply_markup=keyboards.get("error", user_lang)
         )
 
+def show_screen(screen: Screen):
+    """Callback handler that renders a static screen in the user's language"""
+    async def handler(query, context, user_lang, param):
+        await render_cache.edit_caption(
+            query,
+            caption=templates.render(screen.caption_key, user_lang),
+            reply_markup=keyboards.get(screen.keyboard, user_lang)
+        )
+    return handler
+
 async def show_main_menu(query, lang_code):
     """Show the main menu"""
-    # Get the proper HTTPS URL from frontend .env
-    web_app_url = "https://c96d850f-73f9-40d1-ace6-5b78aa62cd15.preview.emergentagent.com"
+    await show_screen(SCREENS["main_menu"])(query, None, lang_code, None)
+
+for callback_data, screen in SCREENS.items():
+    callback_router.add_exact(callback_data, show_screen(screen))
+
+@callback_router.prefix("lang_")
+async def select_language(query, context, user_lang, lang_code):
+    """Set language and show main menu"""
+    if lang_code not in texts.languages:
+        # Not a language of the catalog (forged or from a removed language): ask again
+        await show_screen(SCREENS["start_bot"])(query, context, user_lang, None)
+        return
+    context.user_data['language'] = lang_code
+    logger.info(f"Language selected: {lang_code}")
     
-    keyboard = [
-        [InlineKeyboardButton(LANGUAGES[lang_code]['channel'], callback_data="channel")],
-        [InlineKeyboardButton(LANGUAGES[lang_code]['admin'], callback_data="admin")],
-        [InlineKeyboardButton(LANGUAGES[lang_code]['register'], callback_data="register")],
-        [InlineKeyboardButton(LANGUAGES[lang_code]['education_info'], callback_data="education_info")],
-        [InlineKeyboardButton(LANGUAGES[lang_code]['restart'], callback_data="restart")],
-        [InlineKeyboardButton(LANGUAGES[lang_code]['mini_app'], web_app=WebAppInfo(url=web_app_url))]
-    ]
+    # Update user language in the shared cache and database (flushed in the background)
+    await user_profiles.update(str(query.from_user.id), {"language": lang_code})
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_caption(
-        caption=LANGUAGES[lang_code]['main_menu'],
-        reply_markup=reply_markup
+    await show_main_menu(query, lang_code)
+
+# In-bot registration (the Register button): program -> schedule -> phone number -> confirm.
+# Each step is saved to the user's draft in the registrations collection and the conversation
+# state to Mongo, so any worker can take the next step; Confirm submits it to the admin queue.
+async def registration_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
+    """Entry point: ask for the program"""
+    query = update.callback_query
+    await query.answer()
+    user_lang = context.user_data.get('language', 'am')
+    track(context, query.from_user.id, "register", user_lang)
+    await render_cache.edit_caption(
+        query,
+        caption=templates.render("registration_program", user_lang),
+        reply_markup=keyboards.get("registration_programs", user_lang)
     )
+    return PROGRAM
+
+async def registration_program(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
+    """Save the program, ask for the schedule"""
+    query = update.callback_query
+    await query.answer()
+    user_lang = context.user_data.get('language', 'am')
+    program = query.data[len(f"{CALLBACK_PREFIX}program_"):]
+    await registration_queue.save_draft(str(query.from_user.id), program=program)
+    await render_cache.edit_caption(
+        query,
+        caption=templates.render("registration_schedule", user_lang, program=templates.render(PROGRAMS[program], user_lang)),
+        reply_markup=keyboards.get("registration_schedules", user_lang)
+    )
+    return SCHEDULE
+
+async def registration_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
+    """Save the schedule, ask for the phone number with a share-contact keyboard"""
+    query = update.callback_query
+    await query.answer()
+    user_lang = context.user_data.get('language', 'am')
+    schedule = query.data[len(f"{CALLBACK_PREFIX}schedule_"):]
+    await registration_queue.save_draft(str(query.from_user.id), schedule=schedule)
+    # Reply keyboards cannot be attached to an edit, so this is a new message
+    await query.message.reply_text(
+        templates.render("registration_contact", user_lang),
+        reply_markup=keyboards.get("registration_contact", user_lang)
+    )
+    return CONTACT
+
+async def registration_contact(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[str]:
+    """Save the phone number (shared contact or typed) and show the summary to confirm"""
+    message = update.message
+    user_lang = context.user_data.get('language', 'am')
+    if message.contact is not None:
+        # Only the user's own number, not someone else's forwarded contact
+        own = message.contact.user_id == update.effective_user.id
+        phone = normalize_phone(message.contact.phone_number) if own else None
+    else:
+        phone = normalize_phone(message.text)
+    if phone is None:
+        await message.reply_text(
+            templates.render("registration_invalid_phone", user_lang),
+            reply_markup=keyboards.get("registration_contact", user_lang)
+        )
+        return None
+    
+    draft = await registration_queue.save_draft(str(message.from_user.id), phone=phone)
+    if "program" not in draft or "schedule" not in draft:
+        # The draft expired while the conversation was idle
+        await message.reply_text(templates.render("registration_expired", user_lang), reply_markup=ReplyKeyboardRemove())
+        return ConversationHandler.END
+    await message.reply_text(
+        templates.render(
+            "registration_confirm",
+            user_lang,
+            program=templates.render(PROGRAMS[draft['program']], user_lang),
+            schedule=templates.render(SCHEDULES[draft['schedule']], user_lang),
+            phone=phone
+        ),
+        reply_markup=keyboards.get("registration_confirm", user_lang)
+    )
+    return CONFIRM
+
+async def registration_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Submit the draft to the admin queue"""
+    query = update.callback_query
+    await query.answer()
+    user = query.from_user
+    user_lang = context.user_data.get('language', 'am')
+    registration = await registration_queue.submit(
+        str(user.id), username=user.username, full_name=user.full_name, language=user_lang
+    )
+    if registration is None:
+        await query.edit_message_text(templates.render("registration_expired", user_lang))
+        return ConversationHandler.END
+    logger.info(f"Registration {registration['registration_id']} submitted by {user.id}")
+    track(context, user.id, "registration_submitted", user_lang)
+    await query.edit_message_text(templates.render("registration_submitted", user_lang))
+    return ConversationHandler.END
+
+async def registration_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Cancel button of the summary, or /cancel at any step"""
+    user_lang = context.user_data.get('language', 'am')
+    await registration_queue.discard_draft(str(update.effective_user.id))
+    text = templates.render("registration_cancelled", user_lang)
+    if update.callback_query is not None:
+        await update.callback_query.answer()
+        await update.callback_query.edit_message_text(text)
+    else:
+        await update.message.reply_text(text, reply_markup=ReplyKeyboardRemove())
+    return ConversationHandler.END
+
+async def registration_back(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Back to the main menu from the program or schedule picker; the draft is kept"""
+    query = update.callback_query
+    await query.answer()
+    user_lang = context.user_data.get('language', 'am')
+    track(context, query.from_user.id, "main_menu", user_lang)
+    await show_main_menu(query, user_lang)
+    return ConversationHandler.END
+
+async def registration_restart(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """/start in the middle of the flow leaves it"""
+    await start_command(update, context)
+    return ConversationHandler.END
+
+registration_schedule_handler = CallbackQueryHandler(
+    registration_schedule, pattern=f"^{CALLBACK_PREFIX}schedule_({'|'.join(SCHEDULES)})$"
+)
+registration_phone_handler = MessageHandler(filters.CONTACT | (filters.TEXT & ~filters.COMMAND), registration_contact)
+# The flow is per user, not per message: it moves from the menu photo to new messages
+warnings.filterwarnings("ignore", message="If 'per_message=False'", category=PTBUserWarning)
+registration_flow = DurableConversationHandler(
+    entry_points=[CallbackQueryHandler(registration_start, pattern="^register$")],
+    states={
+        PROGRAM: [CallbackQueryHandler(registration_program, pattern=f"^{CALLBACK_PREFIX}program_({'|'.join(PROGRAMS)})$")],
+        SCHEDULE: [registration_schedule_handler],
+        # The schedule can still be changed on the picker while the phone number is asked for
+        CONTACT: [registration_schedule_handler, registration_phone_handler],
+        CONFIRM: [CallbackQueryHandler(registration_confirm, pattern=f"^{CALLBACK_PREFIX}confirm$"), registration_phone_handler],
+    },
+    fallbacks=[
+        CallbackQueryHandler(registration_cancel, pattern=f"^{CALLBACK_PREFIX}cancel$"),
+        CommandHandler("cancel", registration_cancel),
+        CallbackQueryHandler(registration_back, pattern="^main_menu$"),
+        CommandHandler("start", registration_restart),
+    ],
+    allow_reentry=True,
+    per_message=False,
+    name="registration",
+    persistent=True,
+    refresh_when=continues_flow
+)
+
+# Frontend build, indexed once with its precompressed variants
+static_assets = StaticAssets(FRONTEND_BUILD_DIR, serve_source_maps=STATIC_SERVE_SOURCE_MAPS)
+
+# Metrics: histograms and counters the components already keep, read at scrape time
+loop_lag = LoopLagMonitor()
+telegram_api_latency = metrics.histogram("telegram_api_request_seconds", "Bot API call latency per method", ("method",))
+telegram_request = None
+metrics.collect_histograms(
+    "bot_callback_route_seconds", "Callback handler latency per route", ("route",),
+    lambda: {(route.name,): route.latency for route in callback_router.routes()}
+)
+metrics.collect_histograms("bot_update_wait_seconds", "Time updates wait for their user and a slot", (), lambda: {(): update_processor.waiting})
+metrics.collect_histograms("bot_update_handling_seconds", "Time spent running handlers per update", (), lambda: {(): update_processor.handling})
+metrics.gauge("bot_updates_running", "Updates whose handlers are running", lambda: update_processor.running)
+metrics.gauge("bot_updates_pending", "Updates admitted but not finished", lambda: update_processor.current_concurrent_updates)
+metrics.counter("bot_updates_processed_total", "Updates processed", lambda: update_processor.processed)
+metrics.counter("bot_message_edits_total", "Screen edits by what was sent (skipped: no API call)", lambda: render_cache.counts, ("outcome",))
+metrics.gauge("webhook_queue_depth", "Webhook updates waiting to be processed", lambda: update_ingestion.stats()["depth"])
+metrics.counter("webhook_updates_rejected_total", "Webhook updates refused because the queue was full", lambda: update_ingestion.rejected)
+metrics.counter(
+    "telegram_api_errors_total", "Bot API calls with a non-2xx status", lambda: telegram_request.errors if telegram_request else {},
+    ("method", "status")
+)
+metrics.gauge(
+    "telegram_circuit_breaker_state", "1 for the breaker's current state",
+    lambda: {state: int(telegram_breaker.state == state) for state in (CLOSED, HALF_OPEN, OPEN)}, ("state",)
+)
+metrics.counter("telegram_circuit_breaker_opened_total", "Times the breaker opened", lambda: telegram_breaker.opened)
+metrics.counter("telegram_requests_fast_failed_total", "Bot API calls refused by the open breaker", lambda: telegram_breaker.fast_failed)
+metrics.counter(
+    "telegram_request_retries_total", "Bot API call retries per method",
+    lambda: telegram_request.retries if telegram_request else {}, ("method",)
+)
+metrics.counter("bot_updates_shed_total", "Updates dropped while the breaker was open", lambda: breaker_guard.shed)
+metrics.counter("bot_registrations_submitted_total", "Registrations submitted to the admin queue", lambda: registration_queue.submitted)
+metrics.counter("mongo_command_failures_total", "Failed Mongo commands", lambda: dict(mongo_metrics.failures), ("collection", "command"))
+metrics.counter("analytics_events_recorded_total", "Interaction events recorded", lambda: interaction_events.recorded)
+metrics.counter("analytics_events_dropped_total", "Interaction events dropped because the buffer was full", lambda: interaction_events.dropped)
+metrics.gauge("analytics_buffer_depth", "Interaction events waiting to be written", lambda: interaction_events.stats()["depth"])
+metrics.gauge("user_write_buffer_depth", "Users with writes waiting to be flushed", lambda: user_writes.stats()["depth"])
+metrics.collect_histograms("user_write_flush_seconds", "Write-behind bulk_write latency", (), lambda: {(): user_writes.flush_latency})
+metrics.counter(
+    "rate_limit_rejected_total", "Requests and updates refused by a rate limiter",
+    lambda: {**{prefix: limiter.rejected for prefix, limiter in api_rate_limits if limiter}, "bot": update_rate_limiter.limiter.rejected},
+    ("limiter",)
+)
+metrics.collect_histograms("event_loop_lag_seconds", "How late the event loop wakes a sleeping task", (), lambda: {(): loop_lag.lag})
+metrics.gauge("event_loop_lag_max_seconds", "Worst event loop lag since start", lambda: loop_lag.max)
+metrics.counter("static_responses_total", "Static files sent per content encoding", lambda: static_assets.served, ("encoding",))
+metrics.counter("static_not_modified_total", "Static requests answered 304 from the ETag", lambda: static_assets.not_modified)
 
 # API Routes
 @api_router.get("/")
@@ -303,43 +634,355 @@ async def root():
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    await asyncio.gather(
+        db.status_checks.insert_one(status_obj.dict()),
+        record_status_check(db, status_obj.client_name, status_obj.timestamp)
+    )
     return status_obj
 
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+@api_router.get("/status", response_model=Union[List[StatusCheck], List[StatusRollup]])
+async def get_status_checks(
+    granularity: str = Query("raw", pattern="^(raw|minute|hour)$"),
+    client_name: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Latest-first status checks, or their per-minute / per-hour rollups"""
+    time_field = "timestamp" if granularity == "raw" else "bucket"
+    query = {}
+    if granularity != "raw":
+        query["granularity"] = granularity
+    if client_name:
+        query["client_name"] = client_name
+    window = {}
+    if since:
+        window["$gte"] = since
+    if until:
+        window["$lt"] = until
+    if window:
+        query[time_field] = window
+    
+    collection = db.status_checks if granularity == "raw" else db[ROLLUP_COLLECTION]
+    rows = await collection.find(query, {"_id": 0}).sort(time_field, -1).limit(limit).to_list(limit)
+    if granularity == "raw":
+        return [StatusCheck(**row) for row in rows]
+    return [StatusRollup(**row) for row in rows]
+
+@api_router.get("/users/write-buffer/stats")
+async def user_write_buffer_stats():
+    return user_writes.stats()
+
+@api_router.get("/users/cache/stats")
+async def user_cache_stats():
+    return {**bot_persistence.stats(), "shared": user_profiles.stats()}
+
+# Keyset sort orders for /api/users; the last key is unique so pages never overlap
+USER_SORTS = {"user_id": ("user_id",), "timestamp": ("timestamp", "user_id")}
+USER_FIELDS = list(UserData.model_fields)
+USER_EXPORT_BATCH_SIZE = 1000
+
+def user_filter(language: Optional[str], since: Optional[datetime], until: Optional[datetime], sort: str = "user_id") -> dict:
+    query = {}
+    if language:
+        query["language"] = language
+    timestamp = {}
+    if since:
+        timestamp["$gte"] = since
+    if until:
+        timestamp["$lt"] = until
+    if sort == "timestamp":
+        # Users created by a language pick before /start have no timestamp
+        timestamp["$type"] = "date"
+    if timestamp:
+        query["timestamp"] = timestamp
+    return query
+
+def user_projection(fields: Optional[str], required=()) -> dict:
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else USER_FIELDS
+    unknown = set(selected) - set(USER_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return {"_id": 0, **{field: 1 for field in [*selected, *required]}}
 
 @api_router.get("/users")
-async def get_users():
-    users = await db.users.find().to_list(1000)
-    return users
+async def get_users(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    language: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    sort: str = Query("user_id", pattern="^(user_id|timestamp)$"),
+    _: dict = Depends(require_role("admin")),
+):
+    keys = USER_SORTS[sort]
+    query = user_filter(language, since, until, sort)
+    if cursor:
+        try:
+            last = decode_cursor(cursor, sort, keys, date_keys=("timestamp",))
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = merge_filters(query, keyset_filter(keys, last))
+    
+    # Fetch one extra row to know whether there is a next page
+    users = await (
+        db.users.find(query, user_projection(fields, required=keys))
+        .sort([(key, 1) for key in keys])
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(sort, users[-1], keys)
+    return {"users": users, "next_cursor": next_cursor}
+
+@api_router.get("/users/export")
+async def export_users(
+    fields: Optional[str] = None,
+    language: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    _: dict = Depends(require_role("admin")),
+):
+    """Stream matching users as NDJSON without materializing the result set"""
+    cursor = db.users.find(
+        user_filter(language, since, until), user_projection(fields)
+    ).batch_size(USER_EXPORT_BATCH_SIZE)
+    
+    def encode(value):
+        # ISO 8601 like /api/users (str() would give "YYYY-MM-DD HH:MM:SS")
+        return value.isoformat() if isinstance(value, datetime) else str(value)
+    
+    async def lines():
+        async for user in cursor:
+            yield json.dumps(user, default=encode, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+# Telegram webhook endpoints
+@api_router.post("/telegram/webhook")
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(default=None),
+):
+    if BOT_UPDATE_MODE != "webhook":
+        raise HTTPException(status_code=503, detail="Webhook mode is not active")
+    if telegram_app is None:
+        # Still booting; Telegram retries the update
+        raise HTTPException(status_code=503, detail="The bot is starting")
+    if not secret_matches(WEBHOOK_SECRET, x_telegram_bot_api_secret_token):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+    
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    update = Update.de_json(payload, telegram_app.bot)
+    if update is None:
+        raise HTTPException(status_code=400, detail="Invalid update")
+    
+    # Telegram is failing: answer in the webhook response instead of queueing work that would fail
+    if breaker_guard.open:
+        notice = templates.render("service_unavailable", await stored_language(update))
+        return breaker_guard.webhook_reply(update, notice) or {"ok": True}
+    
+    # Telegram retries non-2xx responses, so a full queue just defers the update
+    if not update_ingestion.offer(update):
+        raise HTTPException(status_code=503, detail="Update queue is full")
+    return {"ok": True}
+
+async def stored_language(update: Update) -> str:
+    """The user's language for updates answered outside the handlers (no context.user_data)"""
+    if update.effective_user is None:
+        return 'am'
+    try:
+        profile = await user_profiles.get(str(update.effective_user.id))
+    except Exception as e:
+        logger.warning(f"Could not load the profile of {update.effective_user.id}: {e}")
+        profile = None
+    return (profile or {}).get("language") or 'am'
+
+@api_router.get("/telegram/webhook/stats")
+async def telegram_webhook_stats():
+    return {"mode": BOT_UPDATE_MODE, **update_ingestion.stats()}
+
+@api_router.get("/telegram/dispatcher/stats")
+async def telegram_dispatcher_stats():
+    return update_processor.stats()
+
+@api_router.get("/telegram/routes/stats")
+async def telegram_route_stats():
+    return callback_router.stats()
+
+@api_router.get("/telegram/client/stats")
+async def telegram_client_stats():
+    return {
+        "pool_size": TELEGRAM_POOL_SIZE,
+        "breaker": telegram_breaker.stats(),
+        "retries": telegram_request.retries if telegram_request else {},
+        "guard": breaker_guard.stats(),
+    }
+
+@api_router.get("/telegram/render/stats")
+async def telegram_render_stats():
+    return render_cache.stats()
+
+# Text catalog endpoints
+@api_router.get("/texts")
+async def get_texts_version():
+    return {"version": texts.current.version, "digest": texts.current.digest, "reloads": texts.reloads}
+
+@api_router.post("/texts/reload")
+async def reload_texts(_: dict = Depends(require_role("admin"))):
+    try:
+        changed = texts.reload()
+    except CatalogError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"changed": changed, "version": texts.current.version, "digest": texts.current.digest}
+
+# Analytics endpoints
+@api_router.get("/analytics/funnel")
+async def analytics_funnel(days: int = Query(30, ge=1, le=366), _: dict = Depends(require_role("admin"))):
+    """Onboarding funnel, per-language and per-day counts, read from the maintained counters"""
+    return await funnel_dashboard(db[COUNTERS_COLLECTION], days)
+
+@api_router.get("/analytics/stats")
+async def analytics_stats():
+    return interaction_events.stats()
+
+# Registration queue endpoints
+@api_router.get("/registrations")
+async def get_registrations(
+    status: str = Query(PENDING, pattern="^(pending|approved|rejected)$"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    _: dict = Depends(require_role("admin")),
+):
+    """Submitted registrations with a status, first submitted first"""
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, status, QUEUE_KEYS, date_keys=("submitted_at",))
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    registrations, next_cursor = await registration_queue.page(status, limit, after)
+    return {"registrations": registrations, "next_cursor": next_cursor}
+
+@api_router.get("/registrations/stats")
+async def registration_stats():
+    return registration_queue.stats()
+
+@api_router.patch("/registrations/{registration_id}")
+async def review_registration(registration_id: str, input: RegistrationReview, claims: dict = Depends(require_role("admin"))):
+    registration = await registration_queue.set_status(registration_id, input.status, claims["sub"])
+    if registration is None:
+        raise HTTPException(status_code=404, detail="Registration not found")
+    return registration
+
+# Broadcast endpoints
+@api_router.post("/broadcasts")
+async def create_broadcast(input: BroadcastCreate, _: dict = Depends(require_role("admin"))):
+    if broadcaster is None:
+        raise HTTPException(status_code=503, detail="Telegram bot is not running")
+    unknown = set(input.messages) - set(texts.languages)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown languages: {', '.join(sorted(unknown))}")
+    if input.default_language not in input.messages:
+        raise HTTPException(status_code=400, detail="messages must include the default_language")
+    
+    broadcast_id = await broadcaster.create(input.messages, input.default_language)
+    if telegram_app is not None:
+        broadcaster.start(broadcast_id)
+    # Otherwise a bot worker picks it up within BROADCAST_POLL_INTERVAL
+    return {"id": broadcast_id}
+
+@api_router.get("/broadcasts/{broadcast_id}")
+async def get_broadcast(broadcast_id: str, _: dict = Depends(require_role("admin"))):
+    broadcast = await db.broadcasts.find_one({"_id": broadcast_id}, {"messages": 0})
+    if broadcast is None:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    broadcast["id"] = broadcast.pop("_id")
+    return broadcast
 
 # Portal login endpoints
+async def portal_login(role: str, credentials: dict):
+    """Check credentials against portal_users and issue an access token"""
+    token = await auth_service.login(str(credentials.get("username", "")), str(credentials.get("password", "")), role)
+    if token is None:
+        return {"success": False, "message": "Invalid credentials"}
+    return {
+        "success": True,
+        "message": f"{role.capitalize()} login successful",
+        "role": role,
+        "access_token": token,
+        "token_type": "bearer",
+        "expires_in": int(JWT_TTL_SECONDS)
+    }
+
 @api_router.post("/login/admin")
 async def admin_login(credentials: dict):
-    if credentials.get("username") == "admin" and credentials.get("password") == "admin123":
-        return {"success": True, "message": "Admin login successful", "role": "admin"}
-    return {"success": False, "message": "Invalid credentials"}
+    return await portal_login("admin", credentials)
 
-@api_router.post("/login/teacher")  
+@api_router.post("/login/teacher")
 async def teacher_login(credentials: dict):
-    if credentials.get("username") == "teacher" and credentials.get("password") == "teacher123":
-        return {"success": True, "message": "Teacher login successful", "role": "teacher"}
-    return {"success": False, "message": "Invalid credentials"}
+    return await portal_login("teacher", credentials)
 
 @api_router.post("/login/student")
 async def student_login(credentials: dict):
-    if credentials.get("username") == "student" and credentials.get("password") == "student123":
-        return {"success": True, "message": "Student login successful", "role": "student"}
-    return {"success": False, "message": "Invalid credentials"}
+    return await portal_login("student", credentials)
+
+@api_router.get("/auth/me")
+async def auth_me(claims: dict = Depends(require_role())):
+    return {"username": claims["sub"], "role": claims["role"], "expires_at": claims["exp"]}
+
+@api_router.get("/health/live")
+async def health_live():
+    return {"status": "ok", "role": health.role}
+
+@api_router.get("/health/ready")
+async def health_ready():
+    status = health.status()
+    status["boot"] = boot.stats()
+    if WORKER_STATUS_DIR:
+        status["workers"] = read_heartbeats(WORKER_STATUS_DIR, WORKER_HEALTH_TIMEOUT)
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@api_router.get("/metrics")
+async def prometheus_metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@api_router.get("/rate-limits/stats")
+async def rate_limit_stats():
+    return {
+        "enabled": RATE_LIMIT_ENABLED,
+        "api": {prefix: limiter.stats() for prefix, limiter in api_rate_limits if limiter is not None},
+        "bot": update_rate_limiter.stats()
+    }
+
+@api_router.get("/static/stats")
+async def static_stats():
+    return static_assets.stats()
+
+@api_router.get("/auth/stats")
+async def auth_stats():
+    return auth_service.stats()
 
 # Include the router in the main app
 app.include_router(api_router)
 
 # Serve static files from frontend build
-app.mount("/", StaticFiles(directory="/app/frontend/build", html=True), name="static")
+app.mount("/", static_assets, name="static")
+
+app.add_middleware(
+    RateLimitMiddleware,
+    rules=api_rate_limits,
+    enabled=RATE_LIMIT_ENABLED,
+    trusted_proxies=RATE_LIMIT_TRUSTED_PROXIES.split(",")
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -356,32 +999,183 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("startup")
-async def startup_event():
-    """Start the Telegram bot when FastAPI starts"""
-    global telegram_app
+async def mongo_ready() -> bool:
+    await client.admin.command("ping")
+    return True
+
+def bot_ready() -> bool:
+    if telegram_app is None or not telegram_app.running:
+        return False
+    if BOT_UPDATE_MODE == "webhook":
+        return update_ingestion.running
+    return telegram_app.updater.running
+
+async def prepare_database():
+    """Indexes, the query plan check and the portal accounts (a boot step of the API)"""
+    await ensure_indexes(db, STATUS_CHECK_TTL_SECONDS, STATUS_MINUTE_ROLLUP_TTL_SECONDS)
+    if MONGO_QUERY_PLAN_CHECK != "off":
+        try:
+            await check_query_plans(db)
+        except Exception as e:
+            # QueryPlanError, or explain itself failed
+            logger.error(f"Query plan check failed: {e}")
+            # strict: stay not ready, and keep checking, rather than serve with a COLLSCAN
+            if MONGO_QUERY_PLAN_CHECK == "strict":
+                raise
+    await auth_service.bootstrap(parse_bootstrap_users(PORTAL_BOOTSTRAP_USERS))
+    asyncio.create_task(backfill_rollups_if_empty(db))
+
+async def prepare_events():
+    """Create the events collection before the first batch is written to it"""
+    await ensure_event_collection(db, ANALYTICS_EVENT_TTL_SECONDS)
+    interaction_events.start()
+
+boot = BootTasks(min_delay=BOOT_RETRY_MIN_DELAY, max_delay=BOOT_RETRY_MAX_DELAY)
+
+def start_runtime():
+    """Background services shared by the API and the bot workers; what needs Mongo or the cache is a boot step"""
+    user_writes.start()
+    texts.start()
+    if METRICS_ENABLED:
+        loop_lag.start()
+    boot.add("events", prepare_events)
+    boot.add("cache", user_profiles.start)
+
+async def stop_runtime():
+    await texts.stop()
+    await loop_lag.stop()
+    await interaction_events.stop()
+    await user_writes.stop()
+    await shared_cache.close()
+    client.close()
+
+async def start_bot():
+    """Build and start the Telegram Application (polling or webhook) and the broadcaster.
+
+    A boot step: raises when something fails, after stopping whatever had
+    started, so the next attempt begins from scratch.
+    """
+    global telegram_app, broadcaster, telegram_request
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(f"{TELEGRAM_API_BASE_URL}/bot")
+        .base_file_url(f"{TELEGRAM_API_BASE_URL}/file/bot")
+        .concurrent_updates(update_processor)
+        .persistence(bot_persistence)
+    )
+    request_options = dict(
+        breaker=telegram_breaker,
+        max_retries=TELEGRAM_MAX_RETRIES,
+        max_retry_after=TELEGRAM_MAX_RETRY_AFTER,
+        connection_pool_size=TELEGRAM_POOL_SIZE,
+        pool_timeout=TELEGRAM_POOL_TIMEOUT,
+        read_timeout=TELEGRAM_READ_TIMEOUT,
+    )
+    if METRICS_ENABLED:
+        telegram_request = InstrumentedResilientRequest(latency=telegram_api_latency, **request_options)
+    else:
+        telegram_request = ResilientRequest(**request_options)
+    builder = builder.request(telegram_request)
+    if BOT_UPDATE_MODE == "webhook":
+        # Updates arrive through /api/telegram/webhook, no getUpdates loop
+        builder = builder.updater(None)
+    else:
+        # The long poll keeps its own connection and never waits behind sends
+        builder = builder.get_updates_request(HTTPXRequest(connection_pool_size=1))
+    application = builder.build()
+    
+    # Add handlers; the breaker guard and the throttle run first, each in its own group,
+    # and stop updates that should not reach the handlers. Then the registration state is
+    # brought up to date in case another worker handled the previous step.
+    application.add_handler(TypeHandler(Update, breaker_guard), group=-3)
+    application.add_handler(TypeHandler(Update, update_rate_limiter), group=-2)
+    application.add_handler(TypeHandler(Update, registration_flow.refresh), group=-1)
+    application.add_handler(registration_flow)
+    application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CallbackQueryHandler(button_callback))
+    
+    # The bundled or already downloaded photo, read before the first /start can arrive
+    await welcome_photo.load()
+    
     try:
-        telegram_app = Application.builder().token(BOT_TOKEN).build()
+        await application.initialize()
+        await application.start()
         
-        # Add handlers
-        telegram_app.add_handler(CommandHandler("start", start_command))
-        telegram_app.add_handler(CallbackQueryHandler(button_callback))
-        
-        # Start polling in background
-        await telegram_app.initialize()
-        await telegram_app.start()
-        await telegram_app.updater.start_polling()
-        
-        logger.info("Telegram bot started successfully")
-    except Exception as e:
-        logger.error(f"Failed to start Telegram bot: {e}")
+        if BOT_UPDATE_MODE == "webhook":
+            if not WEBHOOK_URL or not WEBHOOK_SECRET:
+                raise RuntimeError("TELEGRAM_WEBHOOK_URL and TELEGRAM_WEBHOOK_SECRET are required in webhook mode")
+            update_ingestion.start(application)
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES
+            )
+        else:
+            # Start polling in background
+            await application.updater.start_polling()
+    except (Exception, asyncio.CancelledError):
+        await close_application(application)
+        raise
+    
+    # The webhook endpoint accepts updates from here on
+    telegram_app = application
+    
+    # Fetch the welcome photo once now so /start never waits on the CDN
+    asyncio.create_task(welcome_photo.ensure_local_copy())
+    
+    broadcaster = Broadcaster(telegram_app.bot, db, rate=BROADCAST_RATE, concurrency=BROADCAST_CONCURRENCY)
+    broadcaster.watch(BROADCAST_POLL_INTERVAL)
+    
+    logger.info(f"Telegram bot started successfully ({BOT_UPDATE_MODE} mode)")
+
+async def close_application(application):
+    """Stop and shut down whatever part of ``application`` is running"""
+    if application.updater and application.updater.running:
+        await application.updater.stop()
+    await update_ingestion.stop()
+    if application.running:
+        await application.stop()
+    await application.shutdown()
+
+async def stop_bot():
+    if broadcaster:
+        await broadcaster.stop()
+    if telegram_app:
+        await close_application(telegram_app)
+
+health = Health("api", status_dir=WORKER_STATUS_DIR or None)
+health.add_check("mongo", mongo_ready)
+health.add_check("database", lambda: boot.done("database"))
+if BOT_RUNTIME == "embedded":
+    health.add_check("bot", bot_ready)
+
+@app.on_event("startup")
+async def startup_event():
+    """Start the background services and boot the database and the Telegram bot.
+
+    Nothing here waits on Mongo or Telegram: /api/ answers right away and
+    /api/health/ready reports when the boot steps are done.
+    """
+    global broadcaster
+    if not JWT_SECRET and not JWT_PRIVATE_KEY_PATH:
+        logger.warning("JWT_SECRET is not set: portal tokens are signed with a per-process key")
+    asyncio.create_task(auth_service.hasher.warm())
+    boot.add("database", prepare_database)
+    start_runtime()
+    if BOT_RUNTIME == "embedded":
+        boot.add("bot", start_bot)
+    else:
+        # Broadcasts are only recorded here; the bot workers send them
+        broadcaster = Broadcaster(None, db, rate=BROADCAST_RATE, concurrency=BROADCAST_CONCURRENCY)
+    boot.start()
+    health.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Stop the Telegram bot when FastAPI shuts down"""
-    global telegram_app
-    if telegram_app:
-        await telegram_app.updater.stop()
-        await telegram_app.stop()
-        await telegram_app.shutdown()
-    client.close()
+    await health.stop()
+    await boot.stop()
+    await stop_bot()
+    auth_service.hasher.shutdown()
+    await stop_runtime()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Static serving for the React build (the Telegram mini app).
+
+The build directory is indexed once: content type, size and a content-hash
+ETag per file, plus the .br/.gz variants produced at build time by
+
+    python static.py compress ../frontend/build
+
+(run automatically by `yarn build`). Requests then pick the smallest
+variant the client accepts without touching the disk until the file is
+sent. Content-hashed files (main.d2e70eea.js) are cached for a year as
+immutable; everything else, index.html first, is revalidated with its ETag
+and answered 304 when unchanged. Source maps are not served unless asked for.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, PlainTextResponse, Response
+
+logger = logging.getLogger(__name__)
+
+# Build-time encodings in order of preference, with the file suffix they use
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE_SUFFIXES = {".html", ".js", ".css", ".json", ".map", ".svg", ".txt", ".xml", ".ico"}
+# Not worth a variant: the headers cost more than the compression saves
+MIN_COMPRESS_SIZE = 512
+# Written by `compress`: sha256 of every file the variants were made from
+MANIFEST_NAME = ".precompressed.json"
+
+# CRA puts an 8+ hex digit content hash in every file under static/
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+@dataclass
+class Asset:
+    path: Path
+    media_type: str
+    etag: str
+    cache_control: str
+    stat: os.stat_result
+    # encoding -> (path, stat) of the precompressed variant
+    variants: Dict[str, Tuple[Path, os.stat_result]] = field(default_factory=dict)
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Accept-Encoding as {coding: q}; codings with q=0 are left out"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+class StaticAssets:
+    """ASGI app serving a frontend build, mounted at / under the API routes.
+
+    Behaves like ``StaticFiles(directory, html=True)`` for routing
+    (``/`` and directories serve their index.html, unknown paths 404.html
+    when the build has one) but serves from an in-memory index: the build
+    is immutable between deploys, and every deploy restarts the workers.
+    """
+
+    def __init__(self, directory: str, serve_source_maps: bool = False):
+        self.directory = Path(directory)
+        self.serve_source_maps = serve_source_maps
+        self.assets: Dict[str, Asset] = {}
+        self.served: Dict[str, int] = {}
+        self.not_modified = 0
+        self.not_found = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+        self.scan()
+
+    def _hidden(self, relative: str) -> bool:
+        name = relative.rsplit("/", 1)[-1]
+        if name.startswith("."):
+            return True
+        return name.endswith(".map") and not self.serve_source_maps
+
+    def scan(self) -> None:
+        assets = {}
+        if not self.directory.is_dir():
+            logger.warning(f"Frontend build {self.directory} not found; only the API is served")
+        else:
+            manifest = read_manifest(self.directory)
+            for path in sorted(self.directory.rglob("*")):
+                relative = path.relative_to(self.directory).as_posix()
+                if not path.is_file() or path.suffix in (".br", ".gz") or self._hidden(relative):
+                    continue
+                digest = hashlib.sha256(path.read_bytes()).hexdigest()
+                media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+                if media_type.startswith("text/") or media_type in ("application/javascript", "application/json"):
+                    media_type += "; charset=utf-8"
+                asset = Asset(
+                    path=path,
+                    media_type=media_type,
+                    etag=f'"{digest[:20]}"',
+                    cache_control=IMMUTABLE if HASHED_NAME.search(path.name) else REVALIDATE,
+                    stat=path.stat(),
+                )
+                # Variants are only trusted for the exact content they were made from,
+                # a file rebuilt without re-running compress is served uncompressed
+                if manifest.get(relative) == digest:
+                    for encoding, suffix in ENCODINGS:
+                        variant = path.with_name(path.name + suffix)
+                        if variant.is_file():
+                            asset.variants[encoding] = (variant, variant.stat())
+                assets[relative] = asset
+        self.assets = assets
+        compressed = sum(1 for asset in assets.values() if asset.variants)
+        logger.info(f"Indexed {len(assets)} static files in {self.directory}, {compressed} precompressed")
+
+    def lookup(self, path: str) -> Optional[Asset]:
+        relative = path.lstrip("/")
+        asset = self.assets.get(relative)
+        if asset is None and (relative == "" or relative.endswith("/") or "." not in relative.rsplit("/", 1)[-1]):
+            asset = self.assets.get(f"{relative.rstrip('/')}/index.html".lstrip("/"))
+        return asset
+
+    def response(self, asset: Asset, headers: Headers, status_code: int = 200) -> Response:
+        encoding = None
+        if asset.variants:
+            accepted = accepted_encodings(headers.get("accept-encoding", ""))
+            for candidate, _ in ENCODINGS:
+                if candidate in asset.variants and accepted.get(candidate, accepted.get("*", 0)) > 0:
+                    encoding = candidate
+                    break
+
+        # Each representation has its own ETag, a cache must not swap them
+        etag = f'{asset.etag[:-1]}-{encoding}"' if encoding else asset.etag
+        response_headers = {"cache-control": asset.cache_control, "etag": etag}
+        if asset.variants:
+            response_headers["vary"] = "Accept-Encoding"
+
+        if status_code == 200 and etag_matches(headers.get("if-none-match", ""), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=response_headers)
+
+        path, stat = asset.variants[encoding] if encoding else (asset.path, asset.stat)
+        if encoding:
+            response_headers["content-encoding"] = encoding
+            self.bytes_saved += asset.stat.st_size - stat.st_size
+        key = encoding or "identity"
+        self.served[key] = self.served.get(key, 0) + 1
+        self.bytes_sent += stat.st_size
+        return FileResponse(
+            path, status_code=status_code, headers=response_headers, media_type=asset.media_type, stat_result=stat
+        )
+
+    async def __call__(self, scope, receive, send):
+        assert scope["type"] == "http"
+        if scope["method"] not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405, headers={"allow": "GET, HEAD"})
+            await response(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        # Path below the mount point, like StaticFiles
+        root_path = scope.get("root_path", "")
+        path = scope["path"][len(root_path):] if scope["path"].startswith(root_path) else scope["path"]
+        asset = self.lookup(path)
+        if asset is not None:
+            response = self.response(asset, headers)
+        else:
+            self.not_found += 1
+            not_found_page = self.assets.get("404.html")
+            if not_found_page is not None:
+                response = self.response(not_found_page, headers, status_code=404)
+            else:
+                response = PlainTextResponse("Not Found", status_code=404)
+        await response(scope, receive, send)
+
+    def stats(self) -> dict:
+        return {
+            "directory": str(self.directory),
+            "files": len(self.assets),
+            "precompressed": sum(1 for asset in self.assets.values() if asset.variants),
+            "source_maps": self.serve_source_maps,
+            "served": dict(self.served),
+            "not_modified": self.not_modified,
+            "not_found": self.not_found,
+            "bytes_sent": self.bytes_sent,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def read_manifest(directory: Path) -> Dict[str, str]:
+    try:
+        return json.loads((directory / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def compress_build(directory: str, force: bool = False) -> Dict[str, int]:
+    """Write .br (with the brotli package) and .gz next to every compressible file.
+
+    The sha256 of each source goes into the manifest, which is how both this
+    command and StaticAssets tell an up-to-date variant from a stale one
+    (mtimes do not survive a git checkout). Variants that would not be
+    smaller are not written; variants whose source is gone are removed.
+    """
+    brotli = _brotli()
+    if brotli is None:
+        logger.warning("brotli is not installed (pip install brotli); writing gzip variants only")
+    root = Path(directory)
+    previous = read_manifest(root)
+    manifest = {}
+    counts = {"files": 0, "gzip": 0, "br": 0, "skipped": 0, "removed": 0}
+    for path in sorted(root.rglob("*")):
+        if not path.is_file():
+            continue
+        if path.suffix in (".br", ".gz"):
+            if not path.with_suffix("").exists():
+                path.unlink()
+                counts["removed"] += 1
+            continue
+        if path.name == MANIFEST_NAME or path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+        if path.stat().st_size < MIN_COMPRESS_SIZE:
+            continue
+        relative = path.relative_to(root).as_posix()
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        manifest[relative] = digest
+        counts["files"] += 1
+        if not force and previous.get(relative) == digest:
+            counts["skipped"] += 1
+            continue
+        for encoding, suffix in ENCODINGS:
+            variant = path.with_name(path.name + suffix)
+            if encoding == "br":
+                if brotli is None:
+                    variant.unlink(missing_ok=True)
+                    continue
+                compressed = brotli.compress(data, quality=11)
+            else:
+                # mtime=0 keeps the output identical across rebuilds of the same file
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) >= len(data):
+                variant.unlink(missing_ok=True)
+                continue
+            variant.write_bytes(compressed)
+            counts[encoding] += 1
+    (root / MANIFEST_NAME).write_text(json.dumps(manifest, indent=1, sort_keys=True) + "\n")
+    return counts
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("compress", help="precompress a build directory")
+    p.add_argument("directory")
+    p.add_argument("--force", action="store_true", help="recompress files whose variants look up to date")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    counts = compress_build(args.directory, force=args.force)
+    print(f"🗜️  {counts['files']} files: {counts['br']} brotli, {counts['gzip']} gzip written, "
+          f"{counts['skipped']} up to date, {counts['removed']} stale variants removed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
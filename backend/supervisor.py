@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Process supervisor: N bot workers and M API workers on one machine.
+
+Opens the listening sockets itself and hands them to the children, so the
+API workers share --port and the bot workers (webhook mode) share
+--bot-port; the kernel spreads connections between them. Children run with
+BOT_RUNTIME=external and publish heartbeats in a status directory. A child
+that exits, or whose heartbeat goes stale, is restarted with backoff.
+
+    python supervisor.py --api-workers 2 --bot-workers 2 --port 8001 --bot-port 8002
+
+Health contract:
+  * every worker serves GET /api/health/live (process up) and
+    GET /api/health/ready (200 once its checks pass, 503 otherwise);
+  * every worker rewrites <status-dir>/<role>-<pid>.json each round of
+    checks; no update for --health-timeout seconds means hung;
+  * /api/health/ready on the API also lists every worker's last heartbeat.
+"""
+
+import argparse
+import logging
+import os
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from dotenv import dotenv_values
+
+from health import read_heartbeat
+
+logger = logging.getLogger("supervisor")
+
+BACKEND_DIR = Path(__file__).parent
+
+
+def listen(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Child:
+    def __init__(self, role: str, index: int, argv: List[str], fd: int):
+        self.role = role
+        self.index = index
+        self.argv = argv
+        self.fd = fd
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.next_start = 0.0
+        self.ready = False
+
+    @property
+    def name(self) -> str:
+        return f"{self.role}-{self.index}"
+
+
+def shared_jwt_secret() -> Optional[str]:
+    """A JWT_SECRET for the children when neither it nor JWT_PRIVATE_KEY_PATH is configured.
+
+    Otherwise every API worker would sign with its own random secret and a
+    token would only be accepted by the worker that issued it.
+    """
+    configured = {**dotenv_values(BACKEND_DIR / ".env"), **os.environ}
+    if configured.get("JWT_SECRET") or configured.get("JWT_PRIVATE_KEY_PATH"):
+        return None
+    return secrets.token_urlsafe(32)
+
+
+class Supervisor:
+    def __init__(self, args, status_dir: str):
+        self.args = args
+        self.status_dir = status_dir
+        self.children: List[Child] = []
+        self.stopping = False
+        self.jwt_secret = shared_jwt_secret()
+
+    def env(self) -> dict:
+        env = {
+            **os.environ,
+            "BOT_RUNTIME": "external",
+            "WORKER_STATUS_DIR": self.status_dir,
+            "WORKER_HEALTH_TIMEOUT": str(self.args.health_timeout),
+        }
+        if self.jwt_secret:
+            env["JWT_SECRET"] = self.jwt_secret
+        return env
+
+    def spawn(self, child: Child) -> None:
+        child.process = subprocess.Popen(child.argv, cwd=BACKEND_DIR, env=self.env(), pass_fds=[child.fd])
+        child.started_at = time.monotonic()
+        child.ready = False
+        logger.info(f"Started {child.name} (pid {child.process.pid})")
+
+    def heartbeat_age(self, child: Child) -> Optional[float]:
+        status = read_heartbeat(Path(self.status_dir) / f"{child.role}-{child.process.pid}.json")
+        if status is None or status.get("updated_at") is None:
+            return None
+        if status["ready"] != child.ready:
+            child.ready = status["ready"]
+            logger.info(f"{child.name} is {'ready' if child.ready else 'NOT ready'}: {status['checks']}")
+        return time.time() - status["updated_at"]
+
+    def stop_child(self, child: Child, timeout: float) -> None:
+        if child.process is None or child.process.poll() is not None:
+            return
+        child.process.terminate()
+        try:
+            child.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"{child.name} did not stop in {timeout}s, killing it")
+            child.process.kill()
+            child.process.wait()
+
+    def restart_later(self, child: Child, reason: str) -> None:
+        delay = min(2 ** child.restarts, 30)
+        child.restarts += 1
+        child.next_start = time.monotonic() + delay
+        # A killed worker cannot remove its own heartbeat; don't let the API list it
+        (Path(self.status_dir) / f"{child.role}-{child.process.pid}.json").unlink(missing_ok=True)
+        child.process = None
+        logger.error(f"{child.name} {reason}; restarting in {delay}s")
+
+    def check(self, child: Child) -> None:
+        if child.process is None:
+            if time.monotonic() >= child.next_start:
+                self.spawn(child)
+            return
+        code = child.process.poll()
+        if code is not None:
+            self.restart_later(child, f"exited with code {code}")
+            return
+        age = self.heartbeat_age(child)
+        running_for = time.monotonic() - child.started_at
+        if age is None and running_for > self.args.startup_grace:
+            self.stop_child(child, timeout=10)
+            self.restart_later(child, f"published no heartbeat within {self.args.startup_grace}s")
+        elif age is not None and age > self.args.health_timeout:
+            self.stop_child(child, timeout=10)
+            self.restart_later(child, f"heartbeat is {age:.0f}s old")
+        elif child.ready and child.restarts and running_for > 60:
+            # Healthy for a while: forget earlier crashes so the next backoff starts small
+            child.restarts = 0
+
+    def shutdown(self, *_):
+        self.stopping = True
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.shutdown)
+        signal.signal(signal.SIGINT, self.shutdown)
+        for child in self.children:
+            self.spawn(child)
+        while not self.stopping:
+            for child in self.children:
+                self.check(child)
+            time.sleep(1.0)
+
+        logger.info("Stopping workers")
+        for child in self.children:
+            if child.process is not None and child.process.poll() is None:
+                child.process.terminate()
+        deadline = time.monotonic() + self.args.stop_timeout
+        for child in self.children:
+            if child.process is not None:
+                self.stop_child(child, timeout=max(deadline - time.monotonic(), 0.1))
+        return 0
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001, help="port shared by the API workers")
+    parser.add_argument("--bot-port", type=int, default=8002, help="port shared by the bot workers (webhook, health)")
+    parser.add_argument("--api-workers", type=int, default=1)
+    parser.add_argument("--bot-workers", type=int, default=1)
+    parser.add_argument("--status-dir", help="heartbeat directory (default: a temporary one)")
+    parser.add_argument("--health-timeout", type=float, default=15.0, help="restart a worker whose heartbeat is older")
+    parser.add_argument("--startup-grace", type=float, default=60.0, help="time a worker gets to publish its first heartbeat")
+    parser.add_argument("--stop-timeout", type=float, default=20.0)
+    parser.add_argument("--proxy-headers", action="store_true", help="trust X-Forwarded-For from the reverse proxy")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    update_mode = os.environ.get('TELEGRAM_UPDATE_MODE', 'polling').lower()
+    if update_mode != "webhook" and args.bot_workers > 1:
+        logger.warning("Polling mode allows a single getUpdates consumer; starting 1 bot worker (use webhook mode to scale)")
+        args.bot_workers = 1
+
+    status_dir = args.status_dir or tempfile.mkdtemp(prefix="bot-workers-")
+    os.makedirs(status_dir, exist_ok=True)
+    api_socket = listen(args.host, args.port)
+    bot_socket = listen(args.host, args.bot_port)
+
+    supervisor = Supervisor(args, status_dir)
+    if supervisor.jwt_secret:
+        logger.warning("JWT_SECRET is not set; the API workers share a generated one, so portal logins end when the supervisor restarts")
+    api_argv = [sys.executable, "-m", "uvicorn", "server:app", "--fd", str(api_socket.fileno())]
+    if args.proxy_headers:
+        api_argv += ["--proxy-headers", "--forwarded-allow-ips", "*"]
+    for index in range(args.api_workers):
+        supervisor.children.append(Child("api", index, api_argv, api_socket.fileno()))
+    for index in range(args.bot_workers):
+        argv = [sys.executable, "worker.py", "--fd", str(bot_socket.fileno())]
+        supervisor.children.append(Child("bot", index, argv, bot_socket.fileno()))
+
+    logger.info(
+        f"Supervising {args.api_workers} API workers on :{args.port} and {args.bot_workers} bot workers "
+        f"({update_mode}) on :{args.bot_port}; heartbeats in {status_dir}"
+    )
+    return supervisor.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
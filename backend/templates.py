@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Compiled message templates for the bot texts.
+
+Every (key, language) pair of the catalog is resolved through the language's
+fallback chain and compiled once. Fields that name another text of the same
+language or a shared value (``{channel}``, ``{admin_url}``, ``{price}``) are
+inlined at compile time; any other field is a runtime parameter, and must be
+one the code passes for that key (RUNTIME_PARAMS).
+
+Run directly to report missing and unused keys and unknown fields:
+
+    python templates.py [--strict]
+"""
+
+import logging
+import re
+import string
+import sys
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_formatter = string.Formatter()
+
+# The parameters the code passes when rendering a key; every other key is rendered without
+# any, so a field that is neither a text nor listed here would raise KeyError in a handler
+RUNTIME_PARAMS: Mapping[str, FrozenSet[str]] = {
+    "registration_schedule": frozenset({"program"}),
+    "registration_confirm": frozenset({"program", "schedule", "phone"}),
+}
+
+
+class Template:
+    """Literal chunks interleaved with runtime parameter names"""
+
+    __slots__ = ("parts", "params", "text")
+
+    def __init__(self, parts: Tuple[Tuple[bool, str], ...]):
+        self.parts = parts
+        self.params = tuple(value for is_param, value in parts if is_param)
+        # Fully static templates render to a precomputed string
+        self.text = None if self.params else "".join(value for _, value in parts)
+
+    def render(self, params: Optional[Mapping[str, object]] = None) -> str:
+        if self.text is not None:
+            return self.text
+        params = params or {}
+        return "".join(str(params[value]) if is_param else value for is_param, value in self.parts)
+
+
+class TemplateSet:
+    """All templates of one catalog version, keyed by (lang_code, key)"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.default_chain = tuple(catalog.fallbacks.get("*", ()))
+        self.missing: Dict[str, List[Tuple[str, str]]] = {}
+        self.unresolved: Dict[str, List[str]] = {}
+        self._templates: Dict[Tuple[str, str], Template] = {}
+        self._raw_cache: Dict[Tuple[str, str], Tuple[Optional[str], Optional[str]]] = {}
+
+        language_keys = set()
+        for strings in catalog.languages.values():
+            language_keys.update(strings)
+        self.keys = frozenset(language_keys | set(catalog.shared))
+        for lang_code in catalog.languages:
+            for key in sorted(self.keys):
+                source = self._raw(lang_code, key)[1]
+                if source is None:
+                    self.unresolved.setdefault(lang_code, []).append(key)
+                elif source != lang_code and key in language_keys:
+                    self.missing.setdefault(lang_code, []).append((key, source))
+                self._templates[(lang_code, key)] = self._compile(lang_code, key, ())
+
+    def chain(self, lang_code: str) -> Tuple[str, ...]:
+        chain = [lang_code] if lang_code in self.catalog.languages else []
+        for code in (*self.catalog.fallbacks.get(lang_code, ()), *self.default_chain):
+            if code not in chain:
+                chain.append(code)
+        return tuple(chain)
+
+    def _raw(self, lang_code: str, key: str) -> Tuple[Optional[str], Optional[str]]:
+        """(text, where it came from) following the fallback chain, then shared"""
+        cached = self._raw_cache.get((lang_code, key))
+        if cached is not None:
+            return cached
+        found = (None, None)
+        for code in self.chain(lang_code):
+            text = self.catalog.languages[code].get(key)
+            if text is not None:
+                found = (text, code)
+                break
+        else:
+            if key in self.catalog.shared:
+                found = (self.catalog.shared[key], "shared")
+        self._raw_cache[(lang_code, key)] = found
+        return found
+
+    def _compile(self, lang_code: str, key: str, resolving: Tuple[str, ...]) -> Template:
+        text = self._raw(lang_code, key)[0]
+        if text is None:
+            return Template(((False, key),))
+
+        try:
+            fields = list(_formatter.parse(text))
+        except ValueError as e:
+            raise ValueError(f"Template {key!r} ({lang_code}) is malformed: {e}")
+        parts: List[Tuple[bool, str]] = []
+        for literal, field, _, _ in fields:
+            if literal:
+                parts.append((False, literal))
+            if field is None:
+                continue
+            if field in resolving or field == key:
+                raise ValueError(f"Template {key!r} ({lang_code}) references itself through {field!r}")
+            if self._raw(lang_code, field)[0] is not None:
+                parts.extend(self._compile(lang_code, field, (*resolving, key)).parts)
+            else:
+                parts.append((True, field))
+
+        merged: List[Tuple[bool, str]] = []
+        for is_param, value in parts:
+            if merged and not is_param and not merged[-1][0]:
+                merged[-1] = (False, merged[-1][1] + value)
+            else:
+                merged.append((is_param, value))
+        return Template(tuple(merged))
+
+    def unknown_params(self, runtime_params: Mapping[str, FrozenSet[str]] = RUNTIME_PARAMS) -> List[Tuple[str, str, Tuple[str, ...]]]:
+        """(lang_code, key, fields) for every template with fields its callers do not pass"""
+        unknown = []
+        for (lang_code, key), template in sorted(self._templates.items()):
+            fields = tuple(param for param in template.params if param not in runtime_params.get(key, ()))
+            if fields:
+                unknown.append((lang_code, key, fields))
+        return unknown
+
+    def get(self, key: str, lang_code: str) -> Template:
+        template = self._templates.get((lang_code, key))
+        if template is None:
+            chain = self.chain(lang_code)
+            template = self._templates.get((chain[0], key)) if chain else None
+            if template is None:
+                logger.warning(f"No text for {key!r} in any language")
+                template = Template(((False, key),))
+        return template
+
+    def render(self, key: str, lang_code: str, **params) -> str:
+        return self.get(key, lang_code).render(params)
+
+    def strings(self, lang_code: str) -> Dict[str, str]:
+        """Every fully static text for a language, e.g. for building keyboards"""
+        return {
+            key: template.text
+            for (code, key), template in self._templates.items()
+            if code == lang_code and template.text is not None
+        }
+
+
+def unused_keys(templates: TemplateSet, sources: Iterable[Path]) -> List[str]:
+    """Catalog keys never mentioned as a string literal in the code or a template"""
+    code = "\n".join(Path(source).read_text(encoding="utf-8") for source in sources)
+    referenced = set(re.findall(r"""["']([A-Za-z0-9_]+)["']""", code))
+    catalog = templates.catalog
+    for text in [*catalog.shared.values(), *(v for s in catalog.languages.values() for v in s.values())]:
+        referenced.update(field for _, field, _, _ in _formatter.parse(text) if field)
+    return sorted(templates.keys - referenced - {"name"})
+
+
+def main(argv: List[str]) -> int:
+    from texts import CatalogError, parse_catalog
+
+    backend = Path(__file__).parent
+    try:
+        # Unchecked, so every problem is listed below instead of only the first
+        templates = TemplateSet(parse_catalog((backend / "locales" / "catalog.json").read_bytes(), check_templates=False))
+    except (CatalogError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    strict = "--strict" in argv
+
+    print(f"🌐 Languages: {', '.join(templates.catalog.languages)}")
+    for lang_code in templates.catalog.languages:
+        print(f"  {lang_code}: fallback chain {' -> '.join(templates.chain(lang_code))} -> shared")
+
+    problems = 0
+    for lang_code, missing in templates.missing.items():
+        print(f"\n⚠️  {lang_code} is missing {len(missing)} keys:")
+        for key, source in missing:
+            print(f"   {key} (falls back to {source})")
+        if strict:
+            problems += len(missing)
+    for lang_code, keys in templates.unresolved.items():
+        print(f"\n❌ {lang_code} has no text at all for: {', '.join(keys)}")
+        problems += len(keys)
+
+    unknown = templates.unknown_params()
+    if unknown:
+        print("\n❌ Fields no caller passes (KeyError at runtime):")
+        for lang_code, key, fields in unknown:
+            print(f"   {key} ({lang_code}): {', '.join(fields)}")
+        problems += len(unknown)
+
+    unused = unused_keys(templates, sorted(backend.glob("*.py")))
+    if unused:
+        print(f"\n🗑️  Unused keys: {', '.join(unused)}")
+        if strict:
+            problems += len(unused)
+
+    print("\n✅ Catalog OK" if not problems else f"\n❌ {problems} problems")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from types import MappingProxyType
+from typing import Callable, List, Mapping, Optional, Sequence
+
+from templates import TemplateSet
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogError(ValueError):
+    pass
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    return value
+
+
+class Catalog:
+    """One immutable version of the bot texts.
+
+    ``fallbacks`` maps a language to the languages consulted when it lacks a
+    key; the ``"*"`` entry applies to every language. ``shared`` is the last
+    resort for all of them.
+    """
+
+    __slots__ = ("version", "digest", "shared", "languages", "fallbacks")
+
+    def __init__(
+        self,
+        version: int,
+        digest: str,
+        shared: Mapping[str, str],
+        languages: Mapping[str, Mapping[str, str]],
+        fallbacks: Optional[Mapping[str, Sequence[str]]] = None,
+    ):
+        self.version = version
+        self.digest = digest
+        self.shared = shared
+        self.languages = languages
+        self.fallbacks = fallbacks or MappingProxyType({})
+
+
+def parse_catalog(raw: bytes, check_templates: bool = True) -> Catalog:
+    """Parse and validate a catalog file.
+
+    With ``check_templates`` every text is also compiled, and fields that
+    are neither another text nor a parameter the code passes are rejected:
+    a catalog that would fail while rendering never goes live.
+    """
+    try:
+        data = json.loads(raw)
+    except ValueError as e:
+        raise CatalogError(f"Catalog is not valid JSON: {e}")
+    languages = data.get("languages")
+    if not isinstance(languages, dict) or not languages:
+        raise CatalogError("Catalog has no languages")
+    for lang_code, strings in languages.items():
+        if not isinstance(strings, dict) or "name" not in strings:
+            raise CatalogError(f"Language {lang_code!r} needs at least a name")
+        bad = [key for key, value in strings.items() if not isinstance(value, str)]
+        if bad:
+            raise CatalogError(f"Language {lang_code!r} has non-string texts: {', '.join(bad)}")
+    fallbacks = data.get("fallbacks", {})
+    for lang_code, chain in fallbacks.items():
+        unknown = [code for code in chain if code not in languages]
+        if unknown:
+            raise CatalogError(f"Fallbacks for {lang_code!r} name unknown languages: {', '.join(unknown)}")
+    catalog = Catalog(
+        version=int(data.get("version", 0)),
+        digest=hashlib.sha256(raw).hexdigest()[:12],
+        shared=_freeze(data.get("shared", {})),
+        languages=_freeze(languages),
+        fallbacks=MappingProxyType({lang_code: tuple(chain) for lang_code, chain in fallbacks.items()}),
+    )
+    if check_templates:
+        try:
+            unknown = TemplateSet(catalog).unknown_params()
+        except ValueError as e:
+            raise CatalogError(f"Catalog does not compile: {e}")
+        if unknown:
+            raise CatalogError("Unknown fields: " + "; ".join(
+                f"{key} ({lang_code}): {', '.join(fields)}" for lang_code, key, fields in unknown
+            ))
+    return catalog
+
+
+def write_catalog(path: Path, data: dict) -> int:
+    """Atomically replace the catalog file with ``data`` and a bumped version"""
+    path = Path(path)
+    data = {**data, "version": int(data.get("version", 0)) + 1}
+    raw = (json.dumps(data, ensure_ascii=False, indent=2) + "\n").encode("utf-8")
+    parse_catalog(raw)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(raw)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    return data["version"]
+
+
+class TextCatalog:
+    """Hot-reloadable bot texts backed by a JSON catalog file.
+
+    Readers use ``current`` (or the ``shared``/``languages`` shortcuts) and
+    always see one complete version: a reload parses, validates and compiles
+    the new file first and then swaps the reference. A broken file is logged and
+    the previous version stays live. Subscribers run after every swap so
+    caches built from the texts can be dropped.
+    """
+
+    def __init__(self, path: Path, poll_interval: float = 5.0):
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+        self._subscribers: List[Callable[[Catalog], None]] = []
+        self._mtime: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self.reloads = 0
+        self.current = self._read()
+
+    def _read(self) -> Catalog:
+        self._mtime = self.path.stat().st_mtime
+        return parse_catalog(self.path.read_bytes())
+
+    @property
+    def shared(self) -> Mapping[str, str]:
+        return self.current.shared
+
+    @property
+    def languages(self) -> Mapping[str, Mapping[str, str]]:
+        return self.current.languages
+
+    def subscribe(self, callback: Callable[[Catalog], None]) -> None:
+        self._subscribers.append(callback)
+
+    def reload(self) -> bool:
+        """Swap in the file's contents if they changed; True if swapped"""
+        catalog = self._read()
+        if catalog.digest == self.current.digest:
+            return False
+        self.current = catalog
+        self.reloads += 1
+        for callback in self._subscribers:
+            callback(catalog)
+        logger.info(f"Loaded text catalog version {catalog.version} ({catalog.digest})")
+        return True
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if self.path.stat().st_mtime != self._mtime:
+                    self.reload()
+            except Exception as e:
+                logger.error(f"Keeping text catalog {self.current.version}, reload failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,104 @@
+import asyncio
+import hmac
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateIngestionQueue:
+    """Bounded buffer between the webhook route and the bot Application.
+
+    The route only validates and enqueues, so Telegram gets its 200 quickly.
+    When the buffer is full the update is refused and Telegram redelivers it
+    later, which is the backpressure signal for the load balancer.
+    """
+
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = maxsize
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._consumer: Optional[asyncio.Task] = None
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.high_watermark = 0
+        self._wait_total = 0.0
+
+    def offer(self, update) -> bool:
+        """Enqueue an update without waiting; False means the queue is full"""
+        try:
+            self._queue.put_nowait((time.monotonic(), update))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        self.high_watermark = max(self.high_watermark, self._queue.qsize())
+        return True
+
+    async def _consume(self, application):
+        # Hand updates to the Application's update processor, but never keep
+        # more in flight than it accepts, so the queue bound stays meaningful
+        processor = application.update_processor
+        in_flight = asyncio.Semaphore(processor.max_concurrent_updates)
+        while True:
+            enqueued_at, update = await self._queue.get()
+            self._wait_total += time.monotonic() - enqueued_at
+            await in_flight.acquire()
+            task = asyncio.create_task(self._process(application, update))
+            task.add_done_callback(lambda _: in_flight.release())
+
+    async def _process(self, application, update):
+        try:
+            await application.update_processor.process_update(update, application.process_update(update))
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Failed to process webhook update {update.update_id}: {e}")
+        finally:
+            self._queue.task_done()
+
+    def start(self, application):
+        """Start draining the queue into the given Application"""
+        if self._consumer is None:
+            self._consumer = asyncio.create_task(self._consume(application))
+
+    async def stop(self, timeout: float = 10.0):
+        """Drain what is already queued, then stop the consumer"""
+        if self._consumer is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self._queue.qsize()} queued webhook updates on shutdown")
+        self._consumer.cancel()
+        try:
+            await self._consumer
+        except asyncio.CancelledError:
+            pass
+        self._consumer = None
+
+    @property
+    def running(self) -> bool:
+        return self._consumer is not None and not self._consumer.done()
+
+    def stats(self) -> dict:
+        handled = self.processed + self.failed
+        return {
+            "depth": self._queue.qsize(),
+            "maxsize": self.maxsize,
+            "high_watermark": self.high_watermark,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self._wait_total / handled * 1000, 3) if handled else 0.0,
+        }
+
+
+def secret_matches(expected: str, received: Optional[str]) -> bool:
+    """Constant-time comparison of the X-Telegram-Bot-Api-Secret-Token header"""
+    if not expected or received is None:
+        return False
+    return hmac.compare_digest(expected.encode(), received.encode())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Standalone Telegram bot worker.
+
+Runs the handlers, models and db layer of server.py without the portal API
+or the frontend, so the bot and the API can be scaled and restarted
+separately. Start the API with BOT_RUNTIME=external so it does not run a bot
+of its own.
+
+In webhook mode several workers can share one listening socket (that is what
+supervisor.py does) and Telegram's webhook URL points at it. In polling mode
+run exactly one worker: Telegram allows a single getUpdates consumer.
+
+    python worker.py [--host 0.0.0.0] [--port 8002]
+"""
+
+import argparse
+import sys
+
+import uvicorn
+from fastapi import APIRouter, FastAPI
+from fastapi.responses import JSONResponse
+
+import server
+from health import Health
+
+health = Health("bot", status_dir=server.WORKER_STATUS_DIR or None)
+health.add_check("mongo", server.mongo_ready)
+health.add_check("bot", server.bot_ready)
+
+app = FastAPI(title="Telegram bot worker")
+router = APIRouter(prefix="/api")
+
+
+@router.get("/health/live")
+async def health_live():
+    return {"status": "ok", "role": health.role}
+
+
+@router.get("/health/ready")
+async def health_ready():
+    status = health.status()
+    status["boot"] = server.boot.stats()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+# The bot-side endpoints of server.py, served by the worker that owns the bot
+router.add_api_route("/telegram/webhook", server.telegram_webhook, methods=["POST"])
+router.add_api_route("/telegram/webhook/stats", server.telegram_webhook_stats)
+router.add_api_route("/telegram/dispatcher/stats", server.telegram_dispatcher_stats)
+router.add_api_route("/telegram/routes/stats", server.telegram_route_stats)
+router.add_api_route("/telegram/render/stats", server.telegram_render_stats)
+router.add_api_route("/telegram/client/stats", server.telegram_client_stats)
+router.add_api_route("/users/write-buffer/stats", server.user_write_buffer_stats)
+router.add_api_route("/analytics/stats", server.analytics_stats)
+router.add_api_route("/registrations/stats", server.registration_stats)
+router.add_api_route("/users/cache/stats", server.user_cache_stats)
+router.add_api_route("/rate-limits/stats", server.rate_limit_stats)
+router.add_api_route("/metrics", server.prometheus_metrics)
+app.include_router(router)
+
+
+@app.on_event("startup")
+async def startup_event():
+    server.start_runtime()
+    server.boot.add("bot", server.start_bot)
+    server.boot.start()
+    health.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await health.stop()
+    await server.boot.stop()
+    await server.stop_bot()
+    await server.stop_runtime()
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(description="Telegram bot worker")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--fd", type=int, help="serve on an inherited listening socket (used by supervisor.py)")
+    args = parser.parse_args(argv)
+    if args.fd is not None:
+        uvicorn.run(app, fd=args.fd, log_level="info")
+    else:
+        uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from pymongo import UpdateOne
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class UserWriteBuffer:
+    """Write-behind buffer for user documents.
+
+    Handlers call ``upsert`` and return immediately. Writes for the same
+    user_id are merged (later fields win) and flushed as one unordered
+    ``bulk_write`` of ``UpdateOne(..., upsert=True)`` ops once ``max_batch``
+    users are pending or every ``flush_interval`` seconds. A failed flush is
+    merged back under any newer writes and retried on the next tick.
+    """
+
+    def __init__(self, collection, max_batch: int = 500, flush_interval: float = 1.0):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, dict] = {}
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.writes = 0
+        self.coalesced = 0
+        self.flushed_ops = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.flush_latency = Histogram()
+
+    def upsert(self, user_id: str, fields: dict) -> None:
+        """Queue ``$set`` fields for a user; never waits on Mongo"""
+        self.writes += 1
+        pending = self._pending.get(user_id)
+        if pending is None:
+            self._pending[user_id] = dict(fields)
+        else:
+            pending.update(fields)
+            self.coalesced += 1
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    def pending(self, user_id: str) -> Optional[dict]:
+        """Fields queued for a user but not yet flushed"""
+        return self._pending.get(user_id)
+
+    async def flush(self) -> int:
+        """Write everything pending in one bulk_write; returns the op count"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            ops = [
+                UpdateOne({"user_id": user_id}, {"$set": fields}, upsert=True)
+                for user_id, fields in batch.items()
+            ]
+            start = time.perf_counter()
+            try:
+                await self.collection.bulk_write(ops, ordered=False)
+            except Exception as e:
+                self.failed_flushes += 1
+                logger.error(f"User write-behind flush of {len(ops)} ops failed: {e}")
+                for user_id, fields in batch.items():
+                    self._pending[user_id] = {**fields, **self._pending.get(user_id, {})}
+                return 0
+            finally:
+                self.flush_latency.observe(time.perf_counter() - start)
+            self.flushes += 1
+            self.flushed_ops += len(ops)
+            return len(ops)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and drain what is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._pending:
+            logger.error(f"Lost {len(self._pending)} pending user writes on shutdown")
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._pending),
+            "max_batch": self.max_batch,
+            "flush_interval": self.flush_interval,
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+            "flushed_ops": self.flushed_ops,
+            "failed_flushes": self.failed_flushes,
+            "flush_latency": self.flush_latency.snapshot(),
+        }
@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+"""
+Local Benchmarks for the Telegram Bot Backend
+Runs offline micro-benchmarks against the backend modules (no Telegram, no Mongo)
+Needs the dev requirements: pip install -r backend/requirements-dev.txt
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+
+def report(name, count, elapsed, extra=""):
+    """Print one benchmark result line"""
+    rate = count / elapsed if elapsed else float("inf")
+    print(f"📊 {name}: {count} in {elapsed:.3f}s -> {rate:,.0f}/s {extra}")
+
+
+async def _run_dispatcher(processor, users, per_user, latency):
+    seen = {}
+
+    async def handler(update):
+        await asyncio.sleep(latency)
+        seen.setdefault(update.effective_user.id, []).append(update.seq)
+
+    updates = [
+        SimpleNamespace(effective_user=SimpleNamespace(id=user_id), effective_chat=None, seq=seq)
+        for seq in range(per_user)
+        for user_id in range(users)
+    ]
+
+    await processor.initialize()
+    start = time.perf_counter()
+    if processor.max_concurrent_updates > 1:
+        # Mirrors Application.__update_fetcher: one task per update
+        await asyncio.gather(*(processor.process_update(u, handler(u)) for u in updates))
+    else:
+        for u in updates:
+            await processor.process_update(u, handler(u))
+    elapsed = time.perf_counter() - start
+    await processor.shutdown()
+
+    ordered = all(seqs == sorted(seqs) for seqs in seen.values())
+    return len(updates), elapsed, ordered
+
+
+def bench_dispatcher(args):
+    """Callbacks per second for a burst of users, sequential vs keyed dispatcher"""
+    from telegram.ext import SimpleUpdateProcessor
+    from dispatcher import KeyedUpdateProcessor
+
+    print(f"\n🚀 Dispatcher burst: {args.users} users x {args.per_user} callbacks, "
+          f"{args.latency * 1000:.1f}ms simulated handler latency")
+
+    if not args.skip_sequential:
+        count, elapsed, ordered = asyncio.run(
+            _run_dispatcher(SimpleUpdateProcessor(1), args.users, args.per_user, args.latency)
+        )
+        report("sequential (default Application)", count, elapsed, f"ordered={ordered}")
+
+    processor = KeyedUpdateProcessor(
+        max_concurrent_updates=args.concurrency,
+        max_pending_updates=args.users * args.per_user
+    )
+    count, elapsed, ordered = asyncio.run(
+        _run_dispatcher(processor, args.users, args.per_user, args.latency)
+    )
+    report(f"keyed (concurrency={args.concurrency})", count, elapsed, f"ordered={ordered}")
+    return ordered
+
+
+def _sample_languages():
+    keys = ["channel", "admin", "register", "education_info", "restart", "mini_app"]
+    return {
+        lang_code: {"name": f"Language {lang_code}", **{k: f"{k} ({lang_code})" for k in keys}}
+        for lang_code in ["en", "am", "ar", "fr", "so", "tg"]
+    }
+
+
+def _measure(fn, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [fn(i) for i in range(1000)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del kept
+    return elapsed, allocated / 1000
+
+
+def bench_keyboards(args):
+    """Per-callback latency and allocation: rebuilding markups vs KeyboardRegistry"""
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+    from keyboards import KeyboardRegistry, build_language_picker, build_main_menu
+
+    languages = _sample_languages()
+    lang_codes = list(languages)
+    web_app_url = "https://example.com"
+
+    def rebuild(i):
+        # What button_callback did before the registry: fresh buttons on every click
+        if i % 2:
+            keyboard = []
+            for lang_code, lang_data in languages.items():
+                keyboard.append([InlineKeyboardButton(lang_data["name"], callback_data=f"lang_{lang_code}")])
+            return InlineKeyboardMarkup(keyboard)
+        return build_main_menu(languages[lang_codes[i % 6]], web_app_url)
+
+    registry = KeyboardRegistry()
+    registry.register("language_picker", lambda _: build_language_picker(languages), per_language=False)
+    registry.register("main_menu", lambda lang_code: build_main_menu(languages[lang_code], web_app_url))
+    registry.warm(lang_codes)
+
+    def cached(i):
+        if i % 2:
+            return registry.get("language_picker")
+        return registry.get("main_menu", lang_codes[i % 6])
+
+    print(f"\n⌨️  Keyboards: {args.iterations} callbacks, alternating language picker / main menu")
+    for name, fn in (("rebuild per callback", rebuild), ("KeyboardRegistry", cached)):
+        elapsed, per_call = _measure(fn, args.iterations)
+        report(name, args.iterations, elapsed,
+               f"({elapsed / args.iterations * 1e6:.2f}us/callback, {per_call:,.0f} B/callback)")
+
+
+def check_persistence(args):
+    """Two simulated workers sharing one users collection stay consistent"""
+    from mongomock_motor import AsyncMongoMockClient
+    from persistence import MongoPersistence
+    from writebehind import UserWriteBuffer
+
+    async def run():
+        users = AsyncMongoMockClient()["bench"]["users"]
+        await users.insert_one({"user_id": "42", "language": "am"})
+        now = [0.0]
+        clock = lambda: now[0]
+        workers = []
+        for _ in range(2):
+            writer = UserWriteBuffer(users)
+            workers.append((MongoPersistence(users, writer, cache_ttl=args.ttl, clock=clock), writer, {}))
+        (a, a_writer, a_data), (b, b_writer, b_data) = workers
+
+        checks = []
+        await a.refresh_user_data(42, a_data)
+        await b.refresh_user_data(42, b_data)
+        checks.append(("legacy language is read back", a_data.get("language") == "am" == b_data.get("language")))
+
+        # Worker A handles a language change and PTB persists it
+        a_data["language"] = "en"
+        await a.update_user_data(42, dict(a_data))
+        await a_writer.flush()
+
+        misses = b.misses
+        await b.refresh_user_data(42, b_data)
+        checks.append(("B serves from cache within TTL", b.misses == misses and b_data["language"] == "am"))
+
+        now[0] += args.ttl + 1
+        await b.refresh_user_data(42, b_data)
+        checks.append(("B sees A's write after TTL", b_data["language"] == "en"))
+
+        # A restarted worker (empty cache) resumes with the persisted language
+        restarted, fresh = MongoPersistence(users, UserWriteBuffer(users), clock=clock), {}
+        await restarted.refresh_user_data(42, fresh)
+        checks.append(("restart keeps language", fresh.get("language") == "en"))
+
+        # Unchanged data does not re-enter the write buffer
+        await b.update_user_data(42, dict(b_data))
+        checks.append(("no-op update is skipped", b_writer.stats()["writes"] == 0))
+        return checks
+
+    print("\n🔁 Persistence consistency across two workers")
+    checks = asyncio.run(run())
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+    return all(ok for _, ok in checks)
+
+
+def check_cache(args):
+    """Two workers sharing a Redis-protocol stand-in see each other's profile changes"""
+    import threading
+    from fakeredis import TcpFakeServer
+    from mongomock_motor import AsyncMongoMockClient
+    from cache import UserProfileCache, create_cache
+    from persistence import MongoPersistence
+    from writebehind import UserWriteBuffer
+
+    url = args.url
+    server = None
+    if url is None:
+        server = TcpFakeServer(("127.0.0.1", 0))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"redis://127.0.0.1:{server.server_address[1]}/0"
+
+    async def run():
+        users = AsyncMongoMockClient()["bench"]["users"]
+        await users.insert_many([{"user_id": str(i), "language": "am"} for i in range(args.users)])
+        workers = []
+        for _ in range(2):
+            writer = UserWriteBuffer(users)
+            profiles = UserProfileCache(create_cache(url), users, writer)
+            await profiles.start()
+            workers.append((MongoPersistence(users, writer, profiles=profiles), profiles, {}))
+        (a, a_profiles, a_data), (b, b_profiles, b_data) = workers
+
+        checks = []
+        await a.refresh_user_data(42, a_data)
+        await b.refresh_user_data(42, b_data)
+        checks.append(("one Mongo read fills the shared cache", a_profiles.misses == 1 and b_profiles.hits == 1))
+
+        # Worker A handles a language change; B must not wait for its TTL
+        a_data["language"] = "en"
+        await a.update_user_data(42, dict(a_data))
+        for _ in range(50):
+            if b.invalidations:
+                break
+            await asyncio.sleep(0.01)
+        await b.refresh_user_data(42, b_data)
+        checks.append(("B drops its copy on A's invalidation", b.invalidations == 1))
+        checks.append(("B reads A's write before Mongo has it", b_data.get("language") == "en"))
+        checks.append(("A ignores its own invalidation", a.invalidations == 0))
+
+        start = time.perf_counter()
+        for i in range(args.users):
+            await a_profiles.get(str(i))
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(args.users):
+            await b_profiles.get(str(i))
+        warm = time.perf_counter() - start
+
+        for _, profiles, _ in workers:
+            await profiles.cache.close()
+        return checks, cold, warm
+
+    print(f"\n🗄️  Shared profile cache on {url}")
+    checks, cold, warm = asyncio.run(run())
+    if server is not None:
+        server.shutdown()
+    report("read-through (Mongo)", args.users, cold)
+    report("read-through (cache hit)", args.users, warm)
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+    return all(ok for _, ok in checks)
+
+
+def bench_auth(args):
+    """Portal logins/s with bcrypt on the event loop vs on the hashing thread pool"""
+    from mongomock_motor import AsyncMongoMockClient
+    from auth import AuthService, PasswordHasher, TokenService
+
+    BENCH_JWT_SECRET = "bench-secret-" + "x" * 32
+
+    class InlineHasher(PasswordHasher):
+        async def _run(self, fn, *args):
+            return fn(*args)
+
+    async def run(hasher):
+        service = AuthService(AsyncMongoMockClient()["bench"]["portal_users"], hasher, TokenService(BENCH_JWT_SECRET))
+        await service.set_password("admin", "admin", "admin123")
+
+        # A ticker stands in for the bot: its worst delay is how long updates would stall
+        lag = [0.0]
+        stop = asyncio.Event()
+
+        async def ticker():
+            while not stop.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lag[0] = max(lag[0], time.perf_counter() - start - 0.005)
+
+        ticking = asyncio.create_task(ticker())
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def login():
+            async with semaphore:
+                return await service.login("admin", "admin123", "admin")
+
+        start = time.perf_counter()
+        tokens = await asyncio.gather(*(login() for _ in range(args.logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await ticking
+        hasher.shutdown()
+        return elapsed, lag[0], all(tokens)
+
+    print(f"\n🔐 Portal logins (bcrypt rounds={args.rounds}, concurrency={args.concurrency})")
+    ok = True
+    for name, hasher in (
+        ("bcrypt on the event loop", InlineHasher(rounds=args.rounds, max_workers=1)),
+        (f"bcrypt on {args.workers} threads", PasswordHasher(rounds=args.rounds, max_workers=args.workers)),
+    ):
+        elapsed, lag, valid = asyncio.run(run(hasher))
+        report(name, args.logins, elapsed, f"(worst event loop stall {lag * 1000:.1f}ms)")
+        ok = ok and valid
+
+    tokens = TokenService(BENCH_JWT_SECRET)
+    token = tokens.issue("admin", "admin")
+    start = time.perf_counter()
+    for _ in range(args.verifications):
+        tokens.verify(token)
+    report("token verification (cached)", args.verifications, time.perf_counter() - start)
+    return ok
+
+
+def bench_metrics(args):
+    """Cost of the metrics hooks per observation and of one /api/metrics scrape"""
+    from metrics import Histogram, Registry
+
+    registry = Registry()
+    family = registry.histogram("bench_seconds", "bench", ("route",))
+    histogram = Histogram()
+    routes = [f"route_{i}" for i in range(args.series)]
+
+    def timed_observe(i):
+        start = time.perf_counter()
+        histogram.observe(time.perf_counter() - start)
+
+    print(f"\n📈 Metrics hooks ({args.iterations} observations, {args.series} labelled series)")
+    for name, fn in (
+        ("Histogram.observe", lambda i: histogram.observe(0.003)),
+        ("labels(...).observe", lambda i: family.labels(routes[i % args.series]).observe(0.003)),
+        ("perf_counter pair + observe", timed_observe),
+    ):
+        start = time.perf_counter()
+        for i in range(args.iterations):
+            fn(i)
+        elapsed = time.perf_counter() - start
+        report(name, args.iterations, elapsed, f"({elapsed / args.iterations * 1e9:.0f}ns/call)")
+
+    start = time.perf_counter()
+    for _ in range(args.scrapes):
+        registry.render()
+    report("render", args.scrapes, time.perf_counter() - start, f"({len(registry.render())} bytes/scrape)")
+
+
+def bench_static(args):
+    """Mini-app cold open (index.html + hashed JS/CSS) and warm reopen: bytes and latency vs plain StaticFiles"""
+    import json
+
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+    from starlette.staticfiles import StaticFiles
+    from starlette.testclient import TestClient
+
+    from static import StaticAssets
+
+    manifest = json.loads((Path(args.build) / "asset-manifest.json").read_text())
+    paths = ["/"] + [f"/{path.lstrip('/')}" for path in manifest["entrypoints"]]
+    headers = {"accept-encoding": "gzip, deflate, br"}
+
+    print(f"\n📦 Static serving of {args.build} ({len(paths)} files per open, {args.iterations} opens)")
+    for name, static in (
+        ("StaticFiles", StaticFiles(directory=args.build, html=True)),
+        ("StaticAssets", StaticAssets(args.build)),
+    ):
+        client = TestClient(Starlette(routes=[Mount("/", static)]))
+        cold = [client.get(path, headers=headers) for path in paths]
+        wire = sum(int(r.headers["content-length"]) for r in cold)
+        # Warm reopen: hashed assets come from the browser cache when they are immutable
+        reopen = [
+            (path, r.headers["etag"]) for path, r in zip(paths, cold)
+            if "immutable" not in r.headers.get("cache-control", "")
+        ]
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            for path, etag in reopen:
+                client.get(path, headers={**headers, "if-none-match": etag})
+        elapsed = time.perf_counter() - start
+        statuses = sorted({client.get(path, headers={**headers, "if-none-match": etag}).status_code for path, etag in reopen})
+        exposed = client.get(f"/{manifest['files']['main.js'].lstrip('/')}.map").status_code
+        print(f"   {name}: cold open {wire / 1024:,.1f} KiB on the wire, .map -> {exposed}")
+        report(f"{name} reopen", args.iterations * len(reopen), elapsed, f"({len(reopen)} requests/open, status {statuses})")
+
+
+# Enough environment for server.py to import; nothing listens on these ports, so Mongo and
+# Telegram are down for the whole run and /api/ must answer regardless
+STARTUP_ENV = {
+    "TELEGRAM_BOT_TOKEN": "123456:bench",
+    "MONGO_URL": "mongodb://127.0.0.1:9/?serverSelectionTimeoutMS=500",
+    "DB_NAME": "bench",
+    "TELEGRAM_API_BASE_URL": "http://127.0.0.1:9",
+    "JWT_SECRET": "bench-secret-" + "x" * 32,
+}
+
+
+def _import_times(backend):
+    """One `python -X importtime -c "import server"`: {module: (self_us, cumulative_us, depth)}"""
+    import os
+    import subprocess
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=backend, env={**os.environ, **STARTUP_ENV}, capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.setdefault(name.strip(), (int(self_us), int(cumulative_us), depth))
+    return times
+
+
+def _time_to_first_answer(backend, timeout=30.0):
+    """Seconds from spawning uvicorn to the first 200 from /api/"""
+    import os
+    import socket
+    import subprocess
+    import urllib.error
+    import urllib.request
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "error"],
+        cwd=backend, env={**os.environ, **STARTUP_ENV}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with code {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.01)
+        raise RuntimeError(f"/api/ did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def bench_startup(args):
+    """Import cost of server.py (-X importtime) and time to the first /api/ answer with Mongo and Telegram down, against budgets"""
+    import statistics
+
+    backend = Path(__file__).parent / "backend"
+    runs = [_import_times(backend) for _ in range(args.runs)]
+    # Median run by total import time: the first one also pays for cold .pyc and disk caches
+    runs.sort(key=lambda times: times["server"][1])
+    times = runs[len(runs) // 2]
+    total_ms = times["server"][1] / 1000
+
+    print(f"\n⏱️  Startup: import server ({args.runs} runs, median), Mongo and Telegram unreachable")
+    print(f"   {'module':<32}{'cumulative ms':>15}{'self ms':>10}")
+    top_level = sorted(
+        ((name, t) for name, t in times.items() if t[2] == 1 or name == "server"), key=lambda item: -item[1][1]
+    )
+    for name, (self_us, cumulative_us, _) in top_level[:args.top]:
+        print(f"   {name:<32}{cumulative_us / 1000:>15.1f}{self_us / 1000:>10.1f}")
+    eager = [name for name in ("motor.motor_asyncio", "redis.asyncio", "fakeredis") if name in times]
+    if eager:
+        print(f"   imported eagerly: {', '.join(eager)}")
+
+    ready = statistics.median(_time_to_first_answer(backend) for _ in range(args.runs))
+    checks = [
+        (f"import server {total_ms:.0f}ms <= {args.budget_ms:.0f}ms", total_ms <= args.budget_ms),
+        (f"first /api/ answer {ready * 1000:.0f}ms <= {args.ready_budget_ms:.0f}ms", ready * 1000 <= args.ready_budget_ms),
+    ]
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+    return all(ok for _, ok in checks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("dispatcher", help=bench_dispatcher.__doc__)
+    p.add_argument("--users", type=int, default=10000)
+    p.add_argument("--per-user", type=int, default=1)
+    p.add_argument("--latency", type=float, default=0.001, help="simulated handler latency (s)")
+    p.add_argument("--concurrency", type=int, default=256)
+    p.add_argument("--skip-sequential", action="store_true")
+    p.set_defaults(func=bench_dispatcher)
+
+    p = sub.add_parser("keyboards", help=bench_keyboards.__doc__)
+    p.add_argument("--iterations", type=int, default=20000)
+    p.set_defaults(func=bench_keyboards)
+
+    p = sub.add_parser("persistence", help=check_persistence.__doc__)
+    p.add_argument("--ttl", type=float, default=30.0)
+    p.set_defaults(func=check_persistence)
+
+    p = sub.add_parser("cache", help=check_cache.__doc__)
+    p.add_argument("--url", help="Redis URL to test against (default: a local fakeredis server)")
+    p.add_argument("--users", type=int, default=1000)
+    p.set_defaults(func=check_cache)
+
+    p = sub.add_parser("auth", help=bench_auth.__doc__)
+    p.add_argument("--logins", type=int, default=64)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--rounds", type=int, default=10)
+    p.add_argument("--verifications", type=int, default=100000)
+    p.set_defaults(func=bench_auth)
+
+    p = sub.add_parser("metrics", help=bench_metrics.__doc__)
+    p.add_argument("--iterations", type=int, default=200000)
+    p.add_argument("--series", type=int, default=20)
+    p.add_argument("--scrapes", type=int, default=100)
+    p.set_defaults(func=bench_metrics)
+
+    p = sub.add_parser("static", help=bench_static.__doc__)
+    p.add_argument("--build", default=str(Path(__file__).parent / "frontend" / "build"))
+    p.add_argument("--iterations", type=int, default=500)
+    p.set_defaults(func=bench_static)
+
+    p = sub.add_parser("startup", help=bench_startup.__doc__)
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--top", type=int, default=12, help="slowest top-level imports to list")
+    p.add_argument("--budget-ms", type=float, default=1200.0, help="budget for `import server`")
+    p.add_argument("--ready-budget-ms", type=float, default=3000.0, help="budget from process start to the first /api/ answer")
+    p.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    ok = args.func(args)
+    return 0 if ok is not False else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
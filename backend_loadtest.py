@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Offline Load Test for the Telegram Bot Backend
+Starts server.py against a stand-in Telegram Bot API and an in-memory Mongo
+(mongomock-motor), replays synthetic user journeys
+(/start -> start_bot -> lang_x -> menu screens, then for some users the
+registration flow through to the admin queue) and reports p50/p95/p99
+latency per step. Exits non-zero when a budget is exceeded:
+
+    python backend_loadtest.py --users 200 --concurrency 50 --max-p95-ms 250
+    python backend_loadtest.py --mode webhook
+
+Needs the dev requirements: pip install -r backend/requirements-dev.txt
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+BOT_TOKEN = "123456:LOADTEST"
+WEBHOOK_SECRET = "loadtest-secret"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Load Test Bot", "username": "loadtest_bot"}
+# Smallest payload the bot will treat as the welcome photo; the stand-in never decodes it
+WELCOME_PHOTO = b"\xff\xd8\xff\xe0" + b"\x00" * 64 + b"\xff\xd9"
+# Bot API methods that answer a user's step (answerCallbackQuery only stops the spinner,
+# unless the screen asked for is already shown and the bot skips the edit)
+RESPONSE_METHODS = {"sendPhoto", "sendMessage", "editMessageCaption", "editMessageReplyMarkup", "editMessageText"}
+MENU_SCREENS = ["education_info", "main_menu", "register", "main_menu", "channel", "main_menu", "admin", "main_menu"]
+REGISTRATION_STEPS = ["reg_program", "reg_schedule", "contact", "reg_confirm"]
+PROGRAMS = ["qaida", "tajweed", "hifz", "nazr"]
+SCHEDULES = ["morning", "afternoon", "evening", "weekend"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)] if ordered else 0.0
+
+
+class FakeBotAPI:
+    """Stand-in Bot API: queues updates for getUpdates and records the bot's replies"""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.webhook_url = None
+        self.polled = asyncio.Event()
+        self._updates = []
+        self._update_id = 0
+        self._new_updates = asyncio.Event()
+        self._message_id = 0
+        self._responses = defaultdict(asyncio.Queue)
+        self._answers = defaultdict(asyncio.Queue)
+        # Latest bot message per chat as the user sees it; callbacks carry it like Telegram does
+        self.messages = {}
+        self.app = Starlette(routes=[
+            Route("/bot{token}/{method}", self.handle, methods=["GET", "POST"]),
+            Route("/photo.jpg", lambda request: Response(WELCOME_PHOTO, media_type="image/jpeg")),
+        ])
+
+    def next_update_id(self) -> int:
+        self._update_id += 1
+        return self._update_id
+
+    def push(self, update: dict) -> None:
+        self._updates.append(update)
+        self._new_updates.set()
+
+    def responses(self, chat_id: int) -> asyncio.Queue:
+        return self._responses[chat_id]
+
+    def answers(self, chat_id: int) -> asyncio.Queue:
+        return self._answers[chat_id]
+
+    async def _params(self, request: Request) -> dict:
+        params = {}
+        if request.method == "POST":
+            form = await request.form()
+            for key, value in form.multi_items():
+                if isinstance(value, str):
+                    try:
+                        value = json.loads(value)
+                    except ValueError:
+                        pass
+                params[key] = value
+        return params
+
+    def _message(self, chat_id, **fields) -> dict:
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            **fields
+        }
+
+    async def _get_updates(self, params: dict) -> list:
+        self.polled.set()
+        offset = int(params.get("offset") or 0)
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout=min(float(params.get("timeout") or 0), 1.0))
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:int(params.get("limit") or 100)]
+
+    async def handle(self, request: Request):
+        method = request.path_params["method"]
+        params = await self._params(request)
+        self.calls[method] += 1
+
+        if method == "getMe":
+            result = BOT_USER
+        elif method == "getUpdates":
+            result = await self._get_updates(params)
+        elif method == "setWebhook":
+            self.webhook_url = params.get("url")
+            result = True
+        elif method in RESPONSE_METHODS:
+            chat_id = int(params["chat_id"])
+            if method == "sendPhoto":
+                result = self._message(chat_id, caption=params.get("caption"), photo=[
+                    {"file_id": "loadtest-photo", "file_unique_id": "loadtest-photo", "width": 1, "height": 1}
+                ])
+            elif method.startswith("edit") and chat_id in self.messages:
+                # Edited in place: same message_id, new content and edit_date
+                result = {**self.messages[chat_id], "edit_date": int(time.time())}
+                for field in ("caption", "text"):
+                    if field in params:
+                        result[field] = params[field]
+            else:
+                result = self._message(chat_id, caption=params.get("caption"), text=params.get("text"))
+            # Like Telegram, only inline keyboards come back on the message
+            if "inline_keyboard" in params.get("reply_markup", {}):
+                result["reply_markup"] = params["reply_markup"]
+            self.messages[chat_id] = result
+            self._responses[chat_id].put_nowait((method, time.perf_counter()))
+        elif method == "answerCallbackQuery":
+            # The load test's callback ids start with the user id (== chat id)
+            chat_id = int(params["callback_query_id"].split("-", 1)[0])
+            self._answers[chat_id].put_nowait((method, time.perf_counter()))
+            result = True
+        else:
+            # answerCallbackQuery, deleteWebhook, setMyCommands, ...
+            result = True
+        return JSONResponse({"ok": True, "result": result})
+
+
+class LoadTest:
+    def __init__(self, args, api: FakeBotAPI, backend_url: str):
+        self.args = args
+        self.api = api
+        self.backend_url = backend_url
+        self.latencies = defaultdict(list)
+        self.timeouts = Counter()
+        self.registered = 0
+        self.http = httpx.AsyncClient(timeout=30)
+
+    async def deliver(self, update: dict) -> None:
+        update["update_id"] = self.api.next_update_id()
+        if self.args.mode == "webhook":
+            response = await self.http.post(
+                f"{self.backend_url}/api/telegram/webhook",
+                json=update,
+                headers={"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET}
+            )
+            response.raise_for_status()
+        else:
+            self.api.push(update)
+
+    async def step(self, name: str, chat_id: int, update: dict, edits: bool = True) -> bool:
+        """Deliver one update and wait for the reply, or only the callback answer when ``edits`` is False"""
+        answers = self.api.answers(chat_id)
+        while not answers.empty():
+            answers.get_nowait()
+        responses = self.api.responses(chat_id) if edits else answers
+        start = time.perf_counter()
+        await self.deliver(update)
+        try:
+            _, answered_at = await asyncio.wait_for(responses.get(), timeout=self.args.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts[name] += 1
+            return False
+        self.latencies[name].append(answered_at - start)
+        if self.args.think:
+            await asyncio.sleep(random.uniform(0, 2 * self.args.think))
+        return True
+
+    async def journey(self, user_id: int, rng: random.Random) -> None:
+        user = {"id": user_id, "is_bot": False, "first_name": f"User {user_id}", "username": f"user{user_id}"}
+        chat = {"id": user_id, "type": "private"}
+        message = {"message_id": 1, "date": int(time.time()), "chat": chat, "from": user, "text": "/start",
+                   "entities": [{"type": "bot_command", "offset": 0, "length": 6}]}
+        if not await self.step("/start", user_id, {"message": message}):
+            return
+
+        def callback(data):
+            return {"callback_query": {
+                "id": f"{user_id}-{data}-{rng.random()}",
+                "from": user,
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": dict(self.api.messages[user_id]),
+            }}
+
+        steps = [("start_bot", "start_bot"), ("lang_x", f"lang_{rng.choice(self.args.languages)}")]
+        steps += [(screen, screen) for screen in rng.sample(MENU_SCREENS, k=min(self.args.screens, len(MENU_SCREENS)))]
+        shown = "welcome"
+        for name, data in steps:
+            screen = "main_menu" if data.startswith("lang_") else data
+            # Opening the screen already shown is answered without an edit
+            if not await self.step(name, user_id, callback(data), edits=screen != shown):
+                return
+            shown = screen
+
+        if rng.random() < self.args.registrations:
+            await self.register(user_id, user, chat, callback, edits=shown != "register", rng=rng)
+
+    async def register(self, user_id: int, user: dict, chat: dict, callback, edits: bool, rng: random.Random) -> None:
+        """Register button -> program -> schedule -> shared contact -> confirm"""
+        if not await self.step("register", user_id, callback("register"), edits=edits):
+            return
+        if not await self.step("reg_program", user_id, callback(f"reg_program_{rng.choice(PROGRAMS)}")):
+            return
+        if not await self.step("reg_schedule", user_id, callback(f"reg_schedule_{rng.choice(SCHEDULES)}")):
+            return
+        contact = {"message_id": 2, "date": int(time.time()), "chat": chat, "from": user,
+                   "contact": {"phone_number": f"+2519{user_id % 10 ** 8:08d}", "first_name": user["first_name"], "user_id": user_id}}
+        if not await self.step("contact", user_id, {"message": contact}):
+            return
+        if await self.step("reg_confirm", user_id, callback("reg_confirm")):
+            self.registered += 1
+
+    async def queued_registrations(self) -> int:
+        """Pending registrations the admin API lists, all pages"""
+        login = await self.http.post(f"{self.backend_url}/api/login/admin", json={"username": "loadtest", "password": "loadtest"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        count, cursor = 0, None
+        while True:
+            params = {"limit": 500, **({"cursor": cursor} if cursor else {})}
+            response = await self.http.get(f"{self.backend_url}/api/registrations", params=params, headers=headers)
+            response.raise_for_status()
+            page = response.json()
+            count += len(page["registrations"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return count
+
+    async def run(self) -> float:
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        rng = random.Random(self.args.seed)
+
+        async def limited(user_id):
+            async with semaphore:
+                await self.journey(user_id, random.Random(rng.random()))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(limited(1_000_000 + i) for i in range(self.args.users)))
+        return time.perf_counter() - start
+
+
+def backend_env(args, api_url: str, backend_port: int, workdir: Path) -> dict:
+    return {
+        **os.environ,
+        "MONGO_URL": "mongodb://loadtest",
+        "DB_NAME": "loadtest",
+        "TELEGRAM_BOT_TOKEN": BOT_TOKEN,
+        "TELEGRAM_API_BASE_URL": api_url,
+        "TELEGRAM_UPDATE_MODE": args.mode,
+        "TELEGRAM_WEBHOOK_URL": f"http://127.0.0.1:{backend_port}/api/telegram/webhook",
+        "TELEGRAM_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "WELCOME_PHOTO_URL": f"{api_url}/photo.jpg",
+        "WELCOME_PHOTO_PATH": str(workdir / "welcome.jpg"),
+        "MONGO_QUERY_PLAN_CHECK": "off",
+        "RATE_LIMIT_ENABLED": "true" if args.rate_limits else "false",
+        "PORTAL_BOOTSTRAP_USERS": "admin:loadtest:loadtest",
+        "JWT_SECRET": "loadtest-" + "x" * 32,
+    }
+
+
+def patch_mongomock() -> None:
+    """Make find_one_and_update with an ``_id``-excluding projection behave like MongoDB.
+
+    mongomock only narrows its re-read of the updated document to the _id
+    when the projection keeps it; otherwise it re-runs the original filter,
+    which a document the update moved out of (a submitted registration)
+    no longer matches, and returns None.
+    """
+    from mongomock.collection import Collection
+
+    find_and_modify = Collection._find_and_modify
+
+    def _find_and_modify(self, query, projection=None, *args, **kwargs):
+        if not projection or projection.get("_id", 1):
+            return find_and_modify(self, query, projection, *args, **kwargs)
+        kept = {key: value for key, value in projection.items() if key != "_id"}
+        result = find_and_modify(self, query, kept or None, *args, **kwargs)
+        if result is not None:
+            result.pop("_id", None)
+        return result
+
+    Collection._find_and_modify = _find_and_modify
+
+
+def serve_backend(port: int) -> None:
+    """Run server.py with Motor swapped for mongomock-motor (child process of the load test)"""
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient
+
+    patch_mongomock()
+    motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(BACKEND_DIR)
+    uvicorn.run("server:app", host="127.0.0.1", port=port, log_level="warning")
+
+
+async def wait_until_ready(api: FakeBotAPI, backend_url: str, mode: str, process, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as http:
+        while time.monotonic() < deadline:
+            if process.returncode is not None:
+                raise RuntimeError(f"Backend exited with code {process.returncode}")
+            try:
+                up = (await http.get(f"{backend_url}/api/")).status_code == 200
+            except httpx.TransportError:
+                up = False
+            bot_ready = api.polled.is_set() if mode == "polling" else api.webhook_url is not None
+            if up and bot_ready:
+                return
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Backend did not become ready in time")
+
+
+def report(args, test: LoadTest, elapsed: float, api: FakeBotAPI, dispatcher: dict, queued: int) -> bool:
+    print(f"\n🧪 {args.users} journeys, concurrency {args.concurrency}, {args.mode} mode")
+    print(f"{'step':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'timeouts':>10}")
+    all_latencies = []
+    for name in ["/start", "start_bot", "lang_x", *dict.fromkeys(MENU_SCREENS), *REGISTRATION_STEPS]:
+        values = test.latencies.get(name, [])
+        if not values and not test.timeouts[name]:
+            continue
+        all_latencies.extend(values)
+        print(f"{name:<16}{len(values):>8}"
+              f"{percentile(values, 0.5) * 1000:>10.1f}{percentile(values, 0.95) * 1000:>10.1f}"
+              f"{percentile(values, 0.99) * 1000:>10.1f}{max(values, default=0) * 1000:>10.1f}{test.timeouts[name]:>10}")
+
+    p95 = percentile(all_latencies, 0.95) * 1000
+    timeouts = sum(test.timeouts.values())
+    print(f"{'all steps':<16}{len(all_latencies):>8}"
+          f"{percentile(all_latencies, 0.5) * 1000:>10.1f}{p95:>10.1f}"
+          f"{percentile(all_latencies, 0.99) * 1000:>10.1f}{max(all_latencies, default=0) * 1000:>10.1f}{timeouts:>10}")
+    print(f"📊 {len(all_latencies) / elapsed:,.0f} steps/s, {args.users / elapsed:,.1f} journeys/s over {elapsed:.2f}s")
+    print(f"📨 Bot API calls: {dict(api.calls.most_common())}")
+    print(f"⚙️  Dispatcher: {dispatcher}")
+    print(f"📝 Registrations: {test.registered} confirmed, {queued} in the admin queue")
+
+    ok = True
+    if args.max_p95_ms is not None and p95 > args.max_p95_ms:
+        print(f"❌ p95 {p95:.1f}ms exceeds the {args.max_p95_ms}ms budget")
+        ok = False
+    if timeouts > args.max_timeouts:
+        print(f"❌ {timeouts} steps timed out (allowed: {args.max_timeouts})")
+        ok = False
+    if queued != test.registered:
+        print(f"❌ {test.registered} registrations were confirmed but {queued} reached the admin queue")
+        ok = False
+    if ok:
+        print("✅ Within budget")
+    return ok
+
+
+async def main_async(args) -> bool:
+    api = FakeBotAPI()
+    api_port, backend_port = free_port(), free_port()
+    api_url = f"http://127.0.0.1:{api_port}"
+    backend_url = f"http://127.0.0.1:{backend_port}"
+    api_server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=api_port, log_level="warning"))
+    api_task = asyncio.create_task(api_server.serve())
+
+    with tempfile.TemporaryDirectory() as workdir, open(args.backend_log, "wb") as log:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, __file__, "--serve-backend", str(backend_port),
+            env=backend_env(args, api_url, backend_port, Path(workdir)),
+            stdout=log,
+            stderr=log
+        )
+        test = None
+        try:
+            await wait_until_ready(api, backend_url, args.mode, process)
+            test = LoadTest(args, api, backend_url)
+            elapsed = await test.run()
+            dispatcher = (await test.http.get(f"{backend_url}/api/telegram/dispatcher/stats")).json()
+            return report(args, test, elapsed, api, dispatcher, await test.queued_registrations())
+        except Exception:
+            print(f"❌ Load test failed, backend log: {args.backend_log}")
+            raise
+        finally:
+            if test is not None:
+                await test.http.aclose()
+            # Keep serving the stand-in API while the bot shuts down cleanly
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                process.kill()
+            api_server.should_exit = True
+            await api_task
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--serve-backend":
+        serve_backend(int(sys.argv[2]))
+        return 0
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="synthetic users, one journey each")
+    parser.add_argument("--concurrency", type=int, default=20, help="journeys in flight at once")
+    parser.add_argument("--screens", type=int, default=4, help="menu screens visited after choosing a language")
+    parser.add_argument("--registrations", type=float, default=0.3, help="share of users who then complete the registration flow")
+    parser.add_argument("--languages", nargs="+", default=["am", "en", "ar", "fr", "so", "tg"])
+    parser.add_argument("--mode", choices=["polling", "webhook"], default="polling")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause between a user's steps (s)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for the bot to answer a step")
+    parser.add_argument("--rate-limits", action="store_true", help="keep per-user rate limits on")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-p95-ms", type=float, help="fail if the p95 over all steps exceeds this")
+    parser.add_argument("--backend-log", default="backend_loadtest.log", help="where server.py's output goes")
+    parser.add_argument("--max-timeouts", type=int, default=0, help="fail if more steps than this time out")
+    args = parser.parse_args()
+    return 0 if asyncio.run(main_async(args)) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -138,7 +138,8 @@ class TelegramBotAPITester:
             
             if success:
                 data = response.json()
-                details = f"- Status: {response.status_code}, Users count: {len(data) if isinstance(data, list) else 'N/A'}"
+                success = isinstance(data.get('users'), list) and 'next_cursor' in data
+                details = f"- Status: {response.status_code}, Users on first page: {len(data.get('users', []))}"
             else:
                 details = f"- Status: {response.status_code}, Response: {response.text[:100]}"
                 
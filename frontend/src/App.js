@@ -64,6 +64,8 @@ const App = () => {
       const result = await response.json();
       
       if (result.success) {
+        // Later API calls send this as "Authorization: Bearer <token>" instead of re-posting credentials
+        sessionStorage.setItem('accessToken', result.access_token);
         setLoginStatus('success');
         setTimeout(() => {
           setCurrentView('dashboard');
@@ -80,6 +82,7 @@ const App = () => {
   };
 
   const handleBackToMain = () => {
+    sessionStorage.removeItem('accessToken');
     setCurrentView('main');
     setSelectedPortal('');
     setLoginData({ username: '', password: '' });
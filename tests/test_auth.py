@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+from auth import AuthService, PasswordHasher  # noqa: E402
+
+
+def service():
+    return AuthService(AsyncMongoMockClient()["test"]["portal_users"], PasswordHasher(rounds=4), None)
+
+
+def test_no_accounts_are_seeded_by_default():
+    async def run():
+        auth = service()
+        assert await auth.bootstrap(()) == 0
+        assert await auth.collection.count_documents({}) == 0
+
+    asyncio.run(run())
+
+
+def test_bootstrap_users_are_seeded_hashed_into_an_empty_collection():
+    async def run():
+        auth = service()
+        assert await auth.bootstrap((("admin", "root", "s3cret"),)) == 1
+        user = await auth.collection.find_one({"username": "root"})
+        assert user["role"] == "admin" and user["password_hash"] != "s3cret"
+        assert await auth.bootstrap((("teacher", "t", "pw"),)) == 0
+
+    asyncio.run(run())
@@ -0,0 +1,131 @@
+import asyncio
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+from telegram.error import NetworkError
+
+pytest.importorskip("mongomock_motor")
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:test")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost")
+os.environ.setdefault("DB_NAME", "test")
+
+import motor.motor_asyncio  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+# server.py creates its Motor client on the first query, so this swap applies to it
+motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+import server  # noqa: E402
+import broadcast  # noqa: E402
+from broadcast import Broadcaster  # noqa: E402
+
+
+def telegram_user(user_id: int):
+    return SimpleNamespace(id=user_id, username="reader", full_name="Quran Reader")
+
+
+async def pick_language(user_id: int, lang_code: str, user_data: dict) -> None:
+    query = SimpleNamespace(from_user=telegram_user(user_id), message=None, edit_message_caption=AsyncMock())
+    await server.select_language(query, SimpleNamespace(user_data=user_data), "am", lang_code)
+
+
+async def press_start(user_id: int, user_data: dict) -> None:
+    message = SimpleNamespace(reply_photo=AsyncMock(return_value=SimpleNamespace(photo=[])))
+    update = SimpleNamespace(effective_user=telegram_user(user_id), message=message)
+    await server.start_command(update, SimpleNamespace(user_data=user_data))
+
+
+def test_broadcast_after_start_keeps_the_chosen_language():
+    async def scenario():
+        user_data = {}
+        await pick_language(7001, "en", user_data)
+        await server.user_writes.flush()
+        await press_start(7001, user_data)
+        await server.user_writes.flush()
+
+        stored = await server.db.users.find_one({"user_id": "7001"})
+        assert stored["language"] == "en"
+        assert stored["full_name"] == "Quran Reader"
+
+        bot = SimpleNamespace(send_message=AsyncMock())
+        broadcaster = Broadcaster(bot, server.db, rate=1000)
+        broadcast_id = await broadcaster.create({"am": "ሰላም", "en": "Hello"}, "am")
+        await broadcaster.run(broadcast_id)
+        sent = {call.kwargs["chat_id"]: call.kwargs["text"] for call in bot.send_message.await_args_list}
+        assert sent["7001"] == "Hello"
+
+    asyncio.run(scenario())
+
+
+def network_error(cause: Exception) -> NetworkError:
+    error = NetworkError(str(cause))
+    error.__cause__ = cause
+    return error
+
+
+async def broadcast_to(users: int, bot, concurrency: int = 1):
+    db = AsyncMongoMockClient()["broadcast_test"]
+    await db.users.insert_many([{"user_id": str(1000 + i), "language": "en"} for i in range(users)])
+    broadcaster = Broadcaster(bot, db, rate=1000, concurrency=concurrency)
+    broadcast_id = await broadcaster.create({"en": "Hello"}, "en")
+    return db, broadcaster, broadcast_id
+
+
+def test_a_send_that_may_have_been_delivered_is_not_retried():
+    async def scenario():
+        bot = SimpleNamespace(send_message=AsyncMock(side_effect=network_error(httpx.ReadTimeout("read"))))
+        db, broadcaster, broadcast_id = await broadcast_to(1, bot)
+        await broadcaster.run(broadcast_id)
+        assert bot.send_message.await_count == 1
+        assert (await db.broadcasts.find_one({"_id": broadcast_id}))["failed"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_a_send_that_never_left_is_retried():
+    async def scenario():
+        bot = SimpleNamespace(send_message=AsyncMock(side_effect=[network_error(httpx.ConnectError("refused")), None]))
+        db, broadcaster, broadcast_id = await broadcast_to(1, bot)
+        await broadcaster.run(broadcast_id)
+        assert bot.send_message.await_count == 2
+        assert (await db.broadcasts.find_one({"_id": broadcast_id}))["sent"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_a_worker_that_lost_the_lease_stops_at_its_next_checkpoint():
+    async def scenario():
+        async def send_message(chat_id, text):
+            # Another worker claims the broadcast while this batch is in flight
+            await db.broadcasts.update_one({"_id": broadcast_id}, {"$set": {"worker": "other"}})
+
+        db, broadcaster, broadcast_id = await broadcast_to(3, SimpleNamespace(send_message=AsyncMock(side_effect=send_message)))
+        await broadcaster.run(broadcast_id)
+        doc = await db.broadcasts.find_one({"_id": broadcast_id})
+        assert broadcaster.bot.send_message.await_count == 1
+        assert doc["worker"] == "other"
+        assert doc["status"] == "running"
+        assert doc["sent"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_the_lease_is_renewed_and_checked_during_long_pauses(monkeypatch):
+    monkeypatch.setattr(broadcast, "LEASE_SECONDS", 0.3)
+
+    async def scenario():
+        async def send_message(chat_id, text):
+            await db.broadcasts.update_one({"_id": broadcast_id}, {"$set": {"worker": "other"}})
+            # A pause far longer than the lease, as after a long RetryAfter
+            await asyncio.sleep(60)
+
+        db, broadcaster, broadcast_id = await broadcast_to(2, SimpleNamespace(send_message=AsyncMock(side_effect=send_message)))
+        await asyncio.wait_for(broadcaster.run(broadcast_id), timeout=5)
+        assert broadcaster.bot.send_message.await_count == 1
+        assert (await db.broadcasts.find_one({"_id": broadcast_id}))["worker"] == "other"
+
+    asyncio.run(scenario())
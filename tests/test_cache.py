@@ -0,0 +1,92 @@
+import asyncio
+
+from cache import MemoryCache, UserProfileCache
+
+
+class Users:
+    """db.users stand-in that counts the reads"""
+
+    def __init__(self, *docs):
+        self.docs = {doc["user_id"]: doc for doc in docs}
+        self.reads = 0
+
+    async def find_one(self, query, projection=None):
+        self.reads += 1
+        return self.docs.get(query["user_id"])
+
+
+class Writer:
+    """UserWriteBuffer stand-in whose flush writes into Users"""
+
+    def __init__(self, users):
+        self.users = users
+        self._pending = {}
+
+    def upsert(self, user_id, fields):
+        self._pending.setdefault(user_id, {}).update(fields)
+
+    def pending(self, user_id):
+        return self._pending.get(user_id)
+
+    async def flush(self):
+        for user_id, fields in self._pending.items():
+            self.users.docs.setdefault(user_id, {"user_id": user_id}).update(fields)
+        self._pending = {}
+
+
+def profiles(users, cache=None):
+    return UserProfileCache(cache or MemoryCache(), users, Writer(users))
+
+
+def test_update_of_an_uncached_user_never_reads_mongo():
+    async def run():
+        users = Users({"user_id": "1", "language": "en", "username": "ali"})
+        cache = profiles(users)
+        await cache.update("1", {"language": "am"})
+        assert users.reads == 0
+        # The next read fills from Mongo plus the buffered write
+        assert await cache.get("1") == {"user_id": "1", "language": "am", "username": "ali"}
+        assert users.reads == 1
+
+    asyncio.run(run())
+
+
+def test_update_merges_into_the_cached_profile():
+    async def run():
+        users = Users({"user_id": "1", "language": "en", "username": "ali"})
+        cache = profiles(users)
+        await cache.get("1")
+        await cache.update("1", {"language": "am"})
+        assert await cache.get("1") == {"user_id": "1", "language": "am", "username": "ali"}
+        assert users.reads == 1
+
+    asyncio.run(run())
+
+
+def test_a_write_on_a_miss_is_seen_by_the_other_worker_before_and_after_the_flush():
+    async def run():
+        users = Users({"user_id": "1", "language": "am", "username": "ali"})
+        shared = MemoryCache()
+        a, b = profiles(users, shared), profiles(users, shared)
+        await a.update("1", {"language": "en"})
+        assert users.reads == 0
+        assert (await b.get("1"))["language"] == "en"
+        await a.writer.flush()
+        for worker in (a, b):
+            assert await worker.get("1") == {"user_id": "1", "language": "en", "username": "ali"}
+        # The first read after the write replaced the partial entry with the full profile
+        assert users.reads == 1
+
+    asyncio.run(run())
+
+
+def test_writes_on_both_workers_before_a_read_are_all_kept():
+    async def run():
+        users = Users({"user_id": "1", "language": "am", "username": "ali"})
+        shared = MemoryCache()
+        a, b = profiles(users, shared), profiles(users, shared)
+        await a.update("1", {"language": "en"})
+        await b.update("1", {"username": "ali2"})
+        assert await a.get("1") == {"user_id": "1", "language": "en", "username": "ali2"}
+
+    asyncio.run(run())
@@ -0,0 +1,65 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import MessageHandler, filters
+
+from persistence import DurableConversationHandler
+
+ASKED, ANSWERED = 1, 2
+
+
+class Persistence:
+    """The conversation part of MongoPersistence, in memory"""
+
+    def __init__(self, stored=None):
+        self.stored = dict(stored or {})
+        self.writes = []
+
+    async def get_conversations(self, name):
+        return {}
+
+    async def refresh_conversation(self, name, key):
+        return (True, self.stored[key]) if key in self.stored else (False, None)
+
+    async def update_conversation(self, name, key, state):
+        self.writes.append((key, state))
+
+
+async def answer(update, context):
+    return ANSWERED
+
+
+def conversation(persistence):
+    handler = DurableConversationHandler(
+        entry_points=[],
+        states={ASKED: [MessageHandler(filters.TEXT, answer)], ANSWERED: []},
+        fallbacks=[],
+        name="registration",
+        persistent=True,
+    )
+    application = SimpleNamespace(persistence=persistence, bot=None)
+    return handler, application, SimpleNamespace(application=application)
+
+
+def text_update(text="hi"):
+    return Update(1, message=Message(1, datetime.now(), Chat(5, "private"), from_user=User(7, "Ali", False), text=text))
+
+
+def test_a_state_written_by_another_worker_continues_the_conversation_here():
+    # Also guards the ConversationHandler internals the handler relies on against PTB upgrades
+    async def run():
+        persistence = Persistence({(5, 7): ASKED})
+        handler, application, context = conversation(persistence)
+        await handler._initialize_persistence(application)
+        update = text_update()
+        assert not handler.check_update(update)
+
+        await handler.refresh(update, context)
+        check_result = handler.check_update(update)
+        assert check_result
+        await handler.handle_update(update, application, check_result, context)
+        assert persistence.writes == [((5, 7), ANSWERED)]
+
+    asyncio.run(run())
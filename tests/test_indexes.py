@@ -0,0 +1,43 @@
+from pymongo import ASCENDING, IndexModel
+
+from indexes import index_changes, ttl_indexes
+
+
+def info(index: IndexModel, **changes) -> dict:
+    """index_information() entry of ``index`` as the server reports it"""
+    spec = {key: value for key, value in index.document.items() if key != "name"}
+    spec["key"] = [(field, float(direction)) for field, direction in spec["key"].items()]
+    spec.update(changes)
+    return spec
+
+
+def test_unchanged_indexes_need_nothing():
+    indexes = ttl_indexes(60, 120)["status_rollups"]
+    existing = {index.document["name"]: info(index) for index in indexes}
+    assert index_changes(existing, indexes) == ([], {})
+
+
+def test_missing_indexes_are_left_to_create_indexes():
+    assert index_changes({}, ttl_indexes(60, 120)["status_checks"]) == ([], {})
+
+
+def test_a_changed_ttl_is_applied_in_place():
+    old = ttl_indexes(60, 120)["status_checks"][0]
+    new = ttl_indexes(3600, 120)["status_checks"]
+    assert index_changes({"timestamp_ttl": info(old)}, new) == ([], {"timestamp_ttl": 3600})
+
+
+def test_other_changes_drop_the_index():
+    index = IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True)
+    existing = {"user_id_unique": info(index, unique=False)}
+    assert index_changes(existing, [index]) == (["user_id_unique"], {})
+
+    existing = {"user_id_unique": info(index, key=[("user_id", -1.0)])}
+    assert index_changes(existing, [index]) == (["user_id_unique"], {})
+
+
+def test_adding_a_ttl_to_a_plain_index_drops_it():
+    new = ttl_indexes(60, 120)["status_checks"][0]
+    plain = info(new)
+    del plain["expireAfterSeconds"]
+    assert index_changes({"timestamp_ttl": plain}, [new]) == (["timestamp_ttl"], {})
@@ -0,0 +1,35 @@
+import asyncio
+
+from media import PhotoSource
+
+
+def test_the_bundled_fallback_is_sent_until_a_local_copy_exists(tmp_path):
+    async def run():
+        fallback = tmp_path / "fallback.png"
+        fallback.write_bytes(b"bundled")
+        source = PhotoSource(tmp_path / "assets" / "welcome.jpg", "https://cdn.example/welcome.jpg", fallback)
+        assert source.payload() == "https://cdn.example/welcome.jpg"
+
+        await source.load()
+        assert source.payload() == b"bundled"
+        bundled = source.fingerprint()
+        assert bundled.startswith("sha256:")
+
+        source.path.parent.mkdir()
+        source.path.write_bytes(b"downloaded")
+        # Nothing is read outside load()
+        assert source.payload() == b"bundled"
+        await source.load()
+        assert source.payload() == b"downloaded"
+        assert source.fingerprint() != bundled
+
+    asyncio.run(run())
+
+
+def test_without_any_file_the_url_is_the_fingerprint(tmp_path):
+    async def run():
+        source = PhotoSource(tmp_path / "welcome.jpg", "https://cdn.example/welcome.jpg", tmp_path / "missing.png")
+        await source.load()
+        assert source.fingerprint() == "url:https://cdn.example/welcome.jpg"
+
+    asyncio.run(run())
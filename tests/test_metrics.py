@@ -0,0 +1,22 @@
+import json
+
+from metrics import Histogram
+
+
+def test_quantiles_use_the_bucket_upper_bounds():
+    histogram = Histogram((0.1, 1.0, 5.0))
+    for value in (0.05, 0.05, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(0.99) == 5.0
+
+
+def test_observations_past_the_last_bucket_stay_json_serializable():
+    histogram = Histogram((0.1, 1.0, 5.0))
+    histogram.observe(7.0)
+    snapshot = histogram.snapshot()
+    assert snapshot["p50"] == snapshot["p99"] == 5.0
+    assert snapshot["buckets"] == {"0.1": 0, "1.0": 0, "5.0": 0, "+Inf": 1}
+    # What Starlette's JSONResponse does
+    json.dumps(snapshot, allow_nan=False)
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter, merge_filters
+
+
+def test_keyset_filter_single_key():
+    assert keyset_filter(("user_id",), ["42"]) == {"user_id": {"$gt": "42"}}
+
+
+def test_keyset_filter_compound_keys():
+    assert keyset_filter(("timestamp", "user_id"), [1, "42"]) == {
+        "$or": [
+            {"timestamp": {"$gt": 1}},
+            {"timestamp": 1, "user_id": {"$gt": "42"}},
+        ]
+    }
+
+
+def test_keyset_filter_three_keys():
+    clauses = keyset_filter(("a", "b", "c"), [1, 2, 3])["$or"]
+    assert clauses[-1] == {"a": 1, "b": 2, "c": {"$gt": 3}}
+
+
+def test_cursor_round_trip_restores_dates():
+    when = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    token = encode_cursor("newest", {"timestamp": when, "user_id": "7"}, ("timestamp", "user_id"))
+    assert decode_cursor(token, "newest", ("timestamp", "user_id"), date_keys=("timestamp",)) == [when, "7"]
+
+
+def test_cursor_of_another_sort_is_rejected():
+    token = encode_cursor("newest", {"user_id": "7"}, ("user_id",))
+    with pytest.raises(InvalidCursor, match="sort order"):
+        decode_cursor(token, "user_id", ("user_id",))
+
+
+def test_cursor_with_wrong_number_of_keys_is_rejected():
+    token = encode_cursor("newest", {"user_id": "7"}, ("user_id",))
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, "newest", ("timestamp", "user_id"))
+
+
+@pytest.mark.parametrize("token", ["", "not base64!", "e30", "eyJzIjoibmV3ZXN0In0"])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, "newest", ("user_id",))
+
+
+def test_merge_filters_skips_empty_ones():
+    assert merge_filters(None, {}) == {}
+    assert merge_filters({"a": 1}, None) == {"a": 1}
+    assert merge_filters({"a": 1}, {"b": 2}) == {"$and": [{"a": 1}, {"b": 2}]}
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+from persistence import MongoPersistence  # noqa: E402
+from writebehind import UserWriteBuffer  # noqa: E402
+
+TTL = 30.0
+
+
+class Workers:
+    """Two workers over one users collection, on a clock the test moves"""
+
+    def __init__(self):
+        self.users = AsyncMongoMockClient()["test"]["users"]
+        self.now = 0.0
+        self.a, self.a_writer = self.worker()
+        self.b, self.b_writer = self.worker()
+
+    def worker(self):
+        writer = UserWriteBuffer(self.users)
+        return MongoPersistence(self.users, writer, cache_ttl=TTL, clock=lambda: self.now), writer
+
+
+def test_a_write_on_one_worker_reaches_the_other_after_the_ttl():
+    async def run():
+        workers = Workers()
+        await workers.users.insert_one({"user_id": "42", "language": "am"})
+        a_data, b_data = {}, {}
+        await workers.a.refresh_user_data(42, a_data)
+        await workers.b.refresh_user_data(42, b_data)
+        assert a_data["language"] == b_data["language"] == "am"
+
+        a_data["language"] = "en"
+        await workers.a.update_user_data(42, dict(a_data))
+        await workers.a_writer.flush()
+
+        misses = workers.b.misses
+        await workers.b.refresh_user_data(42, b_data)
+        assert workers.b.misses == misses and b_data["language"] == "am"
+
+        workers.now += TTL + 1
+        await workers.b.refresh_user_data(42, b_data)
+        assert b_data["language"] == "en"
+
+    asyncio.run(run())
+
+
+def test_a_restarted_worker_resumes_with_the_persisted_data():
+    async def run():
+        workers = Workers()
+        await workers.users.insert_one({"user_id": "42", "language": "am"})
+        data = {}
+        await workers.a.refresh_user_data(42, data)
+        data["language"] = "en"
+        await workers.a.update_user_data(42, dict(data))
+        await workers.a_writer.flush()
+
+        restarted, fresh = MongoPersistence(workers.users, UserWriteBuffer(workers.users)), {}
+        await restarted.refresh_user_data(42, fresh)
+        assert fresh["language"] == "en"
+
+    asyncio.run(run())
+
+
+def test_unchanged_data_is_not_written_again():
+    async def run():
+        workers = Workers()
+        await workers.users.insert_one({"user_id": "42", "language": "am"})
+        data = {}
+        await workers.b.refresh_user_data(42, data)
+        await workers.b.update_user_data(42, dict(data))
+        assert workers.b_writer.stats()["writes"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from ratelimit import KeyedLimiter, RateLimitMiddleware, SlidingWindowLimiter, TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket_allows_a_burst_then_refills_at_rate():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(rate=2.0, burst=3, clock=clock)
+    assert [limiter.hit("u")[0] for _ in range(3)] == [True, True, True]
+    allowed, retry_after = limiter.hit("u")
+    assert not allowed
+    assert retry_after == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert limiter.hit("u")[0]
+    assert not limiter.hit("u")[0]
+
+
+def test_token_bucket_keys_are_independent():
+    limiter = TokenBucketLimiter(rate=1.0, burst=1, clock=FakeClock())
+    assert limiter.hit("a")[0]
+    assert not limiter.hit("a")[0]
+    assert limiter.hit("b")[0]
+    assert limiter.stats()["allowed"] == 2
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_sliding_window_limits_hits_per_window():
+    clock = FakeClock(1000.0)
+    limiter = SlidingWindowLimiter(limit=3, window=10.0, clock=clock)
+    assert [limiter.hit("ip")[0] for _ in range(4)] == [True, True, True, False]
+
+    # Half of the previous window still overlaps: 3 * 0.5 = 1.5 hits count against the limit
+    clock.now = 1015.0
+    assert limiter.hit("ip")[0]
+    allowed, retry_after = limiter.hit("ip")
+    assert not allowed
+    assert retry_after > 0
+
+    # Two full windows later nothing of the old counts is left
+    clock.now = 1035.0
+    assert [limiter.hit("ip")[0] for _ in range(3)] == [True, True, True]
+
+
+def test_retry_after_is_when_the_window_ends():
+    clock = FakeClock(1002.0)
+    limiter = SlidingWindowLimiter(limit=1, window=10.0, clock=clock)
+    assert limiter.hit("ip")[0]
+    allowed, retry_after = limiter.hit("ip")
+    assert not allowed
+    assert retry_after == pytest.approx(8.0)
+
+
+def test_least_recently_seen_keys_are_forgotten():
+    limiter = TokenBucketLimiter(rate=1.0, burst=1, max_keys=2, clock=FakeClock())
+    limiter.hit("a")
+    limiter.hit("b")
+    limiter.hit("a")
+    limiter.hit("c")
+    assert limiter.stats()["keys"] == 2
+    # "b" was evicted, so it starts over with a full bucket
+    assert limiter.hit("b")[0]
+    assert not limiter.hit("b")[0]
+
+
+def test_keyed_limiter_needs_a_policy():
+    with pytest.raises(TypeError):
+        KeyedLimiter()
+
+
+def login(middleware, peer, forwarded=None):
+    """Status of one POST /api/login/admin through the middleware"""
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    scope = {"type": "http", "path": "/api/login/admin", "client": (peer, 50000), "headers": headers}
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, None, send))
+    return sent[0]["status"] if sent else 200
+
+
+def login_limited(trusted_proxies=("10.0.0.0/8",)):
+    async def app(scope, receive, send):
+        pass
+
+    limiter = SlidingWindowLimiter(2, 60.0, clock=FakeClock())
+    return RateLimitMiddleware(app, [("/api/login/", limiter)], trusted_proxies=trusted_proxies)
+
+
+def test_clients_behind_a_trusted_proxy_are_limited_separately():
+    middleware = login_limited()
+    assert [login(middleware, "10.0.0.5", "203.0.113.7") for _ in range(3)] == [200, 200, 429]
+    assert login(middleware, "10.0.0.5", "198.51.100.9") == 200
+
+
+def test_forwarded_for_is_ignored_from_untrusted_peers():
+    middleware = login_limited()
+    assert [login(middleware, "203.0.113.7", f"198.51.100.{i}") for i in range(3)] == [200, 200, 429]
+
+
+def test_the_rightmost_untrusted_hop_is_the_client():
+    middleware = login_limited()
+    # A client-supplied first entry cannot pick the key; the hop the proxy appended does
+    assert middleware.client_ip({"client": ("10.0.0.5", 1), "headers": [(b"x-forwarded-for", b"1.2.3.4, 203.0.113.7, 10.0.0.9")]}) == "203.0.113.7"
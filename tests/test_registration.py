@@ -0,0 +1,39 @@
+import asyncio
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:test")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost")
+os.environ.setdefault("DB_NAME", "test")
+
+import motor.motor_asyncio  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+# server.py creates its Motor client on the first query, so this swap applies to it
+motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+import server  # noqa: E402
+
+
+def contact_update(user_id: int, contact_user_id):
+    user = SimpleNamespace(id=user_id)
+    contact = SimpleNamespace(phone_number="+251911234567", user_id=contact_user_id)
+    message = SimpleNamespace(contact=contact, text=None, from_user=user, reply_text=AsyncMock())
+    return SimpleNamespace(message=message, effective_user=user)
+
+
+@pytest.mark.parametrize("contact_user_id", [None, 8002])
+def test_someone_elses_contact_is_not_taken_as_the_users_number(contact_user_id):
+    async def scenario():
+        update = contact_update(8001, contact_user_id)
+        state = await server.registration_contact(update, SimpleNamespace(user_data={"language": "en"}))
+        assert state is None
+        assert update.message.reply_text.await_args.args[0] == server.templates.render("registration_invalid_phone", "en")
+
+    asyncio.run(scenario())
+
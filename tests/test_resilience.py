@@ -0,0 +1,122 @@
+import asyncio
+
+import httpx
+import pytest
+from telegram.error import NetworkError, TimedOut
+from telegram.request import HTTPXRequest
+
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ResilientRequest
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def open_breaker(clock, threshold=3, reset=30.0):
+    breaker = CircuitBreaker(failure_threshold=threshold, reset_timeout=reset, clock=clock)
+    for _ in range(threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_consecutive_failures():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30.0, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.opened == 1
+
+
+def test_a_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=3, clock=FakeClock())
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_open_breaker_fails_fast_until_the_reset_timeout():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    assert not breaker.allow()
+    assert breaker.fast_failed == 1
+    clock.now = 10.0
+    assert breaker.retry_in == 20.0
+    assert not breaker.allow()
+
+
+def test_half_open_lets_exactly_one_probe_through():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now = 30.0
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes_the_breaker():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now = 30.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_opens_it_again_for_a_full_timeout():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now = 30.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.opened == 2
+    clock.now = 59.0
+    assert not breaker.allow()
+    clock.now = 60.0
+    assert breaker.allow()
+
+
+def test_abandoned_probe_frees_the_slot():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now = 30.0
+    assert breaker.allow()
+    breaker.abandon()
+    assert breaker.allow()
+
+
+def failing_request(monkeypatch, cause):
+    async def do_request(self, url, method, *args, **kwargs):
+        raise TimedOut() from cause
+
+    monkeypatch.setattr(HTTPXRequest, "do_request", do_request)
+    breaker = CircuitBreaker(failure_threshold=2, clock=FakeClock())
+    return ResilientRequest(breaker=breaker, max_retries=0), breaker
+
+
+def test_pool_timeouts_do_not_open_the_breaker(monkeypatch):
+    request, breaker = failing_request(monkeypatch, httpx.PoolTimeout("pool"))
+    for _ in range(5):
+        with pytest.raises(NetworkError):
+            asyncio.run(request.do_request("https://api.telegram.org/bot1/sendMessage", "POST"))
+    assert breaker.state == CLOSED
+
+
+def test_read_timeouts_open_the_breaker(monkeypatch):
+    request, breaker = failing_request(monkeypatch, httpx.ReadTimeout("read"))
+    for _ in range(2):
+        with pytest.raises(NetworkError):
+            asyncio.run(request.do_request("https://api.telegram.org/bot1/sendMessage", "POST"))
+    assert breaker.state == OPEN
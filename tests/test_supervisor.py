@@ -0,0 +1,30 @@
+from argparse import Namespace
+
+import supervisor
+from supervisor import Supervisor
+
+
+def make(tmp_path):
+    return Supervisor(Namespace(health_timeout=15.0), str(tmp_path))
+
+
+def test_children_share_one_generated_jwt_secret(tmp_path, monkeypatch):
+    monkeypatch.delenv("JWT_SECRET", raising=False)
+    monkeypatch.delenv("JWT_PRIVATE_KEY_PATH", raising=False)
+    monkeypatch.setattr(supervisor, "BACKEND_DIR", tmp_path)
+    first, second = make(tmp_path).env(), make(tmp_path).env()
+    process = make(tmp_path)
+    assert process.env()["JWT_SECRET"] == process.env()["JWT_SECRET"]
+    assert first["JWT_SECRET"] != second["JWT_SECRET"]
+
+
+def test_a_configured_key_is_left_alone(tmp_path, monkeypatch):
+    monkeypatch.setattr(supervisor, "BACKEND_DIR", tmp_path)
+    monkeypatch.setenv("JWT_SECRET", "configured")
+    assert make(tmp_path).env()["JWT_SECRET"] == "configured"
+    monkeypatch.delenv("JWT_SECRET")
+    monkeypatch.setenv("JWT_PRIVATE_KEY_PATH", "/keys/jwt.pem")
+    assert "JWT_SECRET" not in make(tmp_path).env()
+    monkeypatch.delenv("JWT_PRIVATE_KEY_PATH")
+    (tmp_path / ".env").write_text("JWT_SECRET=from-dotenv\n")
+    assert "JWT_SECRET" not in make(tmp_path).env()
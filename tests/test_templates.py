@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from templates import TemplateSet
+from texts import CatalogError, TextCatalog, parse_catalog, write_catalog
+
+
+def catalog(languages, shared=None, fallbacks=None):
+    data = {"version": 1, "languages": languages, "shared": shared or {}}
+    if fallbacks is not None:
+        data["fallbacks"] = fallbacks
+    return parse_catalog(json.dumps(data).encode())
+
+
+def test_shared_values_and_other_texts_are_inlined_at_compile_time():
+    templates = TemplateSet(catalog(
+        {"en": {"name": "English", "greeting": "Hello", "welcome": "{greeting}! Join {channel}"}},
+        shared={"channel": "@mosque"},
+    ))
+    template = templates.get("welcome", "en")
+    assert template.params == ()
+    assert template.text == "Hello! Join @mosque"
+
+
+def test_other_fields_are_runtime_parameters():
+    templates = TemplateSet(catalog({"en": {"name": "English", "registration_schedule": "{program}: {greeting}", "greeting": "pick a time"}}))
+    assert templates.get("registration_schedule", "en").params == ("program",)
+    assert templates.render("registration_schedule", "en", program="Hifz") == "Hifz: pick a time"
+
+
+def test_fields_no_caller_passes_are_rejected():
+    with pytest.raises(CatalogError, match="education_info"):
+        catalog({"en": {"name": "English", "education_info": "Fee: {price}"}}, shared={"price": "1500 {ETB}"})
+    with pytest.raises(CatalogError, match="registration_schedule"):
+        catalog({"en": {"name": "English", "registration_schedule": "{program} for {first_name}"}})
+
+
+def test_malformed_format_strings_are_rejected():
+    with pytest.raises(CatalogError, match="malformed"):
+        catalog({"en": {"name": "English", "menu": "Menu }"}})
+
+
+def test_missing_keys_follow_the_fallback_chain():
+    templates = TemplateSet(catalog(
+        {
+            "am": {"name": "Amharic", "menu": "ምናሌ", "back": "ተመለስ"},
+            "en": {"name": "English", "menu": "Menu"},
+            "om": {"name": "Oromo"},
+        },
+        fallbacks={"om": ["en"], "*": ["am"]},
+    ))
+    assert templates.chain("om") == ("om", "en", "am")
+    assert templates.render("menu", "om") == "Menu"
+    assert templates.render("back", "om") == "ተመለስ"
+    assert ("back", "am") in templates.missing["en"]
+    assert ("menu", "en") in templates.missing["om"]
+
+
+def test_unknown_language_uses_the_default_chain():
+    templates = TemplateSet(catalog(
+        {"am": {"name": "Amharic", "menu": "ምናሌ"}, "en": {"name": "English", "menu": "Menu"}},
+        fallbacks={"*": ["am"]},
+    ))
+    assert templates.render("menu", "xx") == "ምናሌ"
+
+
+def test_a_text_missing_everywhere_renders_its_key():
+    templates = TemplateSet(catalog({"en": {"name": "English"}}))
+    assert templates.render("nowhere", "en") == "nowhere"
+
+
+def test_self_reference_is_rejected():
+    with pytest.raises(ValueError, match="references itself"):
+        TemplateSet(catalog({"en": {"name": "English", "a": "{b}", "b": "{a}"}}))
+
+
+def test_static_strings_are_listed_for_keyboards():
+    templates = TemplateSet(catalog({"en": {"name": "English", "menu": "Menu", "registration_schedule": "{program}"}}))
+    strings = templates.strings("en")
+    assert strings["menu"] == "Menu"
+    assert "registration_schedule" not in strings
+
+
+def test_a_catalog_that_does_not_compile_is_never_swapped_in(tmp_path):
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps({"version": 1, "languages": {"en": {"name": "English", "menu": "Menu"}}}))
+    texts = TextCatalog(path)
+    swapped = []
+    texts.subscribe(swapped.append)
+
+    with pytest.raises(CatalogError):
+        write_catalog(path, {"languages": {"en": {"name": "English", "menu": "Menu }"}}})
+    path.write_text(json.dumps({"version": 2, "languages": {"en": {"name": "English", "menu": "Menu }"}}}))
+    with pytest.raises(CatalogError):
+        texts.reload()
+    assert texts.current.version == 1
+    assert swapped == []
@@ -0,0 +1,38 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+pytest.importorskip("mongomock_motor")
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:test")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost")
+os.environ.setdefault("DB_NAME", "test")
+
+import motor.motor_asyncio  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+# server.py creates its Motor client on the first query, so this swap applies to it
+motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+import server  # noqa: E402
+
+
+def test_export_and_listing_format_dates_the_same_way():
+    async def scenario():
+        await server.db.users.insert_one({"user_id": "9001", "language": "en", "timestamp": datetime(2026, 10, 18, 3, 51, 12)})
+        page = await server.get_users(
+            limit=10, cursor=None, fields=None, language="en", since=None, until=None, sort="user_id", _={}
+        )
+        listed = jsonable_encoder(page)["users"]
+
+        response = await server.export_users(fields=None, language="en", since=None, until=None, _={})
+        exported = [json.loads(line) async for line in response.body_iterator]
+
+        assert [user["timestamp"] for user in exported] == [user["timestamp"] for user in listed]
+        assert exported[-1]["timestamp"] == "2026-10-18T03:51:12"
+
+    asyncio.run(scenario())